@@ -1,8 +1,15 @@
+import base64
+import heapq
 import json
 import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
+from itertools import islice
 from typing import Optional, Union
 
+import constants
 from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.event_handler import (
     APIGatewayRestResolver,
@@ -23,19 +30,28 @@ from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from boto3.dynamodb.conditions import And, Attr, Key
 from dynamodb import (
-    TimeRangeBoundary,
+    apply_object_claim,
+    batch_get_storage_items,
     commit_object_claim,
     delete_flow_segments,
+    extend_flow_timerange_summary,
     get_flow_timerange,
-    get_key_and_args,
-    get_timerange_expression,
+    get_flow_timeranges,
+    get_object_ref_counts,
+    get_segments_at,
+    plan_segments_query,
+    query_segment_bounds,
+    query_segments_page,
     segments_table,
+    update_object_ref_counts,
     validate_object_id,
+    wait_for_flow_segments,
 )
-from mediatimestamp.immutable import TimeRange
+from mediatimestamp.immutable import TimeRange, Timestamp
 from neptune import (
-    check_node_exists,
     enhance_resources,
+    flush_flow_segments_updated,
+    get_flow_segments_version,
     merge_delete_request,
     query_node,
     update_flow_segments_updated,
@@ -43,13 +59,25 @@ from neptune import (
 from pydantic import ValidationError
 from schema import Deletionrequest, Flowsegment, Flowsegmentpost, Timerange, Uuid
 from segment_get_urls import populate_get_urls
+from segment_timeranges import (
+    SegmentIntervalIndex,
+    get_bounds_timerange,
+    get_coverage,
+    get_sample_points,
+    get_segment_bounds,
+    get_timerange_bounds,
+    get_timerange_limits,
+)
 from typing_extensions import Annotated
 from utils import (
     base_delete_request_dict,
+    check_if_none_match,
+    generate_etag,
     generate_failed_segment,
     generate_link_url,
+    get_model_serialiser,
     model_dump,
-    publish_event,
+    publish_events,
     put_message,
 )
 
@@ -64,6 +92,9 @@ del_queue = os.environ["DELETE_QUEUE_URL"]
 
 UUID_PATTERN = Uuid.model_fields["root"].metadata[0].pattern
 TIMERANGE_PATTERN = Timerange.model_fields["root"].metadata[0].pattern
+serialise_flowsegment = get_model_serialiser(Flowsegment)
+_coverage_cache: dict[tuple, tuple[str, dict]] = {}
+flows_executor = ThreadPoolExecutor(max_workers=constants.MULTI_FLOW_MAX_WORKERS)
 
 
 @app.head("/flows/<flowId>/segments")
@@ -97,74 +128,135 @@ def get_flow_segments_by_id(
     param_include_object_timerange: Annotated[
         Optional[bool], Query(alias="include_object_timerange")
     ] = None,
+    param_wait_timeout: Annotated[
+        Optional[float],
+        Query(alias="wait_timeout", ge=0, le=constants.MAX_SEGMENTS_WAIT_SECS),
+    ] = None,
+    param_sample_interval: Annotated[
+        Optional[float], Query(alias="sample_interval", gt=0)
+    ] = None,
 ):
     try:
         Uuid(root=flow_id)
     except ValidationError as ex:
         raise NotFoundError("The flow ID in the path is invalid.") from ex  # 404
-    if not check_node_exists("flow", flow_id):
+    try:
+        segments_version = get_flow_segments_version(flow_id)
+    except ValueError:
         return Response(
             status_code=HTTPStatus.OK.value,  # 200
             content_type=content_types.APPLICATION_JSON,
             body=json.dumps([]),
         )
-    args = get_key_and_args(
-        flow_id,
-        {
-            "reverse_order": param_reverse_order,
-            "limit": param_limit,
-            "page": param_page,
-            "timerange": param_timerange,
-            "object_id": param_object_id,
-        },
-    )
-    reverse_order = not args["ScanIndexForward"]
-    query = segments_table.query(**args)
-    items = query["Items"]
     custom_headers = {}
-    while "LastEvaluatedKey" in query and len(items) < args["Limit"]:
-        args["ExclusiveStartKey"] = query["LastEvaluatedKey"]
-        query = segments_table.query(**args)
-        items.extend(query["Items"][: args["Limit"] - len(items)])
-    match len(items):
-        case 0:
-            custom_headers["X-Paging-Timerange"] = "()"
-        case 1:
-            custom_headers["X-Paging-Timerange"] = items[0]["timerange"]
-        case _:
-            custom_headers["X-Paging-Timerange"] = str(
-                TimeRange.from_str(items[0]["timerange"]).extend_to_encompass_timerange(
-                    TimeRange.from_str(items[-1]["timerange"])
+    segments_added = False
+    if param_wait_timeout:
+        # Long poll until a segment overlapping the start of the timerange exists
+        timerange_filter = TimeRange.from_str(param_timerange or "_")
+        segments_added, previous_last_end = wait_for_flow_segments(
+            flow_id,
+            (
+                timerange_filter.start.to_nanosec()
+                + (0 if timerange_filter.includes_start() else 1)
+                if timerange_filter.start
+                else None
+            ),
+            min(
+                param_wait_timeout,
+                (
+                    app.lambda_context.get_remaining_time_in_millis()
+                    - constants.LAMBDA_TIME_REMAINING
+                )
+                / 1000,
+            ),
+        )
+        if (
+            not timerange_filter.start
+            and not timerange_filter.is_empty()
+            and previous_last_end is not None
+        ):
+            # Without a start the wait is for the segments after the current
+            # last one, so only those are returned rather than the whole flow
+            param_timerange = str(
+                TimeRange(
+                    Timestamp.from_nanosec(previous_last_end),
+                    timerange_filter.end,
+                    (
+                        TimeRange.INCLUDE_END
+                        if timerange_filter.includes_end()
+                        else TimeRange.EXCLUSIVE
+                    ),
                 )
             )
-    if "LastEvaluatedKey" in query:
-        next_key = (
-            items[-1]["timerange_end"]
-            if items
-            else query["LastEvaluatedKey"]["timerange_end"]
+    # The segments_version may not be written yet for segments added during the wait
+    if segments_version and not segments_added:
+        # Presigned urls are reused for an expiry bucket, so the bucket is part of the ETag
+        custom_headers["ETag"] = generate_etag(
+            segments_version,
+            app.current_event.query_string_parameters,
+            int(time.time() // constants.PRESIGNED_URL_CACHE_BUCKET_SECS),
+        )
+        if check_if_none_match(app.current_event, custom_headers["ETag"]):
+            return Response(
+                status_code=HTTPStatus.NOT_MODIFIED.value,  # 304
+                body=None,
+                headers=custom_headers,
+            )
+    is_head_request = app.current_event.request_context.http_method == "HEAD"
+    if param_sample_interval:
+        if param_object_id or param_reverse_order:
+            raise BadRequestError(
+                "Bad request. sample_interval cannot be used with object_id or reverse_order."
+            )  # 400
+        reverse_order = False
+        limit = (
+            min(param_limit, constants.MAX_PAGE_LIMIT)
+            if param_limit
+            else constants.DEFAULT_PAGE_LIMIT
+        )
+        items, next_key = sample_flow_segments(
+            flow_id,
+            param_timerange,
+            param_sample_interval,
+            limit,
+            param_page,
+            # Only the keys and timerange are needed to produce the paging headers
+            "timerange_start, timerange_end, timerange" if is_head_request else None,
+        )
+    else:
+        args, boundary = plan_segments_query(
+            flow_id,
+            {
+                "reverse_order": param_reverse_order,
+                "limit": param_limit,
+                "page": param_page,
+                "timerange": param_timerange,
+                "object_id": param_object_id,
+            },
         )
+        reverse_order = not args["ScanIndexForward"]
+        limit = args["Limit"]
+        if is_head_request:
+            # Only the keys and timerange are needed to produce the paging headers
+            args["ProjectionExpression"] = "timerange_start, timerange_end, timerange"
+        items, next_key = query_segments_page(flow_id, args, boundary)
+    custom_headers["X-Paging-Timerange"] = get_paging_timerange(items)
+    if next_key is not None:
         custom_headers["X-Paging-NextKey"] = str(next_key)
         custom_headers["Link"] = generate_link_url(app.current_event, str(next_key))
     # Set Paging Limit header if paging limit being used is not the one specified
-    if "LastEvaluatedKey" in query or param_limit != args["Limit"]:
-        custom_headers["X-Paging-Limit"] = str(args["Limit"])
+    if next_key is not None or param_limit != limit:
+        custom_headers["X-Paging-Limit"] = str(limit)
     custom_headers["X-Paging-Count"] = str(len(items))
     custom_headers["X-Paging-Reverse-Order"] = str(reverse_order)
-    if app.current_event.request_context.http_method == "HEAD":
+    if is_head_request:
         return Response(
             status_code=HTTPStatus.OK.value,  # 200
             content_type=content_types.APPLICATION_JSON,
             body=None,
             headers=custom_headers,
         )
-    # object_timerange is only stored when it differs from the segment
-    # timerange. When requested, always return it (falling back to the
-    # segment timerange when not stored); otherwise remove it.
-    for item in items:
-        if param_include_object_timerange:
-            item.setdefault("object_timerange", item["timerange"])
-        else:
-            item.pop("object_timerange", None)
+    set_object_timerange(items, param_include_object_timerange)
     populate_get_urls(
         items,
         param_accept_get_urls,
@@ -172,11 +264,212 @@ def get_flow_segments_by_id(
         param_accept_storage_ids,
         param_presigned,
     )
-    schema_items = [Flowsegment(**item) for item in items]
+    # Segments were validated when stored, so skip the pydantic round trip
     return Response(
         status_code=HTTPStatus.OK.value,  # 200
         content_type=content_types.APPLICATION_JSON,
-        body=model_dump(schema_items),
+        body=[serialise_flowsegment(item) for item in items],
+        headers=custom_headers,
+    )
+
+
+@app.head("/flows/<flowId>/segments/coverage")
+@app.get("/flows/<flowId>/segments/coverage")
+@tracer.capture_method(capture_response=False)
+def get_flow_segments_coverage_by_id(
+    flow_id: Annotated[str, Path(alias="flowId", pattern=UUID_PATTERN)],
+    param_timerange: Annotated[
+        Optional[str], Query(alias="timerange", pattern=TIMERANGE_PATTERN)
+    ] = None,
+):
+    try:
+        segments_version = get_flow_segments_version(flow_id)
+    except ValueError as e:
+        raise NotFoundError("The requested flow does not exist.") from e  # 404
+    limits = get_timerange_limits(TimeRange.from_str(param_timerange or "_"))
+    custom_headers = {}
+    if segments_version:
+        custom_headers["ETag"] = generate_etag(segments_version, limits)
+        if check_if_none_match(app.current_event, custom_headers["ETag"]):
+            return Response(
+                status_code=HTTPStatus.NOT_MODIFIED.value,  # 304
+                body=None,
+                headers=custom_headers,
+            )
+    cache_key = (flow_id, *limits)
+    cached = _coverage_cache.get(cache_key)
+    if segments_version and cached and cached[0] == segments_version:
+        body = cached[1]
+    else:
+        coverage, gaps = get_coverage(query_segment_bounds(flow_id, limits[0]), *limits)
+        body = {
+            "coverage": [str(get_bounds_timerange(*bounds)) for bounds in coverage],
+            "gaps": [str(get_bounds_timerange(*bounds)) for bounds in gaps],
+        }
+        if segments_version:
+            # Only the latest coverage of a timerange is kept per flow
+            _coverage_cache.pop(cache_key, None)
+            _coverage_cache[cache_key] = (segments_version, body)
+            while len(_coverage_cache) > constants.COVERAGE_CACHE_SIZE:
+                del _coverage_cache[next(iter(_coverage_cache))]
+    return Response(
+        status_code=HTTPStatus.OK.value,  # 200
+        content_type=content_types.APPLICATION_JSON,
+        body=(
+            None if app.current_event.request_context.http_method == "HEAD" else body
+        ),
+        headers=custom_headers,
+    )
+
+
+@app.head("/segments")
+@app.get("/segments")
+@tracer.capture_method(capture_response=False)
+def get_segments(
+    param_flow_id: Annotated[
+        str,
+        Query(
+            alias="flow_id",
+            pattern=r"^([0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})(,[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})*$",
+        ),
+    ],
+    param_timerange: Annotated[
+        Optional[str], Query(alias="timerange", pattern=TIMERANGE_PATTERN)
+    ] = None,
+    param_reverse_order: Annotated[Optional[bool], Query(alias="reverse_order")] = None,
+    param_verbose_storage: Annotated[
+        Optional[bool], Query(alias="verbose_storage")
+    ] = None,
+    param_accept_get_urls: Annotated[
+        Optional[str], Query(alias="accept_get_urls", pattern=r"^([^,]+(,[^,]+)*)?$")
+    ] = None,
+    param_accept_storage_ids: Annotated[
+        Optional[str],
+        Query(
+            alias="accept_storage_ids",
+            pattern=r"^([0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})(,[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12})*$",
+        ),
+    ] = None,
+    param_presigned: Annotated[Optional[bool], Query(alias="presigned")] = None,
+    param_page: Annotated[Optional[str], Query(alias="page")] = None,
+    param_limit: Annotated[Optional[int], Query(alias="limit", gt=0)] = None,
+    param_include_object_timerange: Annotated[
+        Optional[bool], Query(alias="include_object_timerange")
+    ] = None,
+):
+    """Get a page of the segments of several flows, merged in timeline order.
+
+    Each flow is queried concurrently for up to a page of segments and the
+    results are merged by timerange_start. The page token holds the
+    timerange_end to continue from for each flow that has segments left.
+    """
+    flow_ids = list(dict.fromkeys(param_flow_id.split(",")))
+    if len(flow_ids) > constants.MULTI_FLOW_MAX_FLOWS:
+        raise BadRequestError(
+            f"Bad request. At most {constants.MULTI_FLOW_MAX_FLOWS} flow_id values may be specified."
+        )  # 400
+    pages = (
+        decode_flows_page(param_page, flow_ids)
+        if param_page
+        else dict.fromkeys(flow_ids)
+    )
+    limit = (
+        min(param_limit, constants.MAX_PAGE_LIMIT)
+        if param_limit
+        else constants.DEFAULT_PAGE_LIMIT
+    )
+    is_head_request = app.current_event.request_context.http_method == "HEAD"
+    # Only the keys and timerange are needed to produce the paging headers
+    projection = (
+        "flow_id, timerange_start, timerange_end, timerange"
+        if is_head_request
+        else None
+    )
+    flows_parameters = [
+        {
+            "reverse_order": param_reverse_order,
+            "limit": limit,
+            "page": None if page is None else str(page),
+            "timerange": param_timerange,
+        }
+        for page in pages.values()
+    ]
+    flows_items, flows_next_keys = zip(
+        *flows_executor.map(
+            query_flow_segments_page,
+            pages,
+            flows_parameters,
+            [projection] * len(pages),
+        )
+    )
+    items = list(
+        islice(
+            heapq.merge(
+                *flows_items,
+                key=lambda item: item["timerange_start"],
+                reverse=param_reverse_order or False,
+            ),
+            limit,
+        )
+    )
+    taken = Counter(item["flow_id"] for item in items)
+    next_pages = {}
+    for flow_id, flow_items, next_key in zip(pages, flows_items, flows_next_keys):
+        if taken[flow_id] < len(flow_items):
+            # Segments of the flow left out of the merged page come next
+            next_pages[flow_id] = (
+                int(flow_items[taken[flow_id] - 1]["timerange_end"])
+                if taken[flow_id]
+                else pages[flow_id]
+            )
+        elif next_key is not None:
+            next_pages[flow_id] = int(next_key)
+    # Segments of different flows overlap, so the first and last segments of
+    # the page may not encompass it
+    custom_headers = {
+        "X-Paging-Timerange": get_paging_timerange(
+            [
+                min(items, key=lambda item: item["timerange_start"]),
+                max(items, key=lambda item: item["timerange_end"]),
+            ]
+            if items
+            else []
+        )
+    }
+    if next_pages:
+        next_page = base64.b64encode(json.dumps(next_pages).encode("utf-8")).decode(
+            "utf-8"
+        )
+        custom_headers["X-Paging-NextKey"] = next_page
+        custom_headers["Link"] = generate_link_url(app.current_event, next_page)
+    # Set Paging Limit header if paging limit being used is not the one specified
+    if next_pages or param_limit != limit:
+        custom_headers["X-Paging-Limit"] = str(limit)
+    custom_headers["X-Paging-Count"] = str(len(items))
+    custom_headers["X-Paging-Reverse-Order"] = str(bool(param_reverse_order))
+    if is_head_request:
+        return Response(
+            status_code=HTTPStatus.OK.value,  # 200
+            content_type=content_types.APPLICATION_JSON,
+            body=None,
+            headers=custom_headers,
+        )
+    set_object_timerange(items, param_include_object_timerange)
+    # A single pass populates the get_urls of the segments of every flow
+    populate_get_urls(
+        items,
+        param_accept_get_urls,
+        param_verbose_storage,
+        param_accept_storage_ids,
+        param_presigned,
+    )
+    return Response(
+        status_code=HTTPStatus.OK.value,  # 200
+        content_type=content_types.APPLICATION_JSON,
+        body=[
+            {"flow_id": item["flow_id"], **serialise_flowsegment(item)}
+            for item in items
+        ],
         headers=custom_headers,
     )
 
@@ -198,11 +491,7 @@ def post_flow_segments_by_id(
     if not item.get("container"):
         raise BadRequestError("Bad request. The flow 'container' is not set.")  # 400
     if isinstance(flow_segment, list):
-        failed_segments = []
-        for segment in flow_segment:
-            segment_result = process_single_segment(item, segment)
-            if segment_result:
-                failed_segments.append(segment_result)
+        failed_segments = process_segments_batch(item, flow_segment)
         if len(failed_segments) == 0:
             return None, HTTPStatus.CREATED.value  # 201
         else:
@@ -280,7 +569,18 @@ def delete_flow_segments_by_id(
 @tracer.capture_lambda_handler(capture_response=False)
 @metrics.log_metrics(capture_cold_start_metric=True)
 def lambda_handler(event: dict, context: LambdaContext) -> dict:
-    return app.resolve(event, context)
+    try:
+        return app.resolve(event, context)
+    finally:
+        # The segments are already written, so a failure to update the Flows
+        # is logged rather than failing the invocation, which would be retried
+        try:
+            flush_flow_segments_updated()
+        except Exception as e:
+            logger.error(
+                "Failed to write the Flow segments_updated updates.",
+                extra={"exception": str(e)},
+            )
 
 
 @app.exception_handler(RequestValidationError)
@@ -289,15 +589,126 @@ def handle_validation_error(ex: RequestValidationError):
 
 
 @tracer.capture_method(capture_response=False)
-def check_overlapping_segments(flow_id, segment_timerange):
+def sample_flow_segments(
+    flow_id: str,
+    timerange: str | None,
+    sample_interval: float,
+    limit: int,
+    page: str | None,
+    projection: str | None = None,
+) -> tuple[list[dict], int | None]:
+    """Get the segments at up to limit sample points every sample_interval seconds across the timerange.
+
+    Each sample point is looked up directly with get_segments_at, so the cost
+    depends on the number of samples rather than the number of segments. An
+    unbounded timerange is limited to the flow timerange, and the sample
+    points continue after the timerange_end in page.
+
+    Returns the distinct segments and the timerange_end to continue paging
+    from, which is None when there are no more sample points.
+    """
+    start, end = get_timerange_limits(
+        TimeRange.from_str(timerange or "_").intersect_with(
+            TimeRange.from_str(get_flow_timeranges([flow_id])[flow_id])
+        )
+    )
+    if start is None or end is None or start > end:
+        return [], None
+    points, more = get_sample_points(
+        start,
+        end,
+        max(1, round(sample_interval * 1_000_000_000)),
+        None if page is None else int(page),
+        limit,
+    )
+    items = [
+        item
+        for item in get_segments_at(flow_id, points, projection)
+        if item["timerange_start"] <= end
+    ]
+    # A sample point past the last segment of the range ends the sampling
+    if not more or len(items) == 0 or items[-1]["timerange_end"] >= end:
+        return items, None
+    return items, items[-1]["timerange_end"]
+
+
+@tracer.capture_method(capture_response=False)
+def query_flow_segments_page(
+    flow_id: str, parameters: dict, projection: str | None = None
+) -> tuple[list[dict], int | None]:
+    """Query a page of the segments of a flow, see plan_segments_query and query_segments_page"""
+    args, boundary = plan_segments_query(flow_id, parameters)
+    if projection:
+        args["ProjectionExpression"] = projection
+    return query_segments_page(flow_id, args, boundary)
+
+
+@tracer.capture_method(capture_response=False)
+def decode_flows_page(page: str, flow_ids: list[str]) -> dict[str, int | None]:
+    """Decode and validate the base64 encoded page token of GET /segments"""
+    try:
+        pages = json.loads(base64.b64decode(page).decode("utf-8"))
+    except Exception as ex:
+        raise BadRequestError("Invalid page parameter value") from ex
+    if (
+        not isinstance(pages, dict)
+        or not pages
+        or not set(pages) <= set(flow_ids)
+        or any(
+            value is not None and not isinstance(value, int) for value in pages.values()
+        )
+    ):
+        raise BadRequestError("Invalid page parameter value")
+    return pages
+
+
+@tracer.capture_method(capture_response=False)
+def get_paging_timerange(items: list[dict]) -> str:
+    """Get the timerange encompassing a page of segments, for the X-Paging-Timerange header"""
+    match len(items):
+        case 0:
+            return "()"
+        case 1:
+            return items[0]["timerange"]
+        case _:
+            # Use the stored bounds rather than parsing the timerange strings.
+            # The items may be in reverse order, so take the outermost bounds
+            first, last = get_segment_bounds(items[0]), get_segment_bounds(items[-1])
+            return str(
+                get_bounds_timerange(min(first[0], last[0]), max(first[1], last[1]))
+            )
+
+
+@tracer.capture_method(capture_response=False)
+def set_object_timerange(items: list[dict], include_object_timerange: bool) -> None:
+    """Set or remove the object_timerange of segment items.
+
+    object_timerange is only stored when it differs from the segment
+    timerange. When requested, always return it (falling back to the segment
+    timerange when not stored); otherwise remove it.
+    """
+    for item in items:
+        if include_object_timerange:
+            item.setdefault("object_timerange", item["timerange"])
+        else:
+            item.pop("object_timerange", None)
+
+
+@tracer.capture_method(capture_response=False)
+def get_segment_interval_index(
+    flow_id: str, segment_timeranges: list[TimeRange]
+) -> SegmentIntervalIndex:
+    """Get an index of the stored segments in the flow overlapping the combined segment_timeranges, using a single query"""
+    bounds = [get_timerange_bounds(timerange) for timerange in segment_timeranges]
+    if not bounds:
+        return SegmentIntervalIndex()
     args = {
         "KeyConditionExpression": And(
             Key("flow_id").eq(flow_id),
-            get_timerange_expression(Key, TimeRangeBoundary.END, segment_timerange),
-        ),
-        "FilterExpression": get_timerange_expression(
-            Attr, TimeRangeBoundary.START, segment_timerange
+            Key("timerange_end").gte(min(start for start, _ in bounds)),
         ),
+        "FilterExpression": Attr("timerange_start").lte(max(end for _, end in bounds)),
+        "ProjectionExpression": "timerange_start, timerange_end",
     }
     query = segments_table.query(**args)
     items = query["Items"]
@@ -305,14 +716,23 @@ def check_overlapping_segments(flow_id, segment_timerange):
         args["ExclusiveStartKey"] = query["LastEvaluatedKey"]
         query = segments_table.query(**args)
         items.extend(query["Items"])
-    return len(items) > 0
+    return SegmentIntervalIndex(
+        (int(item["timerange_start"]), int(item["timerange_end"])) for item in items
+    )
 
 
 @tracer.capture_method(capture_response=False)
-def process_single_segment(flow: dict, flow_segment: Flowsegmentpost) -> None:
-    """Process a single flow segment POST request"""
-    item_dict = model_dump(flow_segment)
-    validation = validate_object_id(flow_segment, flow["id"])
+def check_overlapping_segments(flow_id, segment_timerange):
+    return get_segment_interval_index(flow_id, [segment_timerange]).overlaps(
+        *get_timerange_bounds(segment_timerange)
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def check_segment_validation(
+    flow: dict, flow_segment: Flowsegmentpost, item_dict: dict, validation: dict
+):
+    """Check the result of validate_object_id against the Flow, returning a FailedSegment when invalid"""
     if not validation["valid"]:
         return generate_failed_segment(
             flow_segment.object_id,
@@ -336,22 +756,32 @@ def process_single_segment(flow: dict, flow_segment: Flowsegmentpost) -> None:
             item_dict["timerange"],
             "Bad request. This Flow uses initialisation segments so every Flow Segment MUST reference an init_object_id.",
         )
-    segment_timerange = TimeRange.from_str(item_dict["timerange"])
-    if check_overlapping_segments(flow["id"], segment_timerange):
+    return None
+
+
+@tracer.capture_method(capture_response=False)
+def check_segment_timerange(
+    flow_segment: Flowsegmentpost, item_dict: dict, segment_timerange: TimeRange
+):
+    """Check the timerange of a segment can be stored, returning a FailedSegment when it is empty or unbounded"""
+    if segment_timerange.is_empty() or not (
+        segment_timerange.bounded_before() and segment_timerange.bounded_after()
+    ):
         return generate_failed_segment(
             flow_segment.object_id,
             item_dict["timerange"],
-            "Bad request. The timerange of the segment MUST NOT overlap any other segment in the same Flow.",
+            "Bad request. The timerange of the segment MUST be bounded and not empty.",
         )
-    # All validation has passed, so it is now safe to claim the Object(s). This
-    # must happen after every check above so a rejected request never mutates
-    # (claims) an Object in storage.
-    commit_object_claim(validation.get("claim"))
-    item_dict["timerange_start"] = segment_timerange.start.to_nanosec() + (
-        0 if segment_timerange.includes_start() else 1
-    )
-    item_dict["timerange_end"] = segment_timerange.end.to_nanosec() - (
-        0 if segment_timerange.includes_end() else 1
+    return None
+
+
+@tracer.capture_method(capture_response=False)
+def build_segment_item(
+    item_dict: dict, segment_timerange: TimeRange, validation: dict
+) -> dict:
+    """Add the stored fields of a validated segment to its item_dict"""
+    item_dict["timerange_start"], item_dict["timerange_end"] = get_timerange_bounds(
+        segment_timerange
     )
     if validation["storage_id"]:
         item_dict["storage_ids"] = [validation["storage_id"]]
@@ -364,13 +794,27 @@ def process_single_segment(flow: dict, flow_segment: Flowsegmentpost) -> None:
         and validation["object_timerange"] != item_dict["timerange"]
     ):
         item_dict["object_timerange"] = validation["object_timerange"]
-    segments_table.put_item(
-        Item={**item_dict, "flow_id": flow["id"]}, ReturnValues="ALL_OLD"
+    return item_dict
+
+
+@tracer.capture_method(capture_response=False)
+def publish_segments_added(flow: dict, items: list[dict]) -> None:
+    """Update the Flow's timerange summary and segments_updated and publish a segments_added event per segment"""
+    extend_flow_timerange_summary(flow["id"], items)
+    # The bounds are only widened, so those of the added segments are enough
+    update_flow_segments_updated(
+        flow["id"],
+        str(
+            get_bounds_timerange(
+                min(item["timerange_start"] for item in items),
+                max(item["timerange_end"] for item in items),
+            )
+        ),
+        coalesce=True,
     )
-    update_flow_segments_updated(flow["id"])
-    publish_event(
+    publish_events(
         "flows/segments_added",
-        {"flow_id": flow["id"], "segments": [item_dict]},
+        [{"flow_id": flow["id"], "segments": [item_dict]} for item_dict in items],
         enhance_resources(
             [
                 f"tams:flow:{flow['id']}",
@@ -382,3 +826,123 @@ def process_single_segment(flow: dict, flow_segment: Flowsegmentpost) -> None:
             ]
         ),
     )
+
+
+@tracer.capture_method(capture_response=False)
+def process_single_segment(flow: dict, flow_segment: Flowsegmentpost) -> None:
+    """Process a single flow segment POST request"""
+    item_dict = model_dump(flow_segment)
+    validation = validate_object_id(flow_segment, flow["id"])
+    failed_segment = check_segment_validation(flow, flow_segment, item_dict, validation)
+    if failed_segment:
+        return failed_segment
+    segment_timerange = TimeRange.from_str(item_dict["timerange"])
+    failed_segment = check_segment_timerange(flow_segment, item_dict, segment_timerange)
+    if failed_segment:
+        return failed_segment
+    if check_overlapping_segments(flow["id"], segment_timerange):
+        return generate_failed_segment(
+            flow_segment.object_id,
+            item_dict["timerange"],
+            "Bad request. The timerange of the segment MUST NOT overlap any other segment in the same Flow.",
+        )
+    # All validation has passed, so it is now safe to claim the Object(s). This
+    # must happen after every check above so a rejected request never mutates
+    # (claims) an Object in storage.
+    commit_object_claim(validation.get("claim"))
+    build_segment_item(item_dict, segment_timerange, validation)
+    update_object_ref_counts(get_object_ref_counts([item_dict]))
+    segments_table.put_item(
+        Item={**item_dict, "flow_id": flow["id"]}, ReturnValues="ALL_OLD"
+    )
+    publish_segments_added(flow, [item_dict])
+
+
+@tracer.capture_method(capture_response=False)
+def process_segments_batch(flow: dict, flow_segments: list[Flowsegmentpost]) -> list:
+    """Process a list of flow segments from a POST request, returning the FailedSegments.
+
+    Segments are validated in request order with the same rules as
+    process_single_segment, but the storage records are fetched with
+    BatchGetItem, overlaps are checked against an index built from a single
+    range query and the accepted segments are written with BatchWriteItem.
+    Accepted segments and claimed Objects are applied to the in-memory state as
+    they are validated so later segments in the batch see them.
+    """
+    if not flow_segments:
+        return []
+    storage_items = batch_get_storage_items(
+        object_id
+        for flow_segment in flow_segments
+        for object_id in (flow_segment.object_id, flow_segment.init_object_id)
+        if object_id
+    )
+    # Re-used Media Objects may recover their init_object_id from storage
+    storage_items.update(
+        batch_get_storage_items(
+            storage_item["init_object_id"]
+            for storage_item in list(storage_items.values())
+            if storage_item
+            and storage_item.get("init_object_id")
+            and storage_item["init_object_id"] not in storage_items
+        )
+    )
+    item_dicts = [model_dump(flow_segment) for flow_segment in flow_segments]
+    segment_timeranges = [
+        TimeRange.from_str(item_dict["timerange"]) for item_dict in item_dicts
+    ]
+    # Timeranges that cannot be stored fail their own segment, and are left out
+    # of the bounds of the overlap query
+    timerange_failures = [
+        check_segment_timerange(flow_segment, item_dict, segment_timerange)
+        for flow_segment, item_dict, segment_timerange in zip(
+            flow_segments, item_dicts, segment_timeranges
+        )
+    ]
+    interval_index = get_segment_interval_index(
+        flow["id"],
+        [
+            segment_timerange
+            for segment_timerange, timerange_failure in zip(
+                segment_timeranges, timerange_failures
+            )
+            if timerange_failure is None
+        ],
+    )
+    failed_segments = []
+    items = []
+    for flow_segment, item_dict, segment_timerange, timerange_failure in zip(
+        flow_segments, item_dicts, segment_timeranges, timerange_failures
+    ):
+        validation = validate_object_id(flow_segment, flow["id"], storage_items)
+        failed_segment = (
+            check_segment_validation(flow, flow_segment, item_dict, validation)
+            or timerange_failure
+        )
+        if failed_segment:
+            failed_segments.append(failed_segment)
+            continue
+        build_segment_item(item_dict, segment_timerange, validation)
+        if interval_index.overlaps(
+            item_dict["timerange_start"], item_dict["timerange_end"]
+        ):
+            failed_segments.append(
+                generate_failed_segment(
+                    flow_segment.object_id,
+                    item_dict["timerange"],
+                    "Bad request. The timerange of the segment MUST NOT overlap any other segment in the same Flow.",
+                )
+            )
+            continue
+        # Claim the Object(s) only once every check for this segment has passed
+        commit_object_claim(validation.get("claim"))
+        apply_object_claim(validation.get("claim"), storage_items)
+        interval_index.add(item_dict["timerange_start"], item_dict["timerange_end"])
+        items.append(item_dict)
+    if items:
+        update_object_ref_counts(get_object_ref_counts(items))
+        with segments_table.batch_writer() as batch:
+            for item_dict in items:
+                batch.put_item(Item={**item_dict, "flow_id": flow["id"]})
+        publish_segments_added(flow, items)
+    return failed_segments
@@ -26,8 +26,10 @@ from aws_lambda_powertools.event_handler.openapi.params import Body, Path, Query
 from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from dynamodb import (
+    delete_flow_timerange_summary,
     get_default_storage_backend,
     get_flow_timerange,
+    get_flow_timeranges,
     get_storage_backend,
     storage_table,
 )
@@ -45,6 +47,7 @@ from neptune import (
     query_node_property,
     query_node_tags,
     set_flow_collection,
+    set_flow_segments_timerange,
     set_node_property,
     validate_flow_collection,
 )
@@ -66,6 +69,8 @@ from schema import (
 from typing_extensions import Annotated
 from utils import (
     base_delete_request_dict,
+    check_if_none_match,
+    generate_etag,
     generate_link_url,
     generate_presigned_url,
     get_username,
@@ -134,18 +139,28 @@ def get_flows(
         }
     )
     if param_timerange:
+        # The timerange filter is applied in the query to Flows with segments
+        # timerange bounds. Flows without them yet are checked here and have
+        # their bounds set so later queries can filter them directly.
         timerange_filter = TimeRange.from_str(param_timerange)
+        flow_timeranges = get_flow_timeranges(
+            [item["id"] for item in items if not item.get("segments_timerange_indexed")]
+        )
+        for unindexed_id, flow_timerange in flow_timeranges.items():
+            set_flow_segments_timerange(unindexed_id, flow_timerange)
         if timerange_filter.is_empty():
             items = [
                 item
                 for item in items
-                if TimeRange.from_str(get_flow_timerange(item["id"])).is_empty()
+                if item["id"] not in flow_timeranges
+                or TimeRange.from_str(flow_timeranges[item["id"]]).is_empty()
             ]
         else:
             items = [
                 item
                 for item in items
-                if not TimeRange.from_str(get_flow_timerange(item["id"]))
+                if item["id"] not in flow_timeranges
+                or not TimeRange.from_str(flow_timeranges[item["id"]])
                 .intersect_with(timerange_filter)
                 .is_empty()
             ]
@@ -185,16 +200,32 @@ def get_flow_by_id(
     except ValueError as e:
         raise NotFoundError("The requested flow does not exist.") from e  # 404
     if param_include_timerange:
-        item["timerange"] = get_flow_timerange(flow_id)
+        item["timerange"] = get_flow_timeranges([flow_id])[flow_id]
     # Update timerange if timerange parameter supplied
     if param_timerange and param_include_timerange:
         timerange_filter = TimeRange.from_str(param_timerange)
         item["timerange"] = str(
             timerange_filter.intersect_with(TimeRange.from_str(item["timerange"]))
         )
+    custom_headers = {"ETag": generate_etag(item)}
+    if check_if_none_match(app.current_event, custom_headers["ETag"]):
+        return Response(
+            status_code=HTTPStatus.NOT_MODIFIED.value,  # 304
+            body=None,
+            headers=custom_headers,
+        )
     if app.current_event.request_context.http_method == "HEAD":
-        return None, HTTPStatus.OK.value  # 200
-    return model_dump(Flow(item)), HTTPStatus.OK.value  # 200
+        return Response(
+            status_code=HTTPStatus.OK.value,  # 200
+            body=None,
+            headers=custom_headers,
+        )
+    return Response(
+        status_code=HTTPStatus.OK.value,  # 200
+        content_type=content_types.APPLICATION_JSON,
+        body=model_dump(Flow(item)),
+        headers=custom_headers,
+    )
 
 
 @app.put("/flows/<flowId>")
@@ -271,6 +302,7 @@ def delete_flow_by_id(
     flow_timerange = TimeRange.from_str(get_flow_timerange(flow_id))
     if flow_timerange.is_empty():
         source_id = delete_flow(flow_id)
+        delete_flow_timerange_summary(flow_id)
         if source_id:
             publish_event(
                 f"{record_type}s/deleted",
@@ -22,16 +22,18 @@ from aws_lambda_powertools.event_handler.openapi.params import Body, Path, Query
 from aws_lambda_powertools.logging import correlation_paths
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from dynamodb import (
-    append_to_segment_list,
-    list_storage_backends,
+    get_stored_object_instances,
+    is_object_referenced,
     page_targets_init_index,
+    query_object_flow_segments,
     query_segments_by_init_object_id,
     query_segments_by_object_id,
-    remove_get_url_by_label_from_segment,
-    remove_storage_id_from_segment,
+    seed_object_instances,
+    storage_backend_registry,
     storage_table,
+    update_object_instances,
 )
-from neptune import query_object_flows
+from neptune import query_object_flows, set_flows_segments_version
 from schema import Object, Objectsinstancespost, Uuid
 from segment_get_urls import populate_get_urls
 from typing_extensions import Annotated
@@ -79,17 +81,37 @@ def get_objects_by_id(
     param_tag_values, param_tag_exists = parse_tag_parameters(
         app.current_event.query_string_parameters
     )
+    storage_item = storage_table.get_item(
+        Key={"id": object_id},
+        ProjectionExpression="flow_id, timerange, ref_count, is_init_object",
+    ).get("Item", {})
+    # A storage record maintaining reference counts shows an unreferenced
+    # Object without paging either index. A count of zero is confirmed first,
+    # as an interrupted update can leave it behind the segments.
+    if (
+        param_page is None
+        and storage_item.get("ref_count") == 0
+        and not is_object_referenced(object_id)
+    ):
+        raise NotFoundError("The requested Object does not exist.")  # 404
     # An init Object is never a Segment's object_id; it is referenced
     # indirectly via init_object_id on Media Object Segments. Query the right
     # index: on a paged request the token itself indicates which index it came
-    # from; otherwise try the media index first and fall back to init.
-    if param_page is not None and page_targets_init_index(param_page):
+    # from, a claimed init Object is flagged on its storage record; otherwise
+    # try the media index first and fall back to init.
+    if (
+        page_targets_init_index(param_page)
+        if param_page is not None
+        else storage_item.get("is_init_object")
+    ):
         is_init_object = True
         items, last_evaluated_key, limit_used = query_segments_by_init_object_id(
             object_id,
             limit=param_limit,
             page=param_page,
         )
+        if len(items) == 0 and param_page is None:
+            raise NotFoundError("The requested Object does not exist.")  # 404
     else:
         is_init_object = False
         items, last_evaluated_key, limit_used = query_segments_by_object_id(
@@ -123,13 +145,11 @@ def get_objects_by_id(
             body=None,
             headers=custom_headers,
         )
-    get_item = storage_table.get_item(
-        Key={"id": object_id}, ProjectionExpression="flow_id, timerange"
-    )
     if is_init_object:
         # An init Object is a first-class Object: its controlled location is
         # held in the referencing Segments' init_storage_ids and any
-        # uncontrolled instances in init_get_urls.
+        # uncontrolled instances in init_get_urls, unless its storage record
+        # holds them (joined by populate_get_urls).
         combined_item = {
             "object_id": object_id,
             "get_urls": get_unique_get_urls(items, attribute="init_get_urls"),
@@ -191,7 +211,7 @@ def get_objects_by_id(
         key_frame_count = None
     else:
         timerange = (
-            get_item.get("Item", {}).get("timerange")
+            storage_item.get("timerange")
             or items[0].get("object_timerange")
             or items[0]["timerange"]
         )
@@ -207,7 +227,7 @@ def get_objects_by_id(
         **{
             "id": object_id,
             "referenced_by_flows": set([item["flow_id"] for item in items]),
-            "first_referenced_by_flow": get_item.get("Item", {}).get("flow_id"),
+            "first_referenced_by_flow": storage_item.get("flow_id"),
             "timerange": timerange,
             "get_urls": combined_item.get("get_urls"),
             "key_frame_count": key_frame_count,
@@ -241,19 +261,16 @@ def post_objects_by_id(
     items, is_init_object = resolve_object_segments(object_id)
     if len(items) == 0:
         raise NotFoundError("The Object does not exist.")  # 404
-    # An init Object holds its instances in the init_ fields of the Segments
-    # that reference it; a Media Object in the plain fields.
-    storage_attr = "init_storage_ids" if is_init_object else "storage_ids"
-    get_urls_attr = "init_get_urls" if is_init_object else "get_urls"
-    existing_storage_ids = set(
-        storage_id for item in items for storage_id in item.get(storage_attr, [])
-    )
+    # An init Object's instances are seeded from the init_ fields of the
+    # Segments that reference it; a Media Object's from the plain fields.
+    seed = get_object_seed(items, is_init_object)
+    instances = get_stored_object_instances(object_id) or seed
     if hasattr(object_instance.root, "storage_id"):
-        if object_instance.root.storage_id.root in existing_storage_ids:
+        if object_instance.root.storage_id.root in instances["storage_ids"]:
             raise BadRequestError(
                 "The Object specified is already available on this Storage Backend."
             )  # 400
-        if existing_storage_ids:
+        if instances["storage_ids"]:
             put_message(
                 duplication_queue,
                 {
@@ -267,32 +284,25 @@ def post_objects_by_id(
                 "The Object specified does not currently exist on controlled storage."
             )  # 400
     elif hasattr(object_instance.root, "url"):
-        storage_backends = list_storage_backends()
-        storage_labels = set(item["label"] for item in storage_backends)
-        presigned_labels = set(
-            item["label"].replace(":s3:", ":s3.presigned:")
-            for item in storage_backends
-            if ":s3:" in item["label"]
-        )
-        if object_instance.root.label and object_instance.root.label in (
-            storage_labels | presigned_labels
+        if (
+            object_instance.root.label
+            and object_instance.root.label in storage_backend_registry.get().by_label
         ):
             raise BadRequestError(
                 "The specified label is already in use by a storage backend."
             )  # 400
-        existing_labels = set(
-            get_url.get("label")
-            for item in items
-            for get_url in item.get(get_urls_attr, [])
-        )
+        existing_labels = set(get_url.get("label") for get_url in instances["get_urls"])
         if object_instance.root.label in existing_labels:
             raise BadRequestError(
                 "The Object specified already exists with this label."
             )  # 400
-        for item in items:
-            append_to_segment_list(
-                item, get_urls_attr, model_dump(object_instance.root)
+        try:
+            update_object_instances(
+                object_id, seed, add_get_url=model_dump(object_instance.root)
             )
+        except ValueError as e:
+            raise NotFoundError("The Object does not exist.") from e  # 404
+        set_flows_segments_version({item["flow_id"] for item in items})
     else:
         raise BadRequestError("Unexpected request body content.")  # 400
     return None, HTTPStatus.CREATED.value  # 201
@@ -312,61 +322,43 @@ def delete_objects_by_id(
     items, is_init_object = resolve_object_segments(object_id)
     if len(items) == 0:
         raise NotFoundError("The requested Object ID in the path is invalid.")  # 404
-    storage_attr = "init_storage_ids" if is_init_object else "storage_ids"
-    get_urls_attr = "init_get_urls" if is_init_object else "get_urls"
+    seed = get_object_seed(items, is_init_object)
+    instances = get_stored_object_instances(object_id) or seed
 
-    # Filter items based on storage_id and/or label
-    if param_storage_id:
-        items = [
-            item for item in items if param_storage_id in item.get(storage_attr, [])
-        ]
-    if param_label:
-        items = [
-            item
-            for item in items
-            if any(
-                get_url.get("label") == param_label
-                for get_url in item.get(get_urls_attr, [])
-            )
-        ]
-
-    # Check if relevant items exist
-    if len(items) == 0:
+    # Check the storage_id and/or label exist
+    if (param_storage_id and param_storage_id not in instances["storage_ids"]) or (
+        param_label
+        and not any(
+            get_url.get("label") == param_label for get_url in instances["get_urls"]
+        )
+    ):
         raise NotFoundError(
             "The label or storage_id supplied do not exist for the Object ID in the path."
         )  # 404
 
-    storage_ids = list(
-        {storage_id for item in items for storage_id in item.get(storage_attr, [])}
-    )
-    get_urls = get_unique_get_urls(items, attribute=get_urls_attr)
-
-    # Check if deleting last storage_id instance
-    if param_storage_id and storage_ids == [param_storage_id] and not get_urls:
-        raise BadRequestError(
-            "All instances would be deleted. Use flow segment deletion instead."
-        )  # 400
-
-    # Check if deleting last get_url instance
-    if param_label and (
-        not storage_ids
-        and len(get_urls) == 1
-        and get_urls[0].get("label") == param_label
+    # Check if deleting the last instance
+    if not any(
+        storage_id != param_storage_id for storage_id in instances["storage_ids"]
+    ) and not any(
+        param_label is None or get_url.get("label") != param_label
+        for get_url in instances["get_urls"]
     ):
         raise BadRequestError(
             "All instances would be deleted. Use flow segment deletion instead."
         )  # 400
 
-    # Update flow segments
-    for item in items:
-        if param_storage_id:
-            remove_storage_id_from_segment(
-                item, param_storage_id, attribute=storage_attr
-            )
-        if param_label:
-            remove_get_url_by_label_from_segment(
-                item, param_label, attribute=get_urls_attr
-            )
+    try:
+        update_object_instances(
+            object_id,
+            seed,
+            remove_storage_id=param_storage_id,
+            remove_label=param_label,
+        )
+    except ValueError as e:
+        raise NotFoundError(
+            "The requested Object ID in the path is invalid."
+        ) from e  # 404
+    set_flows_segments_version({item["flow_id"] for item in items})
 
     if param_storage_id:
         # Send message to S3 SQS to delete item if no longer in use
@@ -398,14 +390,21 @@ def handle_validation_error(ex: RequestValidationError):
 
 @tracer.capture_method(capture_response=False)
 def resolve_object_segments(object_id: str) -> tuple[list, bool]:
-    """Resolve the Segments that reference an Object, from either index.
+    """Resolve one Segment from each Flow referencing an Object, from either index.
 
     Returns (segments, is_init_object). An Object is a Media Object if any
     Segment carries it as object_id; otherwise it is an init Object if any
     Segment carries it as init_object_id. Empty list means it does not exist.
     """
-    items, _, _ = query_segments_by_object_id(object_id, fetch_all=True)
+    items = query_object_flow_segments(object_id)
     if items:
         return items, False
-    init_items, _, _ = query_segments_by_init_object_id(object_id, fetch_all=True)
-    return init_items, True
+    return query_object_flow_segments(object_id, init_object=True), True
+
+
+@tracer.capture_method(capture_response=False)
+def get_object_seed(items: list[dict], is_init_object: bool) -> dict:
+    """Get the instances of an Object from the Segments that reference it, see seed_object_instances"""
+    if is_init_object:
+        return seed_object_instances(items, "init_storage_ids", "init_get_urls")
+    return seed_object_instances(items)
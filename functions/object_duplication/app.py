@@ -9,11 +9,13 @@ from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSEvent, SQS
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from boto3.s3.transfer import TransferConfig
 from dynamodb import (
-    append_to_segment_list,
     get_storage_backend,
-    query_segments_by_init_object_id,
-    query_segments_by_object_id,
+    get_stored_object_instances,
+    query_object_flow_segments,
+    seed_object_instances,
+    update_object_instances,
 )
+from neptune import set_flows_segments_version
 
 tracer = Tracer()
 logger = Logger()
@@ -35,16 +37,15 @@ def record_handler(record: SQSRecord) -> None:
     dst_storage_id = body["destination_storage_id"]
     dst_storage_backend = get_storage_backend(dst_storage_id)
     is_init_object = body.get("is_init_object", False)
-    # An init Object is referenced via init_object_id and holds its controlled
-    # locations in init_storage_ids; a Media Object uses the plain fields.
-    storage_attr = "init_storage_ids" if is_init_object else "storage_ids"
+    # An init Object is referenced via init_object_id and its instances are
+    # seeded from init_storage_ids and init_get_urls; a Media Object uses the
+    # plain fields.
+    items = query_object_flow_segments(object_id, init_object=is_init_object)
     if is_init_object:
-        items, _, _ = query_segments_by_init_object_id(object_id, fetch_all=True)
+        seed = seed_object_instances(items, "init_storage_ids", "init_get_urls")
     else:
-        items, _, _ = query_segments_by_object_id(object_id, fetch_all=True)
-    src_storage_ids = list(
-        {storage_id for item in items for storage_id in item.get(storage_attr, [])}
-    )
+        seed = seed_object_instances(items)
+    src_storage_ids = (get_stored_object_instances(object_id) or seed)["storage_ids"]
     src_storage_backend = get_storage_backend(src_storage_ids[0])
     src_metadata = s3.head_object(
         Bucket=src_storage_backend["bucket_name"], Key=object_id
@@ -62,8 +63,17 @@ def record_handler(record: SQSRecord) -> None:
             "MetadataDirective": "COPY",
         },
     )
-    for item in items:
-        append_to_segment_list(item, storage_attr, dst_storage_id)
+    try:
+        update_object_instances(object_id, seed, add_storage_id=dst_storage_id)
+    except ValueError:
+        # The Object was deleted during the copy, so nothing tracks the copy
+        logger.warning(
+            "Object storage record no longer exists, removing the copy",
+            extra={"object_id": object_id, "storage_id": dst_storage_id},
+        )
+        s3.delete_object(Bucket=dst_storage_backend["bucket_name"], Key=object_id)
+        return
+    set_flows_segments_version({item["flow_id"] for item in items})
 
 
 @logger.inject_lambda_context(log_event=True)
@@ -16,6 +16,7 @@ from neptune import (
     check_delete_source,
     delete_flow,
     enhance_resources,
+    flush_flow_segments_updated,
     set_node_property_base,
 )
 from utils import publish_event
@@ -86,9 +87,20 @@ def record_handler(
 @tracer.capture_lambda_handler(capture_response=False)
 @metrics.log_metrics(capture_cold_start_metric=True)
 def lambda_handler(event: SQSEvent, context: LambdaContext) -> dict:
-    return process_partial_response(
-        event=event,
-        record_handler=record_handler,
-        processor=batch_processor,
-        context=context,
-    )
+    try:
+        return process_partial_response(
+            event=event,
+            record_handler=record_handler,
+            processor=batch_processor,
+            context=context,
+        )
+    finally:
+        # The segments are already written, so a failure to update the Flows
+        # is logged rather than failing the invocation, which would be retried
+        try:
+            flush_flow_segments_updated()
+        except Exception as e:
+            logger.error(
+                "Failed to write the Flow segments_updated updates.",
+                extra={"exception": str(e)},
+            )
@@ -14,6 +14,7 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 from dynamodb import (
     delete_flow_storage_record,
     get_default_storage_backend,
+    get_object_references,
     get_storage_backend,
     query_segments_by_init_object_id,
     query_segments_by_object_id,
@@ -54,37 +55,44 @@ def record_handler(record: SQSRecord) -> None:
             # Empty list means no S3 cleanup needed, just flow storage record
             delete_flow_storage_record(object_id)
 
-        # An object may be referenced as a media object (object_id) or as an
-        # init object (init_object_id). Both keep the object alive, so check
-        # both indexes before deleting anything from S3.
-        media_items, _, _ = query_segments_by_object_id(
-            object_id, projection="storage_ids", fetch_all=True
-        )
-        init_items, _, _ = query_segments_by_init_object_id(
-            object_id, projection="init_storage_ids", fetch_all=True
-        )
+        # The storage record holds the reference count and the instances of
+        # an Object when they are maintained, so they are read with a single
+        # GetItem before falling back to querying the segments.
+        ref_count, ddb_storage_ids = get_object_references(object_id)
+        if ref_count is None:
+            # An object may be referenced as a media object (object_id) or as an
+            # init object (init_object_id). Both keep the object alive, so check
+            # both indexes before deleting anything from S3.
+            media_items, _, _ = query_segments_by_object_id(
+                object_id, projection="storage_ids", fetch_all=True
+            )
+            init_items, _, _ = query_segments_by_init_object_id(
+                object_id, projection="init_storage_ids", fetch_all=True
+            )
+            ref_count = len(media_items) + len(init_items)
+            if ddb_storage_ids is None:
+                # Collect all unique storage_ids still referencing this object
+                ddb_storage_ids = set()
+                # Handle DynamoDB storage_ids: missing -> default, empty -> empty
+                for item in media_items:
+                    item_storage_ids = item.get("storage_ids")
+                    if item_storage_ids is None:
+                        ddb_storage_ids.add(default_storage_backend["id"])
+                    else:
+                        ddb_storage_ids.update(item_storage_ids)
+                for item in init_items:
+                    item_storage_ids = item.get("init_storage_ids")
+                    if item_storage_ids is None:
+                        ddb_storage_ids.add(default_storage_backend["id"])
+                    else:
+                        ddb_storage_ids.update(item_storage_ids)
 
-        # If nothing references this object as media or init, delete for all storage_ids
-        if len(media_items) == 0 and len(init_items) == 0:
-            for storage_id in storage_ids:
+        # If nothing references this object as media or init, delete for all
+        # storage_ids, including instances held on its storage record
+        if ref_count == 0:
+            for storage_id in dict.fromkeys([*storage_ids, *ddb_storage_ids]):
                 delete_objects[storage_id].append({"Key": object_id})
         else:
-            # Collect all unique storage_ids still referencing this object
-            ddb_storage_ids = set()
-            # Handle DynamoDB storage_ids: missing -> default, empty -> empty
-            for item in media_items:
-                item_storage_ids = item.get("storage_ids")
-                if item_storage_ids is None:
-                    ddb_storage_ids.add(default_storage_backend["id"])
-                else:
-                    ddb_storage_ids.update(item_storage_ids)
-            for item in init_items:
-                item_storage_ids = item.get("init_storage_ids")
-                if item_storage_ids is None:
-                    ddb_storage_ids.add(default_storage_backend["id"])
-                else:
-                    ddb_storage_ids.update(item_storage_ids)
-
             # Only delete storage_ids not found in DDB
             for storage_id in storage_ids:
                 if storage_id not in ddb_storage_ids:
@@ -5,25 +5,28 @@ from aws_lambda_powertools.utilities.data_classes.event_bridge_event import (
     EventBridgeEvent,
 )
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from dynamodb import get_default_storage_backend, get_storage_backend, get_store_name
+from dynamodb import get_default_storage_backend, storage_backend_registry
 from neptune import get_matching_webhooks, set_node_property_base
 from segment_get_urls import populate_get_urls
-from utils import filter_dict, model_dump, put_message
+from utils import MessageBuffer, filter_dict, model_dump
 
 tracer = Tracer()
 logger = Logger()
 metrics = Metrics()
 
 webhooks_queue = os.environ["WEBHOOKS_QUEUE_URL"]
-store_name = get_store_name()
 
 
 @tracer.capture_method(capture_response=False)
 def post_event(
-    event, item, get_urls=None, init_get_urls=None, include_object_timerange=False
+    message_buffer,
+    event,
+    item,
+    get_urls=None,
+    init_get_urls=None,
+    include_object_timerange=False,
 ):
-    put_message(
-        webhooks_queue,
+    message_buffer.add(
         {
             "event": event.raw_event,
             "item": model_dump(item),
@@ -88,15 +91,7 @@ def lambda_handler(event: EventBridgeEvent, context: LambdaContext):
             if not segment.get("storage_ids") and not segment.get("get_urls"):
                 segment["storage_ids"] = [default_storage_backend["id"]]
         # Get storage metadata mapping
-        storage_mapping = {
-            default_storage_backend["id"]: default_storage_backend,
-            **{
-                storage_id: get_storage_backend(storage_id)
-                for segment in event.detail["segments"]
-                for storage_id in segment.get("storage_ids", [])
-                if storage_id != default_storage_backend["id"]
-            },
-        }
+        storage_mapping = storage_backend_registry.get().by_id
         # Add ALL get_urls to event
         populate_get_urls(event.detail["segments"], include_storage_id=True)
         # object_timerange is only stored when it differs from the segment
@@ -104,60 +99,68 @@ def lambda_handler(event: EventBridgeEvent, context: LambdaContext):
         # when a webhook requests it. Inclusion is decided per-webhook below.
         for segment in event.detail["segments"]:
             segment.setdefault("object_timerange", segment["timerange"])
-    for item in schema_items:
-        # Update status to started if created
-        if item.status.value == "created":
-            set_node_property_base(
-                "webhook", item.id.root, {"webhook.status": "started"}
-            )
-        # Not a segments_added event so no further action required just send it.
-        if event.detail_type != "flows/segments_added":
-            post_event(event, item)
-            continue
-        segment = event.detail["segments"][0]
-        get_urls = [*segment.get("get_urls", [])]
-        # init_object.get_urls (if present) are filtered identically to the
-        # Segment's own get_urls; None when the Segment has no init Object.
-        init_object = segment.get("init_object")
-        init_get_urls = [*init_object.get("get_urls", [])] if init_object else None
-        # No filtering of the get_urls has been requested so send event with all get_urls
-        if (
-            item.accept_get_urls is None
-            and item.accept_storage_ids is None
-            and item.presigned is None
-            and item.verbose_storage is None
-        ):
-            # Remove storage_id since no verbose_storage requested
+    # Messages for all the matching webhooks are sent in batches
+    with MessageBuffer(webhooks_queue) as message_buffer:
+        for item in schema_items:
+            # Update status to started if created
+            if item.status.value == "created":
+                set_node_property_base(
+                    "webhook", item.id.root, {"webhook.status": "started"}
+                )
+            # Not a segments_added event so no further action required just send it.
+            if event.detail_type != "flows/segments_added":
+                post_event(message_buffer, event, item)
+                continue
+            segment = event.detail["segments"][0]
+            get_urls = [*segment.get("get_urls", [])]
+            # init_object.get_urls (if present) are filtered identically to the
+            # Segment's own get_urls; None when the Segment has no init Object.
+            init_object = segment.get("init_object")
+            init_get_urls = [*init_object.get("get_urls", [])] if init_object else None
+            # No filtering of the get_urls has been requested so send event with all get_urls
+            if (
+                item.accept_get_urls is None
+                and item.accept_storage_ids is None
+                and item.presigned is None
+                and item.verbose_storage is None
+            ):
+                # Remove storage_id since no verbose_storage requested
+                post_event(
+                    message_buffer,
+                    event,
+                    item,
+                    [filter_dict(get_url, {"storage_id"}) for get_url in get_urls],
+                    (
+                        [
+                            filter_dict(get_url, {"storage_id"})
+                            for get_url in init_get_urls
+                        ]
+                        if init_get_urls is not None
+                        else None
+                    ),
+                    bool(item.include_object_timerange),
+                )
+                continue
+            # No get_urls are requested so send event with no get_urls
+            if item.accept_get_urls is not None and len(item.accept_get_urls) == 0:
+                post_event(
+                    message_buffer,
+                    event,
+                    item,
+                    [],
+                    [] if init_get_urls is not None else None,
+                    bool(item.include_object_timerange),
+                )
+                continue
             post_event(
+                message_buffer,
                 event,
                 item,
-                [filter_dict(get_url, {"storage_id"}) for get_url in get_urls],
+                filter_webhook_get_urls(get_urls, item, storage_mapping),
                 (
-                    [filter_dict(get_url, {"storage_id"}) for get_url in init_get_urls]
+                    filter_webhook_get_urls(init_get_urls, item, storage_mapping)
                     if init_get_urls is not None
                     else None
                 ),
                 bool(item.include_object_timerange),
             )
-            continue
-        # No get_urls are requested so send event with no get_urls
-        if item.accept_get_urls is not None and len(item.accept_get_urls) == 0:
-            post_event(
-                event,
-                item,
-                [],
-                [] if init_get_urls is not None else None,
-                bool(item.include_object_timerange),
-            )
-            continue
-        post_event(
-            event,
-            item,
-            filter_webhook_get_urls(get_urls, item, storage_mapping),
-            (
-                filter_webhook_get_urls(init_get_urls, item, storage_mapping)
-                if init_get_urls is not None
-                else None
-            ),
-            bool(item.include_object_timerange),
-        )
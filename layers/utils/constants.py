@@ -23,4 +23,44 @@ MIN_OBJECT_TIMEOUT_SECS = 3600
 MIN_PRESIGNED_URL_TIMEOUT_SECS = 3600
 SERVICE_INFO_ID = "1"
 DDB_MAX_RETRIES = 3
+RETRY_BACKOFF_BASE_SECS = 0.05
+RETRY_BACKOFF_MAX_SECS = 1
 ADMIN_SCOPE = "tams-api/admin"
+BATCH_GET_ITEM_LIMIT = 100
+PUT_EVENTS_ENTRY_LIMIT = 10
+FLOW_TIMERANGE_RECORD_TYPE = "flow-timerange"
+FLOW_TIMERANGE_SUMMARY_TTL_SECS = 3600
+FLOW_TIMERANGE_PROPERTIES = {
+    "segments_timerange_start",
+    "segments_timerange_end",
+    "segments_timerange_indexed",
+}
+FLOW_INTERNAL_PROPERTIES = {*FLOW_TIMERANGE_PROPERTIES, "segments_version"}
+NEPTUNE_MAX_WORKERS = 16
+NEPTUNE_SLOW_QUERY_MS = 1000
+FLOW_RESOURCES_CACHE_TTL_SECS = 5
+FLOW_RESOURCES_CACHE_SIZE = 1000
+PUT_EVENTS_SIZE_LIMIT = 256000
+SEND_MESSAGE_BATCH_LIMIT = 10
+BATCH_MAX_RETRIES = 3
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "Throttling",
+    "RequestThrottled",
+    "AWS.SimpleQueueService.RequestThrottled",
+    "TooManyRequestsException",
+}
+DELETE_MAX_WORKERS = 4
+PRESIGNED_URL_CACHE_BUCKET_SECS = 300
+PRESIGNED_URL_CACHE_SIZE = 10000
+PRESIGN_MAX_WORKERS = 16
+STORAGE_BACKENDS_CACHE_TTL_SECS = 60
+MAX_SEGMENTS_WAIT_SECS = 20
+SEGMENTS_WAIT_INTERVAL_SECS = 0.2
+COVERAGE_CACHE_SIZE = 1000
+MULTI_FLOW_MAX_FLOWS = 20
+MULTI_FLOW_MAX_WORKERS = 8
+QUERY_MAX_WORKERS = 8
+SEGMENTS_READ_AHEAD_MAX_LIMIT = 1000
+SEGMENTS_QUERY_CAPACITY_BUDGET = 100
+REF_COUNT_ATTRIBUTE = "ref_count"
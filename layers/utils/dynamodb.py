@@ -1,17 +1,22 @@
 import base64
 import json
+import math
 import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
-from functools import lru_cache
-from typing import Type
+from itertools import batched
+from typing import Self, Type
 
 import boto3
 
 # pylint: disable=no-member
 import constants
-from aws_lambda_powertools import Tracer
+from aws_lambda_powertools import Metrics, Tracer
 from aws_lambda_powertools.event_handler.exceptions import BadRequestError
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from boto3.dynamodb.conditions import And, Attr, Key
 from botocore.exceptions import ClientError
@@ -21,21 +26,28 @@ from neptune import (
     merge_delete_request,
     update_flow_segments_updated,
 )
-from schema import Flowsegmentpost
+from schema import Flowsegmentpost, Storagebackend
+from segment_timeranges import get_segment_bounds
 from utils import (
+    EventBuffer,
+    backoff,
     calculate_object_timerange,
+    get_unique_get_urls,
+    model_dump,
     pop_outliers,
-    publish_event,
     put_message,
     put_message_batches,
 )
 
 tracer = Tracer()
+metrics = Metrics()
 
 dynamodb = boto3.resource("dynamodb")
 service_table = dynamodb.Table(os.environ.get("SERVICE_TABLE", ""))
 segments_table = dynamodb.Table(os.environ.get("SEGMENTS_TABLE", ""))
 storage_table = dynamodb.Table(os.environ.get("STORAGE_TABLE", ""))
+delete_executor = ThreadPoolExecutor(max_workers=constants.DELETE_MAX_WORKERS)
+query_executor = ThreadPoolExecutor(max_workers=constants.QUERY_MAX_WORKERS)
 
 
 class TimeRangeBoundary(Enum):
@@ -43,11 +55,58 @@ class TimeRangeBoundary(Enum):
     END = "end"
 
 
+@tracer.capture_method(capture_response=False)
+def get_delete_error(error_type: str, summary: str, key: dict, metadata: dict) -> dict:
+    """Returns the Delete Request error for a segment that could not be deleted"""
+    return {
+        "type": error_type,
+        "summary": summary,
+        "traceback": [
+            f"Delete Segment Key: {json.dumps(key, default=str)}",
+            json.dumps(metadata, default=str),
+        ],
+        "time": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+
+@tracer.capture_method(capture_response=False)
+def delete_segment_item(item: dict) -> tuple[dict | None, dict | None]:
+    """Delete a single segment, returning its old attributes if this call deleted it and an error if it could not be.
+
+    DeleteItem returns the old attributes only when the segment existed, so a
+    segment deleted concurrently by another request is reported by exactly one
+    of them and its Object references are only ever subtracted once.
+    """
+    key = {"flow_id": item["flow_id"], "timerange_end": item["timerange_end"]}
+    try:
+        # The client is used as, unlike the resource, it is thread safe
+        delete_item = dynamodb.meta.client.delete_item(
+            TableName=segments_table.name,
+            Key=key,
+            ReturnValues="ALL_OLD",
+        )
+    except ClientError as e:
+        return None, get_delete_error(
+            e.response["Error"]["Code"],
+            e.response["Error"]["Message"],
+            key,
+            e.response["ResponseMetadata"],
+        )
+    return delete_item.get("Attributes"), None
+
+
 @tracer.capture_method(capture_response=False)
 def delete_segment_items(
     items: list[dict], object_ids: set[str], resources: list | None = None
 ) -> dict | None:
-    """Loop supplied items and delete, early return on error, append to object_ids supplied on success.
+    """Delete supplied items and return the first error, append to object_ids supplied on success.
+
+    The items are deleted concurrently on a bounded pool of workers with one
+    DeleteItem each. BatchWriteItem is not used as it cannot return the old
+    attributes, so it would also report segments deleted concurrently by
+    another request. Only the segments confirmed deleted by this call publish
+    a flows/segments_deleted event and have their references subtracted from
+    their Objects.
 
     `resources` may hold the pre-resolved flows/segments_deleted event resources
     (source, collected-by, etc.). This is required when the Flow is being
@@ -58,45 +117,33 @@ def delete_segment_items(
     deletion, Flow still exists) the resources are resolved live per flow_id.
     """
     delete_error = None
-    for item in items:
-        key = {
-            "flow_id": item["flow_id"],
-            "timerange_end": item["timerange_end"],
-        }
-        try:
-            delete_item = segments_table.delete_item(
-                Key=key,
-                ReturnValues="ALL_OLD",
-            )
-            if "Attributes" in delete_item:
-                object_ids.add((item["object_id"], tuple(item.get("storage_ids", []))))
-                if item.get("init_object_id"):
-                    object_ids.add(
-                        (
-                            item["init_object_id"],
-                            tuple(item.get("init_storage_ids", [])),
-                        )
-                    )
-                publish_event(
-                    "flows/segments_deleted",
-                    {"flow_id": item["flow_id"], "timerange": item["timerange"]},
+    deleted_items = []
+    for item, item_error in delete_executor.map(delete_segment_item, items):
+        delete_error = delete_error or item_error
+        if item is not None:
+            deleted_items.append(item)
+    # The references are subtracted before publishing, which raises if the
+    # events cannot be sent, so that the counts match the segments regardless
+    update_object_ref_counts(get_object_ref_counts(deleted_items), sign=-1)
+    with EventBuffer() as event_buffer:
+        for item in deleted_items:
+            object_ids.add((item["object_id"], tuple(item.get("storage_ids", []))))
+            if item.get("init_object_id"):
+                object_ids.add(
                     (
-                        resources
-                        if resources is not None
-                        else enhance_resources([f"tams:flow:{item['flow_id']}"])
-                    ),
+                        item["init_object_id"],
+                        tuple(item.get("init_storage_ids", [])),
+                    )
                 )
-        except ClientError as e:
-            delete_error = {
-                "type": e.response["Error"]["Code"],
-                "summary": e.response["Error"]["Message"],
-                "traceback": [
-                    f"Delete Segment Key: {json.dumps(key, default=str)}",
-                    json.dumps(e.response["ResponseMetadata"], default=str),
-                ],
-                "time": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
-            }
-            break
+            event_buffer.add(
+                "flows/segments_deleted",
+                {"flow_id": item["flow_id"], "timerange": item["timerange"]},
+                (
+                    resources
+                    if resources is not None
+                    else enhance_resources([f"tams:flow:{item['flow_id']}"])
+                ),
+            )
     return delete_error
 
 
@@ -132,6 +179,263 @@ def get_flow_timerange(flow_id: str) -> str:
     return "()"
 
 
+@tracer.capture_method(capture_response=False)
+def get_summary_timerange(summary: dict) -> str:
+    """Get the timerange described by a flow timerange summary record"""
+    if "first_timerange" not in summary or "last_timerange" not in summary:
+        return "()"
+    return str(
+        TimeRange.from_str(summary["first_timerange"]).extend_to_encompass_timerange(
+            TimeRange.from_str(summary["last_timerange"])
+        )
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def extend_flow_timerange_summary(flow_id: str, items: list[dict]) -> None:
+    """Extend the timerange summary record of a flow to include the supplied segment items.
+
+    The first and last segment are each only replaced when the supplied
+    segment is further out, so concurrent writers (and a concurrent refresh)
+    always converge on the outermost segments.
+    """
+    if not items:
+        return
+    first = min(items, key=lambda item: item["timerange_end"])
+    last = max(items, key=lambda item: item["timerange_end"])
+    for boundary, item, comparison in (("first", first, ">"), ("last", last, "<")):
+        try:
+            service_table.update_item(
+                Key={
+                    "record_type": constants.FLOW_TIMERANGE_RECORD_TYPE,
+                    "id": flow_id,
+                },
+                UpdateExpression=f"SET {boundary}_end = :end, {boundary}_timerange = :timerange",
+                ConditionExpression=f"attribute_not_exists({boundary}_end) OR {boundary}_end {comparison} :end",
+                ExpressionAttributeValues={
+                    ":end": item["timerange_end"],
+                    ":timerange": item["timerange"],
+                },
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                # existing boundary segment is already further out, no action required.
+                continue
+            raise
+
+
+@tracer.capture_method(capture_response=False)
+def delete_flow_timerange_summary(flow_id: str) -> None:
+    """Delete the timerange summary record of a flow so it is recalculated on next use"""
+    service_table.delete_item(
+        Key={"record_type": constants.FLOW_TIMERANGE_RECORD_TYPE, "id": flow_id}
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def refresh_flow_timerange_summary(flow_id: str) -> str:
+    """Recalculate the timerange summary record of a flow from its segments and return the timerange.
+
+    The record is deleted before the segments are read, so any segment written
+    concurrently either is read here or extends the new record afterwards.
+    """
+    delete_flow_timerange_summary(flow_id)
+    first_segment = segments_table.query(
+        KeyConditionExpression=Key("flow_id").eq(flow_id),
+        Limit=1,
+        ScanIndexForward=True,
+        Select="SPECIFIC_ATTRIBUTES",
+        ProjectionExpression="timerange, timerange_end",
+    )["Items"]
+    last_segment = segments_table.query(
+        KeyConditionExpression=Key("flow_id").eq(flow_id),
+        Limit=1,
+        ScanIndexForward=False,
+        Select="SPECIFIC_ATTRIBUTES",
+        ProjectionExpression="timerange, timerange_end",
+    )["Items"]
+    extend_flow_timerange_summary(flow_id, first_segment + last_segment)
+    service_table.update_item(
+        Key={"record_type": constants.FLOW_TIMERANGE_RECORD_TYPE, "id": flow_id},
+        UpdateExpression="SET refreshed_at = :refreshed_at",
+        ExpressionAttributeValues={":refreshed_at": int(datetime.now().timestamp())},
+    )
+    if not first_segment and not last_segment:
+        return "()"
+    return get_summary_timerange(
+        {
+            "first_timerange": (first_segment or last_segment)[0]["timerange"],
+            "last_timerange": (last_segment or first_segment)[0]["timerange"],
+        }
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def get_flow_last_end(flow_id: str) -> int | None:
+    """Get the timerange_end of the last segment of a flow from its timerange summary record.
+
+    A missing record is recalculated from the segments, so None is only
+    returned when the flow has no segments.
+    """
+    key = {"record_type": constants.FLOW_TIMERANGE_RECORD_TYPE, "id": flow_id}
+    get_item = service_table.get_item(
+        Key=key, ProjectionExpression="last_end", ConsistentRead=True
+    )
+    if "Item" not in get_item:
+        refresh_flow_timerange_summary(flow_id)
+        get_item = service_table.get_item(
+            Key=key, ProjectionExpression="last_end", ConsistentRead=True
+        )
+    last_end = get_item.get("Item", {}).get("last_end")
+    return None if last_end is None else int(last_end)
+
+
+@tracer.capture_method(capture_response=False)
+def wait_for_flow_segments(
+    flow_id: str, after: int | None, timeout: float
+) -> tuple[bool, int | None]:
+    """Wait up to timeout seconds for a flow segment ending at or after the nanosecond timestamp after.
+
+    When after is None the wait is for a segment beyond the current last
+    segment. Only the last_end high-water mark of the flow timerange summary
+    record, which every segment write extends, is polled.
+
+    Returns a tuple of (added, last_end). added is True when the segment was
+    written during the wait, and False when it already existed or the timeout
+    elapsed. last_end is the high-water mark when the wait started, None when
+    the flow had no segments.
+    """
+    deadline = time.monotonic() + timeout
+    start_last_end = get_flow_last_end(flow_id)
+    if after is None:
+        after = -1 if start_last_end is None else start_last_end + 1
+    elif start_last_end is not None and start_last_end >= after:
+        return False, start_last_end
+    while time.monotonic() < deadline:
+        time.sleep(
+            max(
+                0,
+                min(constants.SEGMENTS_WAIT_INTERVAL_SECS, deadline - time.monotonic()),
+            )
+        )
+        last_end = get_flow_last_end(flow_id)
+        if last_end is not None and last_end >= after:
+            return True, start_last_end
+    return False, start_last_end
+
+
+@tracer.capture_method(capture_response=False)
+def query_segment_bounds(flow_id: str, start: int | None = None):
+    """Yield the inclusive nanosecond bounds of the flow segments ending at or after start, in order.
+
+    Only timerange_start and timerange_end are projected and each query page
+    is fetched as it is consumed, so a caller that stops iterating stops
+    querying.
+    """
+    args = {
+        "KeyConditionExpression": Key("flow_id").eq(flow_id),
+        "ProjectionExpression": "timerange_start, timerange_end",
+    }
+    if start is not None:
+        args["KeyConditionExpression"] = And(
+            args["KeyConditionExpression"], Key("timerange_end").gte(start)
+        )
+    while True:
+        query = segments_table.query(**args)
+        for item in query["Items"]:
+            yield (int(item["timerange_start"]), int(item["timerange_end"]))
+        if "LastEvaluatedKey" not in query:
+            return
+        args["ExclusiveStartKey"] = query["LastEvaluatedKey"]
+
+
+@tracer.capture_method(capture_response=False)
+def get_segment_at(
+    flow_id: str, point: int, projection: str | None = None
+) -> dict | None:
+    """Get the segment containing, or else the first segment after, a nanosecond point with a single item key lookup"""
+    args = {
+        "KeyConditionExpression": And(
+            Key("flow_id").eq(flow_id), Key("timerange_end").gte(point)
+        ),
+        "Limit": 1,
+    }
+    if projection:
+        args["ProjectionExpression"] = projection
+    items = query_segments(**args)["Items"]
+    return items[0] if items else None
+
+
+@tracer.capture_method(capture_response=False)
+def get_segments_at(
+    flow_id: str, points: list[int], projection: str | None = None
+) -> list[dict]:
+    """Get the distinct segments found by get_segment_at for ordered points, looked up concurrently"""
+    segments = {}
+    for item in query_executor.map(
+        get_segment_at,
+        [flow_id] * len(points),
+        points,
+        [projection] * len(points),
+    ):
+        if item is not None:
+            segments.setdefault(item["timerange_end"], item)
+    return list(segments.values())
+
+
+@tracer.capture_method(capture_response=False)
+def batch_get_items(table_name: str, request: dict) -> tuple[list[dict], list[dict]]:
+    """Get items from a table with BatchGetItem, retrying unprocessed keys with backoff.
+
+    Returns the items read and the keys still unprocessed after DDB_MAX_RETRIES attempts.
+    """
+    request_items = {table_name: request}
+    items = []
+    for attempt in range(constants.DDB_MAX_RETRIES):
+        if attempt:
+            backoff(attempt)
+        batch_get = dynamodb.batch_get_item(RequestItems=request_items)
+        items.extend(batch_get["Responses"].get(table_name, []))
+        request_items = batch_get.get("UnprocessedKeys", {})
+        if not request_items:
+            break
+    return items, request_items.get(table_name, {}).get("Keys", [])
+
+
+@tracer.capture_method(capture_response=False)
+def get_flow_timeranges(flow_ids: list[str]) -> dict[str, str]:
+    """Get the timeranges for the specified flows from their timerange summary records.
+
+    All records are read with BatchGetItem. Records that are missing, were
+    created by a segment write before any refresh, or were last refreshed
+    longer ago than FLOW_TIMERANGE_SUMMARY_TTL_SECS are recalculated from the
+    segments. Segment deletions remove the record, while the periodic refresh
+    bounds how long a deletion racing with a refresh can leave it too wide.
+    """
+    keys = [
+        {"record_type": constants.FLOW_TIMERANGE_RECORD_TYPE, "id": flow_id}
+        for flow_id in dict.fromkeys(flow_ids)
+    ]
+    summaries = {}
+    for keys_batch in batched(keys, constants.BATCH_GET_ITEM_LIMIT):
+        items, _ = batch_get_items(
+            service_table.name, {"Keys": list(keys_batch), "ConsistentRead": True}
+        )
+        for item in items:
+            summaries[item["id"]] = item
+    refresh_after = (
+        int(datetime.now().timestamp()) - constants.FLOW_TIMERANGE_SUMMARY_TTL_SECS
+    )
+    return {
+        key["id"]: (
+            get_summary_timerange(summaries[key["id"]])
+            if summaries.get(key["id"], {}).get("refreshed_at", 0) > refresh_after
+            else refresh_flow_timerange_summary(key["id"])
+        )
+        for key in keys
+    }
+
+
 @tracer.capture_method(capture_response=False)
 def get_timerange_expression(
     expression_type: Type[Attr] | Type[Key],
@@ -162,6 +466,29 @@ def get_timerange_expression(
 @tracer.capture_method(capture_response=False)
 def get_key_and_args(flow_id: str, parameters: dict) -> dict:
     """Generate key expression and args for a dynamodb query operation"""
+    args, boundary = plan_segments_query(flow_id, parameters)
+    if boundary is not None:
+        set_segments_query_boundary(
+            args, flow_id, boundary, get_exact_timerange_end(flow_id, boundary[1])
+        )
+    return args
+
+
+@tracer.capture_method(capture_response=False)
+def plan_segments_query(
+    flow_id: str, parameters: dict
+) -> tuple[dict, tuple[int | None, int] | None]:
+    """Generate the args for a dynamodb query operation without the boundary probe of get_key_and_args.
+
+    When the timerange has an end the returned boundary holds the lower key
+    bound (None when the timerange has no start) and the end in nanoseconds.
+    The args are then only bounded below, and their FilterExpression drops the
+    segments after the end, so they are correct but may read past the range
+    until set_segments_query_boundary applies the key bound found by
+    get_exact_timerange_end for the end. Otherwise the boundary is None and
+    the args are complete.
+    """
+    boundary = None
     args = {
         "KeyConditionExpression": Key("flow_id").eq(flow_id),
         "ScanIndexForward": not parameters.get("reverse_order", False),
@@ -175,6 +502,9 @@ def get_key_and_args(flow_id: str, parameters: dict) -> dict:
             "flow_id": flow_id,
             "timerange_end": int(parameters["page"]),
         }
+        if parameters.get("object_id"):
+            # A query of the object-id-index continues from the index key too
+            args["ExclusiveStartKey"]["object_id"] = parameters["object_id"]
     # Parse timerange filter out of parameters
     timerange_filter = (
         TimeRange.from_str(parameters["timerange"])
@@ -225,17 +555,9 @@ def get_key_and_args(flow_id: str, parameters: dict) -> dict:
             lower = timerange_filter.start.to_nanosec() + (
                 0 if timerange_filter.includes_start() else 1
             )
-            upper = get_exact_timerange_end(flow_id, timerange_filter.end.to_nanosec())
-            # A non-empty range always has lower <= upper. An empty range (e.g.
-            # "()" or "[5:0_5:0)") normalises to start == end yet is not eternity,
-            # so it reaches here with lower > upper. DynamoDB rejects BETWEEN when
-            # lower > upper with a ValidationException, so clamp upper up to lower:
-            # the retained FilterExpression drops every candidate anyway, leaving
-            # the empty result an empty range must produce.
-            upper = max(upper, lower)
+            boundary = (lower, timerange_filter.end.to_nanosec())
             args["KeyConditionExpression"] = And(
-                args["KeyConditionExpression"],
-                Key("timerange_end").between(lower, upper),
+                args["KeyConditionExpression"], Key("timerange_end").gte(lower)
             )
             # Retain the end filter to drop the boundary segment when it starts
             # after the requested range (i.e. does not actually overlap it).
@@ -248,15 +570,135 @@ def get_key_and_args(flow_id: str, parameters: dict) -> dict:
                 get_timerange_expression(Key, TimeRangeBoundary.END, timerange_filter),
             )
         else:
-            # Get the end of the first overlapping segment and use that to set the key filter when a start timerange is not specified.
-            exact_timerange_end = get_exact_timerange_end(
-                flow_id, timerange_filter.end.to_nanosec()
+            boundary = (None, timerange_filter.end.to_nanosec())
+            args["FilterExpression"] = get_timerange_expression(
+                Attr, TimeRangeBoundary.START, timerange_filter
             )
-            args["KeyConditionExpression"] = And(
-                args["KeyConditionExpression"],
-                Key("timerange_end").lte(exact_timerange_end),
+    return args, boundary
+
+
+@tracer.capture_method(capture_response=False)
+def set_segments_query_boundary(
+    args: dict,
+    flow_id: str,
+    boundary: tuple[int | None, int],
+    exact_timerange_end: int,
+) -> None:
+    """Bound the sort key of args from plan_segments_query above by the get_exact_timerange_end of its boundary.
+
+    Segments in a Flow never overlap, so the first segment with timerange_end
+    >= the filter end is the only one above the range that could still
+    overlap it; every later segment starts after the filter end and would be
+    dropped by the FilterExpression anyway.
+    """
+    lower, _ = boundary
+    if lower is None:
+        args["KeyConditionExpression"] = And(
+            Key("flow_id").eq(flow_id), Key("timerange_end").lte(exact_timerange_end)
+        )
+        return
+    # A non-empty range always has lower <= upper. An empty range (e.g. "()" or
+    # "[5:0_5:0)") normalises to start == end yet is not eternity, so it
+    # reaches here with lower > upper. DynamoDB rejects BETWEEN when lower >
+    # upper with a ValidationException, so clamp upper up to lower: the
+    # retained FilterExpression drops every candidate anyway, leaving the empty
+    # result an empty range must produce.
+    args["KeyConditionExpression"] = And(
+        Key("flow_id").eq(flow_id),
+        Key("timerange_end").between(lower, max(exact_timerange_end, lower)),
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def query_segments_page(
+    flow_id: str, args: dict, boundary: tuple[int | None, int] | None = None
+) -> tuple[list[dict], int | None]:
+    """Query up to args["Limit"] segments, following LastEvaluatedKey while a FilterExpression leaves the page short.
+
+    The args and boundary are those of plan_segments_query. For a forward
+    query with a boundary the get_exact_timerange_end probe runs concurrently
+    with the first page query, so a bounded read costs one round trip. The
+    first page is reconciled with the probe afterwards: any segments past the
+    boundary were already dropped by the FilterExpression, and a
+    LastEvaluatedKey at or past it means the range is exhausted. A reverse
+    query starts at the far end of the range, so the probe must run first.
+
+    Each follow-up query reads ahead by the filter selectivity observed so
+    far, doubling while nothing has matched, up to
+    SEGMENTS_READ_AHEAD_MAX_LIMIT items. Once the consumed read capacity
+    reaches SEGMENTS_QUERY_CAPACITY_BUDGET a short page is returned, and it
+    continues from the last evaluated segment so the next page makes progress.
+
+    Returns the items and the timerange_end to continue paging from, which is
+    None only when there are no more segments.
+    """
+    limit = args["Limit"]
+    probe = None
+    if boundary is not None:
+        if args["ScanIndexForward"]:
+            probe = query_executor.submit(get_exact_timerange_end, flow_id, boundary[1])
+        else:
+            set_segments_query_boundary(
+                args, flow_id, boundary, get_exact_timerange_end(flow_id, boundary[1])
             )
-    return args
+    query = query_segments(**args, ReturnConsumedCapacity="TOTAL")
+    items = query["Items"]
+    iterations = 1
+    scanned = query.get("ScannedCount", len(items))
+    capacity = query.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+    if probe is not None:
+        exact_timerange_end = probe.result()
+        set_segments_query_boundary(args, flow_id, boundary, exact_timerange_end)
+        if (
+            "LastEvaluatedKey" in query
+            and query["LastEvaluatedKey"]["timerange_end"] >= exact_timerange_end
+        ):
+            del query["LastEvaluatedKey"]
+    read_ahead = limit
+    truncated = False
+    while "LastEvaluatedKey" in query and len(items) < limit:
+        if capacity >= constants.SEGMENTS_QUERY_CAPACITY_BUDGET:
+            metrics.add_metric(
+                name="SegmentsQueryCapacityBudgetExhausted",
+                unit=MetricUnit.Count,
+                value=1,
+            )
+            break
+        remaining = limit - len(items)
+        read_ahead = min(
+            constants.SEGMENTS_READ_AHEAD_MAX_LIMIT,
+            max(remaining, math.ceil(remaining * scanned / len(items)))
+            if items
+            else read_ahead * 2,
+        )
+        query = query_segments(
+            **{
+                **args,
+                "ExclusiveStartKey": query["LastEvaluatedKey"],
+                "Limit": read_ahead,
+            },
+            ReturnConsumedCapacity="TOTAL",
+        )
+        iterations += 1
+        scanned += query.get("ScannedCount", len(query["Items"]))
+        capacity += query.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        if len(query["Items"]) > remaining:
+            # The items left out of the page must be returned by the next page
+            items.extend(query["Items"][:remaining])
+            truncated = True
+            break
+        items.extend(query["Items"])
+    metrics.add_metric(
+        name="SegmentsQueryIterations", unit=MetricUnit.Count, value=iterations
+    )
+    metrics.add_metric(
+        name="SegmentsQueryConsumedCapacity", unit=MetricUnit.Count, value=capacity
+    )
+    if truncated:
+        return items, items[-1]["timerange_end"]
+    if "LastEvaluatedKey" in query:
+        return items, query["LastEvaluatedKey"]["timerange_end"]
+    return items, None
 
 
 @tracer.capture_method(capture_response=False)
@@ -289,7 +731,6 @@ def delete_flow_segments(
             object_ids,
             resources,
         )
-        update_flow_segments_updated(flow_id)
     # Continue with deletes if no errors, more records available and more than specified milliseconds remain of runtime
     while (
         delete_error is None
@@ -306,9 +747,16 @@ def delete_flow_segments(
                 object_ids,
                 resources,
             )
-            update_flow_segments_updated(flow_id)
     # Add affected object_ids to the SQS queue for potential S3 cleanup
     if len(object_ids) > 0:
+        # Recalculate the timerange, which may have shrunk, and replace the
+        # Flow's bounds with it rather than widening them.
+        update_flow_segments_updated(
+            flow_id,
+            refresh_flow_timerange_summary(flow_id),
+            extend=False,
+            coalesce=True,
+        )
         put_message_batches(s3_queue, list(object_ids))
     if item_dict is None:
         # item_dict only None when called from object_id related segment delete. This method does not support delete requests
@@ -325,6 +773,8 @@ def delete_flow_segments(
         return
     # Update DDB record with done, no SQS publish as no further processing required.
     if "LastEvaluatedKey" not in query:
+        if item_dict.get("delete_flow"):
+            delete_flow_timerange_summary(flow_id)
         merge_delete_request(
             {
                 **item_dict,
@@ -334,18 +784,15 @@ def delete_flow_segments(
         )
         return
     if query["Items"]:
-        resume_after = TimeRange.from_str(
-            query["Items"][-1]["timerange"]
-        ).timerange_after()
+        cursor = get_segment_bounds(query["Items"][-1])[1]
     else:
         # The final scanned page held no deletable items (all filtered out or
         # popped as partial-overlap outliers) yet more records remain. Resume
         # from just after the last scanned key so the next invocation does not
-        # re-scan this same tail. timerange_end is stored inclusive, so the next
-        # unscanned segment starts at cursor + 1 nanosecond.
-        resume_after = TimeRange.from_start(
-            Timestamp.from_nanosec(int(query["LastEvaluatedKey"]["timerange_end"]) + 1)
-        )
+        # re-scan this same tail.
+        cursor = int(query["LastEvaluatedKey"]["timerange_end"])
+    # timerange_end is stored inclusive, so the next segment starts at cursor + 1 nanosecond
+    resume_after = TimeRange.from_start(Timestamp.from_nanosec(cursor + 1))
     timerange_remaining = timerange_to_delete.intersect_with(resume_after)
     item_dict["timerange_remaining"] = str(timerange_remaining)
     item_dict["updated"] = datetime.now().strftime(constants.DATETIME_FORMAT)
@@ -353,10 +800,16 @@ def delete_flow_segments(
     merge_delete_request(item_dict)
 
 
+@tracer.capture_method(capture_response=False)
+def query_segments(**kwargs) -> dict:
+    """Query the segments table, using the client as, unlike the resource, it is thread safe"""
+    return dynamodb.meta.client.query(TableName=segments_table.name, **kwargs)
+
+
 @tracer.capture_method(capture_response=False)
 def get_exact_timerange_end(flow_id: str, timerange_end: int) -> int:
     """Get the exact timerange end of a segment the overlaps with the specified timerange end value"""
-    items = segments_table.query(
+    items = query_segments(
         KeyConditionExpression=And(
             Key("flow_id").eq(flow_id), Key("timerange_end").gte(timerange_end)
         ),
@@ -372,16 +825,51 @@ def get_exact_timerange_end(flow_id: str, timerange_end: int) -> int:
 
 
 @tracer.capture_method(capture_response=False)
-def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
+def batch_get_storage_items(object_ids) -> dict:
+    """Get the storage records for the supplied object ids using BatchGetItem.
+
+    Returns a dict keyed by every requested object id, with None as the value
+    for ids that have no storage record. Keys left unprocessed after the
+    retries are exhausted are fetched individually.
+    """
+    storage_items = {}
+    keys = [{"id": object_id} for object_id in sorted(set(object_ids))]
+    for keys_batch in batched(keys, constants.BATCH_GET_ITEM_LIMIT):
+        items, unprocessed_keys = batch_get_items(
+            storage_table.name, {"Keys": list(keys_batch)}
+        )
+        for item in items:
+            storage_items[item["id"]] = item
+        for key in unprocessed_keys:
+            storage_items[key["id"]] = storage_table.get_item(Key=key).get("Item")
+        for key in keys_batch:
+            storage_items.setdefault(key["id"], None)
+    return storage_items
+
+
+@tracer.capture_method(capture_response=False)
+def get_storage_item(object_id: str, storage_items: dict | None = None) -> dict | None:
+    """Get the storage record for object_id, using storage_items when it holds the id"""
+    if storage_items is not None and object_id in storage_items:
+        return storage_items[object_id]
+    return storage_table.get_item(Key={"id": object_id}).get("Item")
+
+
+@tracer.capture_method(capture_response=False)
+def validate_object_id(
+    segment: Flowsegmentpost, flow_id: str, storage_items: dict | None = None
+) -> dict:
     """Validate object_id can be used with flow_id.
 
     Performs NO writes. Any storage mutations required on success are returned
     in the `claim` list for the caller to apply via commit_object_claim, and
     only after all validation (including overlap and init_segments consistency
     checks) has passed, so that a rejected request never claims an Object.
+
+    `storage_items` may hold storage records already fetched by
+    batch_get_storage_items, in which case no GetItem calls are made for them.
     """
-    get_item = storage_table.get_item(Key={"id": segment.object_id})
-    storage_item = get_item.get("Item")
+    storage_item = get_storage_item(segment.object_id, storage_items)
     # Handle case where object_id doesn't exist
     if storage_item is None:
         if not segment.get_urls:
@@ -408,6 +896,7 @@ def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
             "id": segment.object_id,
             "flow_id": flow_id,
             "timerange": object_timerange,
+            constants.REF_COUNT_ATTRIBUTE: 0,
         }
         if segment.init_object_id:
             item["init_object_id"] = segment.init_object_id
@@ -438,7 +927,7 @@ def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
             "message": "Bad request. An initialisation segment Object cannot be used as a media segment Object.",
         }
     is_first_time_use = storage_item.get("expire_at") is not None
-    flow_id_matches = storage_item["flow_id"] == flow_id
+    flow_id_matches = storage_item.get("flow_id") == flow_id
     stored_timerange = storage_item.get("timerange")
     claim = []
     # First time use object_id must be used on flow_id it was created with
@@ -452,17 +941,21 @@ def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
     # Queue removal of expiration on first use with matching flow_id
     if is_first_time_use and flow_id_matches:
         object_timerange = calculate_object_timerange(segment)
-        update_expr = "REMOVE expire_at SET timerange = :timerange"
-        expr_values = {":timerange": object_timerange}
+        # Reference counts start on first use, when no segment references the Object
+        update_expr = "REMOVE expire_at SET timerange = :timerange, ref_count = if_not_exists(ref_count, :zero)"
+        expr_values = {":timerange": object_timerange, ":zero": 0}
+        attributes = {"timerange": object_timerange}
         if segment.init_object_id:
             update_expr += ", init_object_id = :init_object_id"
             expr_values[":init_object_id"] = segment.init_object_id
+            attributes["init_object_id"] = segment.init_object_id
         claim.append(
             {
                 "op": "update",
                 "key": {"id": segment.object_id},
                 "UpdateExpression": update_expr,
                 "ExpressionAttributeValues": expr_values,
+                "attributes": attributes,
             }
         )
         stored_timerange = object_timerange
@@ -491,9 +984,7 @@ def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
     effective_init_object_id = segment.init_object_id
     # Validate init_object_id if provided
     if segment.init_object_id:
-        init_item = storage_table.get_item(Key={"id": segment.init_object_id}).get(
-            "Item"
-        )
+        init_item = get_storage_item(segment.init_object_id, storage_items)
         if init_item is None:
             return {
                 "valid": False,
@@ -516,8 +1007,9 @@ def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
                 {
                     "op": "update",
                     "key": {"id": segment.init_object_id},
-                    "UpdateExpression": "REMOVE expire_at SET is_init_object = :flag",
-                    "ExpressionAttributeValues": {":flag": True},
+                    "UpdateExpression": "REMOVE expire_at SET is_init_object = :flag, ref_count = if_not_exists(ref_count, :zero)",
+                    "ExpressionAttributeValues": {":flag": True, ":zero": 0},
+                    "attributes": {"is_init_object": True},
                 }
             )
             init_storage_id = init_item.get("storage_id")
@@ -534,9 +1026,7 @@ def validate_object_id(segment: Flowsegmentpost, flow_id: str) -> dict:
         # Recover the init reference from the stored Media Object so the new
         # Segment still reports init_object on read.
         effective_init_object_id = storage_item["init_object_id"]
-        init_item = storage_table.get_item(Key={"id": effective_init_object_id}).get(
-            "Item"
-        )
+        init_item = get_storage_item(effective_init_object_id, storage_items)
         if init_item:
             init_storage_id = init_item.get("storage_id")
     # Valid: either flow_id matches or object_id is reusable
@@ -570,23 +1060,181 @@ def commit_object_claim(claim: list | None) -> None:
 
 
 @tracer.capture_method(capture_response=False)
-def delete_flow_storage_record(object_id: str, storage_id: str | None = None) -> None:
-    """Remove storage_id from object's DDB record, or delete the record entirely if no segments reference it"""
-    object_id_refs = segments_table.query(
-        IndexName="object-id-index",
-        KeyConditionExpression=Key("object_id").eq(object_id),
-        Select="COUNT",
+def apply_object_claim(claim: list | None, storage_items: dict) -> None:
+    """Apply the storage writes returned by validate_object_id to storage_items.
+
+    Keeps storage records fetched by batch_get_storage_items consistent with
+    commit_object_claim, so later segments in the same batch are validated
+    against the claimed state of an Object.
+    """
+    for write in claim or []:
+        if write["op"] == "put":
+            storage_items[write["item"]["id"]] = {**write["item"]}
+        elif write["op"] == "update":
+            storage_item = {**(storage_items.get(write["key"]["id"]) or write["key"])}
+            storage_item.pop("expire_at", None)
+            storage_items[write["key"]["id"]] = {
+                **storage_item,
+                **write["attributes"],
+            }
+
+
+@tracer.capture_method(capture_response=False)
+def get_object_ref_counts(items: list[dict]) -> dict[str, Counter]:
+    """Count the references the supplied segment items make to their Media and init Objects.
+
+    Returns a Counter per object id, keyed by None for the number of segments
+    referencing the Object and by storage_id for the number of those segments
+    holding it on that storage backend.
+    """
+    ref_counts = defaultdict(Counter)
+    for item in items:
+        for object_id, storage_ids in (
+            (item["object_id"], item.get("storage_ids", [])),
+            (item.get("init_object_id"), item.get("init_storage_ids", [])),
+        ):
+            if object_id:
+                ref_counts[object_id][None] += 1
+                ref_counts[object_id].update(storage_ids)
+    return ref_counts
+
+
+@tracer.capture_method(capture_response=False)
+def update_object_ref_counts(ref_counts: dict[str, Counter], sign: int = 1) -> None:
+    """Atomically add (or with sign -1 subtract) reference counts on the storage records of Objects.
+
+    Counts are only maintained on storage records that have a ref_count, which
+    is set when an Object is claimed. Records claimed before reference counts
+    were introduced are left without one, so their references are still
+    found by querying the segments table.
+
+    References are added before the segments are written and subtracted after
+    they are deleted, so an interrupted request can only overcount, leaving
+    an orphaned Object rather than deleting one that is still referenced.
+    """
+    for object_id, counts in ref_counts.items():
+        names = {}
+        values = {}
+        for index, (storage_id, count) in enumerate(counts.items()):
+            if count == 0:
+                continue
+            names[f"#ref_{index}"] = (
+                constants.REF_COUNT_ATTRIBUTE
+                if storage_id is None
+                else f"{constants.REF_COUNT_ATTRIBUTE}_{storage_id}"
+            )
+            values[f":ref_{index}"] = sign * count
+        if not values:
+            continue
+        try:
+            storage_table.update_item(
+                Key={"id": object_id},
+                UpdateExpression="ADD "
+                + ", ".join(f"{name} :{name[1:]}" for name in names),
+                ConditionExpression=Attr(constants.REF_COUNT_ATTRIBUTE).exists(),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                # storage record does not maintain reference counts, no action required.
+                continue
+            raise
+
+
+@tracer.capture_method(capture_response=False)
+def is_object_referenced(object_id: str) -> bool:
+    """Check whether any segment references an Object as its media or init object"""
+    for index_name, attribute in (
+        ("object-id-index", "object_id"),
+        ("init-object-id-index", "init_object_id"),
+    ):
+        query = segments_table.query(
+            IndexName=index_name,
+            KeyConditionExpression=Key(attribute).eq(object_id),
+            Select="COUNT",
+            Limit=1,
+        )
+        if query["Count"] > 0:
+            return True
+    return False
+
+
+@tracer.capture_method(capture_response=False)
+def get_object_references(object_id: str) -> tuple[int | None, set[str] | None]:
+    """Get the references to an Object from its storage record with a single GetItem.
+
+    Returns a tuple of (references, storage_ids). references is the number of
+    segments referencing the Object, None when the storage record does not
+    maintain reference counts (see update_object_ref_counts) or when a count of
+    zero is contradicted by a segment still referencing it. storage_ids are
+    the storage backends the Object is still held on: its instances when the
+    record holds them (see update_object_instances), otherwise those
+    referenced by at least one segment, None when neither is recorded.
+    """
+    item = storage_table.get_item(Key={"id": object_id}, ConsistentRead=True).get(
+        "Item"
     )
-    init_object_id_refs = segments_table.query(
-        IndexName="init-object-id-index",
-        KeyConditionExpression=Key("init_object_id").eq(object_id),
-        Select="COUNT",
+    if item is None:
+        return None, None
+    ref_count = (
+        int(item[constants.REF_COUNT_ATTRIBUTE])
+        if constants.REF_COUNT_ATTRIBUTE in item
+        else None
     )
-    if object_id_refs["Count"] == 0 and init_object_id_refs["Count"] == 0:
-        storage_table.delete_item(
-            Key={"id": object_id},
+    if ref_count == 0 and is_object_referenced(object_id):
+        # Acting on a count that has fallen below the live references would
+        # delete an Object still in use, so a zero is confirmed against the
+        # segments and the count is ignored when it disagrees
+        metrics.add_metric(
+            name="ObjectRefCountMismatches", unit=MetricUnit.Count, value=1
         )
-        return
+        ref_count = None
+    instances = get_instances(item)
+    if instances is not None:
+        storage_ids = set(instances["storage_ids"])
+    elif ref_count is not None:
+        prefix = f"{constants.REF_COUNT_ATTRIBUTE}_"
+        storage_ids = {
+            key.removeprefix(prefix)
+            for key, value in item.items()
+            if key.startswith(prefix) and value > 0
+        }
+    else:
+        storage_ids = None
+    return ref_count, storage_ids
+
+
+@tracer.capture_method(capture_response=False)
+def delete_flow_storage_record(object_id: str, storage_id: str | None = None) -> None:
+    """Remove storage_id from object's DDB record, or delete the record entirely if no segments reference it"""
+    ref_count, _ = get_object_references(object_id)
+    if ref_count is None:
+        object_id_refs = segments_table.query(
+            IndexName="object-id-index",
+            KeyConditionExpression=Key("object_id").eq(object_id),
+            Select="COUNT",
+        )
+        init_object_id_refs = segments_table.query(
+            IndexName="init-object-id-index",
+            KeyConditionExpression=Key("init_object_id").eq(object_id),
+            Select="COUNT",
+        )
+        ref_count = object_id_refs["Count"] + init_object_id_refs["Count"]
+        condition = {}
+    else:
+        # Segments may have referenced the Object since the count was read
+        condition = {"ConditionExpression": Attr(constants.REF_COUNT_ATTRIBUTE).eq(0)}
+    if ref_count == 0:
+        try:
+            storage_table.delete_item(
+                Key={"id": object_id},
+                **condition,
+            )
+            return
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
     try:
         storage_table.update_item(
             Key={"id": object_id},
@@ -687,6 +1335,35 @@ def query_segments_by_init_object_id(
     return items, query.get("LastEvaluatedKey"), kwargs.get("Limit")
 
 
+@tracer.capture_method(capture_response=False)
+def query_object_flow_segments(object_id: str, init_object: bool = False) -> list:
+    """Get one segment from each Flow referencing an Object as its media (or init) object.
+
+    The object id indexes order the segments of an Object by flow_id, so each
+    query starts after the Flow last found. The number of queries grows with
+    the Flows referencing the Object rather than with its segments.
+    """
+    index_name, attribute = (
+        ("init-object-id-index", "init_object_id")
+        if init_object
+        else ("object-id-index", "object_id")
+    )
+    key_condition = Key(attribute).eq(object_id)
+    items = []
+    while True:
+        query = segments_table.query(
+            IndexName=index_name,
+            KeyConditionExpression=key_condition,
+            Limit=1,
+        )
+        if not query["Items"]:
+            return items
+        items.extend(query["Items"])
+        key_condition = Key(attribute).eq(object_id) & Key("flow_id").gt(
+            query["Items"][0]["flow_id"]
+        )
+
+
 @tracer.capture_method(capture_response=False)
 def page_targets_init_index(page: str) -> bool:
     """Return True if a pagination token belongs to the init-object-id-index.
@@ -701,20 +1378,6 @@ def page_targets_init_index(page: str) -> bool:
     return "init_object_id" in decoded
 
 
-@lru_cache()
-@tracer.capture_method(capture_response=False)
-def get_store_name() -> str:
-    """Get the store name from service configuration, defaults to 'tams'."""
-    get_item = service_table.get_item(
-        Key={"record_type": "service", "id": constants.SERVICE_INFO_ID}
-    )
-    if not get_item.get("Item"):
-        return "tams"
-    if get_item["Item"].get("name") is None:
-        return "tams"
-    return get_item["Item"]["name"]
-
-
 @tracer.capture_method(capture_response=False)
 def get_storage_backend_dict(item: dict, store_name: str) -> dict:
     """Transform storage backend item into standardized dictionary format with label."""
@@ -725,135 +1388,228 @@ def get_storage_backend_dict(item: dict, store_name: str) -> dict:
     }
 
 
-@lru_cache()
+class StorageBackendRegistry:
+    """Registry of the storage backends and store name held in the service table.
+
+    The records are loaded on first use and reloaded on the first access after
+    STORAGE_BACKENDS_CACHE_TTL_SECS has elapsed, so warm containers pick up
+    changes to the storage backends without a cold start. Lookups by id and
+    label, the S3 url prefix and the verbose storage metadata of each backend
+    are computed once per load rather than on every request.
+    """
+
+    def __init__(self, ttl: int = constants.STORAGE_BACKENDS_CACHE_TTL_SECS):
+        self.ttl = ttl
+        self.loaded_time = None
+        self.store_name = "tams"
+        self.backends = []
+        self.by_id = {}
+        self.by_label = {}
+        self.default = None
+        self.url_prefixes = {}
+        self.verbose_storage = {}
+
+    @tracer.capture_method(capture_response=False)
+    def refresh(self) -> None:
+        """Reload the store name and storage backends from the service table"""
+        get_item = service_table.get_item(
+            Key={"record_type": "service", "id": constants.SERVICE_INFO_ID}
+        )
+        store_name = get_item.get("Item", {}).get("name")
+        if store_name is None:
+            store_name = "tams"
+        args = {"KeyConditionExpression": Key("record_type").eq("storage-backend")}
+        query = service_table.query(**args)
+        items = query["Items"]
+        while "LastEvaluatedKey" in query:
+            args["ExclusiveStartKey"] = query["LastEvaluatedKey"]
+            query = service_table.query(**args)
+            items.extend(query["Items"])
+        backends = [get_storage_backend_dict(item, store_name) for item in items]
+        by_label = {}
+        for backend in backends:
+            by_label.setdefault(backend["label"], []).append(backend)
+            by_label.setdefault(
+                backend["label"].replace(":s3:", ":s3.presigned:"), []
+            ).append(backend)
+        self.store_name = store_name
+        self.backends = backends
+        self.by_id = {backend["id"]: backend for backend in backends}
+        self.by_label = by_label
+        self.default = next(
+            (backend for backend in backends if backend.get("default_storage")),
+            None,
+        )
+        self.url_prefixes = {
+            backend[
+                "id"
+            ]: f"https://{backend['bucket_name']}.s3.{backend['region']}.amazonaws.com/"
+            for backend in backends
+        }
+        self.verbose_storage = {
+            backend["id"]: model_dump(Storagebackend(**backend)) for backend in backends
+        }
+        self.loaded_time = time.time()
+
+    def get(self) -> Self:
+        """Returns the registry, reloading it first if it is missing or expired"""
+        if self.loaded_time is None or time.time() - self.loaded_time >= self.ttl:
+            self.refresh()
+        return self
+
+
+storage_backend_registry = StorageBackendRegistry()
+
+
+@tracer.capture_method(capture_response=False)
+def get_store_name() -> str:
+    """Get the store name from service configuration, defaults to 'tams'."""
+    return storage_backend_registry.get().store_name
+
+
 @tracer.capture_method(capture_response=False)
 def get_default_storage_backend() -> dict:
     """Retrieve the default storage backend configuration from service table."""
-    query = service_table.query(
-        KeyConditionExpression=Key("record_type").eq("storage-backend"),
-        FilterExpression=Attr("default_storage").eq(True),
-    )
-    items = query["Items"]
-    if len(items) == 0:
+    default_storage_backend = storage_backend_registry.get().default
+    if default_storage_backend is None:
         raise BadRequestError("No default storage backend found")  # 404
-    return get_storage_backend_dict(items[0], get_store_name())
+    return default_storage_backend
 
 
-@lru_cache()
 @tracer.capture_method(capture_response=False)
 def get_storage_backend(storage_id: str) -> dict:
     """Retrieve specific storage backend configuration by storage_id."""
-    get_item = service_table.get_item(
-        Key={"record_type": "storage-backend", "id": storage_id}
-    )
-    if not get_item.get("Item"):
+    registry = storage_backend_registry.get()
+    if storage_id not in registry.by_id:
+        # The storage backend may have been added since the registry was loaded
+        registry.refresh()
+    if storage_id not in registry.by_id:
         raise BadRequestError("Invalid storage backend identifier")  # 404
-    return get_storage_backend_dict(get_item["Item"], get_store_name())
+    return registry.by_id[storage_id]
 
 
-@lru_cache()
 @tracer.capture_method(capture_response=False)
 def list_storage_backends() -> list[dict]:
     """Retrieve all storage backend items from service table."""
-    args = {"KeyConditionExpression": Key("record_type").eq("storage-backend")}
-    query = service_table.query(**args)
-    items = query["Items"]
-    while "LastEvaluatedKey" in query:
-        args["ExclusiveStartKey"] = query["LastEvaluatedKey"]
-        query = service_table.query(**args)
-        items.extend(query["Items"])
-    store_name = get_store_name()
-    return [get_storage_backend_dict(item, store_name) for item in items]
-
-
-@tracer.capture_method(capture_response=False)
-def append_to_segment_list(item: dict, attribute: str, value: dict | str) -> None:
-    """Append a value to a list attribute in a segment."""
-    segments_table.update_item(
-        Key={
-            "flow_id": item["flow_id"],
-            "timerange_end": item["timerange_end"],
-        },
-        UpdateExpression="SET #attr = list_append(if_not_exists(#attr, :empty_list), :new_value)",
-        ExpressionAttributeNames={
-            "#attr": attribute,
-        },
-        ExpressionAttributeValues={
-            ":new_value": [value],
-            ":empty_list": [],
-        },
-    )
+    return storage_backend_registry.get().backends
+
+
+def get_instances(storage_item: dict | None) -> dict | None:
+    """Get the instances of an Object held on its storage record, None when they are only held on its segments.
+
+    This is called per storage record, so it is not traced.
+    """
+    if storage_item is None or "instance_storage_ids" not in storage_item:
+        return None
+    return {
+        "storage_ids": storage_item["instance_storage_ids"],
+        "get_urls": storage_item.get("instance_get_urls", []),
+    }
 
 
 @tracer.capture_method(capture_response=False)
-def remove_storage_id_from_segment(
-    item: dict, storage_id: str, attribute: str = "storage_ids"
-) -> None:
-    """Remove a storage_id from a segment's storage_ids list with optimistic locking.
+def seed_object_instances(
+    items: list[dict],
+    storage_attr: str = "storage_ids",
+    get_urls_attr: str = "get_urls",
+) -> dict:
+    """Get the instances of an Object from the segments referencing it, used to seed its storage record.
 
-    `attribute` selects which list to mutate ("storage_ids" for the Media
-    Object, "init_storage_ids" for the init Object).
+    `storage_attr` and `get_urls_attr` select the segment lists ("storage_ids"
+    and "get_urls" for a Media Object, "init_storage_ids" and "init_get_urls"
+    for an init Object).
     """
-    current_item = item
-    for attempt in range(constants.DDB_MAX_RETRIES):
-        try:
-            filtered_ids = [sid for sid in current_item[attribute] if sid != storage_id]
-            segments_table.update_item(
-                Key={
-                    "flow_id": current_item["flow_id"],
-                    "timerange_end": current_item["timerange_end"],
-                },
-                UpdateExpression="SET #attr = :ids",
-                ConditionExpression="#attr = :old_ids",
-                ExpressionAttributeNames={"#attr": attribute},
-                ExpressionAttributeValues={
-                    ":ids": filtered_ids,
-                    ":old_ids": current_item[attribute],
-                },
+    return {
+        "storage_ids": list(
+            dict.fromkeys(
+                storage_id
+                for item in items
+                for storage_id in item.get(storage_attr, [])
             )
-            break
-        except ClientError as e:
-            if (
-                e.response["Error"]["Code"] == "ConditionalCheckFailedException"
-                and attempt < constants.DDB_MAX_RETRIES - 1
-            ):
-                current_item = segments_table.get_item(
-                    Key={
-                        "flow_id": item["flow_id"],
-                        "timerange_end": item["timerange_end"],
-                    }
-                )["Item"]
-                continue
-            raise
+        ),
+        "get_urls": get_unique_get_urls(items, attribute=get_urls_attr),
+    }
 
 
 @tracer.capture_method(capture_response=False)
-def remove_get_url_by_label_from_segment(
-    item: dict, label: str, attribute: str = "get_urls"
-) -> None:
-    """Remove a get_url dictionary with matching label from a segment's get_urls
-    list with optimistic locking.
+def get_stored_object_instances(object_id: str) -> dict | None:
+    """Get the instances held on the storage record of an Object with a consistent read, see get_instances"""
+    return get_instances(
+        storage_table.get_item(Key={"id": object_id}, ConsistentRead=True).get("Item")
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def get_object_instances(object_ids) -> dict[str, dict | None]:
+    """Get the instances held on the storage records of the supplied object ids, see get_instances.
+
+    Storage records are fetched with BatchGetItem, once per Object however many
+    of the segments re-use it. They are not cached between requests, as the
+    ETag of a segments listing does not change when instances do.
+    """
+    return {
+        object_id: get_instances(storage_item)
+        for object_id, storage_item in batch_get_storage_items(object_ids).items()
+    }
 
-    `attribute` selects which list to mutate ("get_urls" for the Media Object,
-    "init_get_urls" for the init Object).
+
+@tracer.capture_method(capture_response=False)
+def update_object_instances(
+    object_id: str,
+    seed: dict,
+    add_storage_id: str | None = None,
+    add_get_url: dict | None = None,
+    remove_storage_id: str | None = None,
+    remove_label: str | None = None,
+) -> dict:
+    """Add or remove an instance of an Object on its storage record with optimistic locking.
+
+    The storage record holds every instance of the Object, so a change is a
+    single write however many segments reference it. `seed` holds the
+    instances on the referencing segments (see seed_object_instances), used
+    when the record does not hold them yet.
+
+    Returns the updated instances. Raises ValueError when the Object has no
+    storage record, which is never created here.
     """
-    current_item = item
     for attempt in range(constants.DDB_MAX_RETRIES):
+        storage_item = storage_table.get_item(
+            Key={"id": object_id}, ConsistentRead=True
+        ).get("Item")
+        if storage_item is None:
+            raise ValueError("The Object does not have a storage record.")
+        instances = get_instances(storage_item)
+        if instances is None:
+            instances = seed
+            condition = Attr("instance_storage_ids").not_exists()
+        else:
+            condition = Attr("instance_storage_ids").eq(
+                instances["storage_ids"]
+            ) & Attr("instance_get_urls").eq(instances["get_urls"])
+        # The record may be deleted after it is read, so do not let the update create it
+        condition = Attr("id").exists() & condition
+        storage_ids = [
+            storage_id
+            for storage_id in instances["storage_ids"]
+            if storage_id != remove_storage_id
+        ]
+        if add_storage_id and add_storage_id not in storage_ids:
+            storage_ids.append(add_storage_id)
+        get_urls = [
+            get_url
+            for get_url in instances["get_urls"]
+            if remove_label is None or get_url.get("label") != remove_label
+        ]
+        if add_get_url:
+            get_urls.append(add_get_url)
         try:
-            filtered_urls = [
-                url for url in current_item[attribute] if url.get("label") != label
-            ]
-            segments_table.update_item(
-                Key={
-                    "flow_id": current_item["flow_id"],
-                    "timerange_end": current_item["timerange_end"],
-                },
-                UpdateExpression="SET #attr = :urls",
-                ConditionExpression="#attr = :old_urls",
-                ExpressionAttributeNames={"#attr": attribute},
+            storage_table.update_item(
+                Key={"id": object_id},
+                UpdateExpression="SET instance_storage_ids = :storage_ids, instance_get_urls = :get_urls",
+                ConditionExpression=condition,
                 ExpressionAttributeValues={
-                    ":urls": filtered_urls,
-                    ":old_urls": current_item[attribute],
+                    ":storage_ids": storage_ids,
+                    ":get_urls": get_urls,
                 },
             )
             break
@@ -862,11 +1618,6 @@ def remove_get_url_by_label_from_segment(
                 e.response["Error"]["Code"] == "ConditionalCheckFailedException"
                 and attempt < constants.DDB_MAX_RETRIES - 1
             ):
-                current_item = segments_table.get_item(
-                    Key={
-                        "flow_id": item["flow_id"],
-                        "timerange_end": item["timerange_end"],
-                    }
-                )["Item"]
                 continue
             raise
+    return {"storage_ids": storage_ids, "get_urls": get_urls}
@@ -1,7 +1,11 @@
 # pylint: disable=too-many-lines
+import base64
 import json
 import os
+import time
+import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 import boto3
@@ -9,15 +13,19 @@ import boto3
 # pylint: disable=no-member
 import constants
 import cymple
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger, Metrics, Tracer
 from aws_lambda_powertools.event_handler.exceptions import BadRequestError
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.data_classes.event_bridge_event import (
     EventBridgeEvent,
 )
+from botocore.config import Config
 from cymple import QueryBuilder
 from deepdiff import DeepDiff
+from mediatimestamp.immutable import TimeRange
 from schema import Flowcollection, Source
 from schema_extra import Webhookfull
+from segment_timeranges import get_timerange_bounds
 from utils import (
     deserialise_neptune_obj,
     deserialize_tags_dict,
@@ -33,20 +41,85 @@ from utils import (
 
 logger = Logger()
 tracer = Tracer()
+metrics = Metrics()
 
 neptune = boto3.client(
     "neptunedata",
     region_name=os.environ["AWS_REGION"],
     endpoint_url=f"https://{os.environ.get('NEPTUNE_ENDPOINT', 'localhost')}:8182",
+    config=Config(
+        # A connection for each execute_many worker and one for the calling thread
+        max_pool_connections=constants.NEPTUNE_MAX_WORKERS + 1,
+        tcp_keepalive=True,
+    ),
 )
+executor = ThreadPoolExecutor(max_workers=constants.NEPTUNE_MAX_WORKERS)
 qb = QueryBuilder()
 
+# Cache for the event resources of a Flow - keyed by flow id
+_flow_resources_cache: dict[str, dict | None] = {}
+_flow_resources_cache_time: dict[str, float] = {}
+# Coalesced segments_updated writes waiting to be flushed - keyed by flow id
+_pending_flow_updates: dict[str, dict] = {}
+# Time of the last flows/updated event published for a Flow - keyed by flow id
+_flows_updated_event_time: dict[str, float] = {}
+
+flows_updated_event_window = int(os.environ.get("FLOWS_UPDATED_EVENT_WINDOW", 0))
+
 
 @tracer.capture_method(capture_response=False)
 def execute_open_cypher_query(query: str) -> dict:
-    """Executes the supplied OpenCypher query against the Neptune Database"""
-    logger.info(query)
-    return neptune.execute_open_cypher_query(openCypherQuery=query)
+    """Executes the supplied OpenCypher query against the Neptune Database.
+
+    Every query is logged at debug level, which can be sampled with
+    POWERTOOLS_LOGGER_SAMPLE_RATE, and queries slower than the threshold are
+    always logged as a warning.
+    """
+    logger.debug(query)
+    start = time.perf_counter()
+    results = neptune.execute_open_cypher_query(openCypherQuery=query)
+    duration_ms = (time.perf_counter() - start) * 1000
+    row_count = len(results.get("results", []))
+    payload_size = int(
+        results.get("ResponseMetadata", {})
+        .get("HTTPHeaders", {})
+        .get("content-length", 0)
+    )
+    metrics.add_metric(
+        name="NeptuneQueryLatency", unit=MetricUnit.Milliseconds, value=duration_ms
+    )
+    metrics.add_metric(name="NeptuneQueryRows", unit=MetricUnit.Count, value=row_count)
+    metrics.add_metric(
+        name="NeptuneQueryPayloadSize", unit=MetricUnit.Bytes, value=payload_size
+    )
+    if duration_ms >= constants.NEPTUNE_SLOW_QUERY_MS:
+        logger.warning(
+            "Slow Neptune query",
+            extra={
+                "query": query,
+                "duration_ms": round(duration_ms),
+                "row_count": row_count,
+                "payload_size": payload_size,
+            },
+        )
+    return results
+
+
+@tracer.capture_method(capture_response=False)
+def execute_many(queries: list[str]) -> list[dict]:
+    """Executes the supplied independent OpenCypher queries concurrently, returning the results in the same order"""
+    if len(queries) <= 1:
+        return [execute_open_cypher_query(query) for query in queries]
+    return list(executor.map(execute_open_cypher_query, queries))
+
+
+@tracer.capture_method(capture_response=False)
+def get_result_value(results: dict, key: str, default=None) -> any:
+    """Returns the named value from the first row of an OpenCypher query result"""
+    try:
+        return results["results"][0][key]
+    except IndexError:
+        return default
 
 
 @tracer.capture_method(capture_response=False)
@@ -223,61 +296,92 @@ def check_delete_source(source_id: str) -> bool:
 
 
 @tracer.capture_method(capture_response=False)
-def get_flow_source_id(flow_id: str) -> str | None:
-    """Get the source_id for the specified Flow"""
-    try:
-        query = (
-            qb.match()
-            .node(labels="flow", properties={"id": flow_id})
-            .related_to(label="represents")
-            .node(ref_name="s", labels="source")
-            .return_literal("s.id as source_id")
-            .get()
-        )
-        results = execute_open_cypher_query(query)
-        return results["results"][0]["source_id"]
-    except IndexError:
-        return None
+def generate_source_collected_by_query(source_id: str) -> str:
+    """Returns an OpenCypher query for the collected_by source ids of the specified Source"""
+    return (
+        qb.match()
+        .node(labels="source", properties={"id": source_id})
+        .related_from(label="represents")
+        .node(labels="flow")
+        .related_to(label="collected_by")
+        .node(labels="flow")
+        .related_to(label="represents")
+        .node(ref_name="s", labels="source")
+        .return_literal("collect(s.id) as source_collected_by")
+        .get()
+    )
 
 
 @tracer.capture_method(capture_response=False)
-def get_source_collected_by(source_id: str) -> list:
-    """Get the collect_by source ids for the specified Source"""
-    try:
-        query = (
-            qb.match()
-            .node(labels="source", properties={"id": source_id})
-            .related_from(label="represents")
-            .node(labels="flow")
-            .related_to(label="collected_by")
-            .node(labels="flow")
-            .related_to(label="represents")
-            .node(ref_name="s", labels="source")
-            .return_literal("collect(s.id) as source_collected_by")
-            .get()
+def generate_flow_resources_query(flow_id: str) -> str:
+    """Returns an OpenCypher query for the source_id, the source collected_by ids and the flow collected_by ids of the specified Flow"""
+    return (
+        qb.match()
+        .node(ref_name="flow", labels="flow", properties={"id": flow_id})
+        .match_optional()
+        .node(ref_name="flow")
+        .related_to(label="represents")
+        .node(ref_name="s", labels="source")
+        .match_optional()
+        .node(ref_name="s")
+        .related_from(label="represents")
+        .node(labels="flow")
+        .related_to(label="collected_by")
+        .node(labels="flow")
+        .related_to(label="represents")
+        .node(ref_name="sc", labels="source")
+        .with_("flow, s, collect(DISTINCT sc.id) AS source_collected_by")
+        .match_optional()
+        .node(ref_name="flow")
+        .related_to(label="collected_by")
+        .node(ref_name="fc", labels="flow")
+        .return_literal(
+            "s.id AS source_id, source_collected_by, collect(DISTINCT fc.id) AS flow_collected_by"
         )
-        results = execute_open_cypher_query(query)
-        return results["results"][0]["source_collected_by"]
-    except IndexError:
-        return []
+        .get()
+    )
 
 
 @tracer.capture_method(capture_response=False)
-def get_flow_collected_by(flow_id: str) -> list:
-    """Get the collect_by flow ids for the specified Flow"""
-    try:
-        query = (
-            qb.match()
-            .node(labels="flow", properties={"id": flow_id})
-            .related_to(label="collected_by")
-            .node(ref_name="f", labels="flow")
-            .return_literal("collect(f.id) as flow_collected_by")
-            .get()
-        )
-        results = execute_open_cypher_query(query)
-        return results["results"][0]["flow_collected_by"]
-    except IndexError:
-        return []
+def clear_flow_resources_cache() -> None:
+    """Clears the cached event resources, called whenever Flow relationships change"""
+    _flow_resources_cache.clear()
+    _flow_resources_cache_time.clear()
+
+
+@tracer.capture_method(capture_response=False)
+def get_flow_resources(flow_id: str) -> dict | None:
+    """Get the source_id, source_collected_by and flow_collected_by of the specified Flow.
+
+    Results are cached for a few seconds so that bursts of events on the same
+    Flow only query the Neptune Database once. None is returned if the Flow
+    does not exist.
+    """
+    current_time = time.time()
+    if (
+        flow_id in _flow_resources_cache
+        and (current_time - _flow_resources_cache_time.get(flow_id, 0))
+        < constants.FLOW_RESOURCES_CACHE_TTL_SECS
+    ):
+        return _flow_resources_cache[flow_id]
+    results = execute_open_cypher_query(generate_flow_resources_query(flow_id))
+    flow_resources = results["results"][0] if results["results"] else None
+    # Remove the entry so it is re-inserted as the newest, then evict the oldest
+    _flow_resources_cache.pop(flow_id, None)
+    _flow_resources_cache[flow_id] = flow_resources
+    _flow_resources_cache_time[flow_id] = current_time
+    while len(_flow_resources_cache) > constants.FLOW_RESOURCES_CACHE_SIZE:
+        oldest_id = next(iter(_flow_resources_cache))
+        del _flow_resources_cache[oldest_id]
+        _flow_resources_cache_time.pop(oldest_id, None)
+    return flow_resources
+
+
+@tracer.capture_method(capture_response=False)
+def get_source_collected_by(source_id: str) -> list:
+    """Get the collect_by source ids for the specified Source"""
+    results = execute_open_cypher_query(generate_source_collected_by_query(source_id))
+    return get_result_value(results, "source_collected_by", [])
 
 
 @tracer.capture_method(capture_response=False)
@@ -291,7 +395,10 @@ def query_node(record_type: str, record_id: str) -> dict:
         )
         results = execute_open_cypher_query(query)
         deserialised_results = [
-            deserialise_neptune_obj(result[record_type])
+            filter_dict(
+                deserialise_neptune_obj(result[record_type]),
+                constants.FLOW_INTERNAL_PROPERTIES,
+            )
             for result in results["results"]
         ]
         return deserialised_results[0]
@@ -299,17 +406,60 @@ def query_node(record_type: str, record_id: str) -> dict:
         raise ValueError("No results returned from the database query.") from e
 
 
+@tracer.capture_method(capture_response=False)
+def generate_check_node_exists_query(record_type: str, record_id: str) -> str:
+    """Returns an OpenCypher query returning the id of the specified Node if it exists"""
+    return (
+        qb.match()
+        .node(ref_name="n", labels=record_type, properties={"id": record_id})
+        .return_literal("n.id")
+        .get()
+    )
+
+
 @tracer.capture_method(capture_response=False)
 def check_node_exists(record_type: str, record_id: str) -> bool:
     """Checks whether the specified Node exists in the Neptune Database"""
+    results = execute_open_cypher_query(
+        generate_check_node_exists_query(record_type, record_id)
+    )
+    return len(results["results"]) > 0
+
+
+@tracer.capture_method(capture_response=False)
+def get_flow_segments_version(flow_id: str) -> str | None:
+    """Returns the internal segments_version of the specified Flow.
+
+    The version is changed whenever the Flow's segments are changed, unlike
+    segments_updated which only has a resolution of one second. None is
+    returned for Flows whose segments have not changed since it was added.
+    """
     query = (
         qb.match()
-        .node(ref_name="n", labels=record_type, properties={"id": record_id})
-        .return_literal("n.id")
+        .node(ref_name="flow", labels="flow", properties={"id": flow_id})
+        .return_literal("flow.segments_version AS segments_version")
         .get()
     )
     results = execute_open_cypher_query(query)
-    return len(results["results"]) > 0
+    if len(results["results"]) == 0:
+        raise ValueError("No results returned from the database query.")
+    return results["results"][0]["segments_version"]
+
+
+@tracer.capture_method(capture_response=False)
+def set_flows_segments_version(flow_ids: set[str]) -> None:
+    """Changes the internal segments_version of the specified Flows, used when
+    their segments are changed without updating segments_updated"""
+    if not flow_ids:
+        return
+    query = (
+        qb.match()
+        .node(ref_name="flow", labels="flow")
+        .where_literal(f"flow.id IN {json.dumps(sorted(flow_ids))}")
+        .set(f"flow.segments_version = {json.dumps(str(uuid.uuid4()))}")
+        .get()
+    )
+    execute_open_cypher_query(query)
 
 
 @tracer.capture_method(capture_response=False)
@@ -370,7 +520,44 @@ def query_flow_collection(flow_id: str) -> list:
 
 
 @tracer.capture_method(capture_response=False)
-def query_sources(parameters: dict) -> tuple[list, int, int]:
+def encode_page_token(last_id: str) -> str:
+    """Returns an opaque page token that resumes a listing after the supplied id"""
+    return base64.b64encode(json.dumps({"id": last_id}).encode("utf-8")).decode("utf-8")
+
+
+@tracer.capture_method(capture_response=False)
+def parse_page_parameter(ref_name: str, page: str | None) -> tuple[int, list]:
+    """Returns the SKIP value and Where literals for the supplied page parameter.
+
+    Page tokens resume the listing after the last id returned rather than
+    skipping the rows of earlier pages. Numeric page values are offsets and
+    are still supported using SKIP.
+    """
+    if not page:
+        return 0, []
+    if page.isdigit():
+        return int(page), []
+    try:
+        last_id = json.loads(base64.b64decode(page, validate=True).decode("utf-8"))[
+            "id"
+        ]
+    except Exception as ex:
+        raise BadRequestError("Invalid page parameter value") from ex
+    if not isinstance(last_id, str):
+        raise BadRequestError("Invalid page parameter value")
+    return 0, [f"{ref_name}.id > {json.dumps(last_id)}"]
+
+
+@tracer.capture_method(capture_response=False)
+def get_next_page(results: list, limit: int) -> str | None:
+    """Returns the page token for the listing following the supplied results"""
+    if len(results) < limit:
+        return None
+    return encode_page_token(results[-1]["id"])
+
+
+@tracer.capture_method(capture_response=False)
+def query_sources(parameters: dict) -> tuple[list, str | None, int]:
     """Returns a list of the TAMS Sources from the Neptune Database"""
     props, where_literals = parse_api_gw_parameters(
         {
@@ -385,7 +572,7 @@ def query_sources(parameters: dict) -> tuple[list, int, int]:
             ]
         }
     )
-    page = int(parameters["page"]) if parameters.get("page") else 0
+    skip, page_literals = parse_page_parameter("source", parameters.get("page"))
     limit = min(
         (
             parameters["limit"]
@@ -398,12 +585,12 @@ def query_sources(parameters: dict) -> tuple[list, int, int]:
         {
             "source": props["properties"],
         },
-        where_literals=where_literals,
+        where_literals=where_literals + page_literals,
     )
     query = (
         query.return_literal(constants.RETURN_LITERAL["source"])
         .order_by("source.id")
-        .skip(page)
+        .skip(skip)
         .limit(limit)
         .get()
     )
@@ -411,13 +598,40 @@ def query_sources(parameters: dict) -> tuple[list, int, int]:
     deserialised_results = [
         deserialise_neptune_obj(result["source"]) for result in results["results"]
     ]
-    next_page = page + limit if len(deserialised_results) == limit else None
+    next_page = get_next_page(deserialised_results, limit)
     return deserialised_results, next_page, limit
 
 
 @tracer.capture_method(capture_response=False)
-def query_flows(parameters: dict) -> tuple[list, int, int]:
-    """Returns a list of the TAMS Flows from the Neptune Database"""
+def get_flow_timerange_where_literal(timerange_filter: TimeRange) -> str:
+    """Returns an OpenCypher Where literal matching Flows whose segments timerange bounds intersect the supplied timerange.
+
+    An empty timerange matches Flows without segments. Flows whose bounds have
+    not been set yet are always matched so the caller can check them directly.
+    """
+    if timerange_filter.is_empty():
+        condition = "flow.segments_timerange_start IS NULL"
+    else:
+        conditions = ["flow.segments_timerange_start IS NOT NULL"]
+        if timerange_filter.start is not None:
+            conditions.append(
+                f"flow.segments_timerange_end >= {timerange_filter.start.to_nanosec() + (0 if timerange_filter.includes_start() else 1)}"
+            )
+        if timerange_filter.end is not None:
+            conditions.append(
+                f"flow.segments_timerange_start <= {timerange_filter.end.to_nanosec() - (0 if timerange_filter.includes_end() else 1)}"
+            )
+        condition = " AND ".join(conditions)
+    return f"(flow.segments_timerange_indexed IS NULL OR ({condition}))"
+
+
+@tracer.capture_method(capture_response=False)
+def query_flows(parameters: dict) -> tuple[list, str | None, int]:
+    """Returns a list of the TAMS Flows from the Neptune Database.
+
+    Flows are returned with the internal segments timerange properties, so the
+    caller can tell whether a timerange filter was applied to each Flow.
+    """
     props, where_literals = parse_api_gw_parameters(
         {
             k: v
@@ -437,7 +651,13 @@ def query_flows(parameters: dict) -> tuple[list, int, int]:
     )
     if parameters.get("source_id"):
         props["source_properties"]["id"] = parameters["source_id"]
-    page = int(parameters.get("page") or 0)
+    if parameters.get("timerange"):
+        where_literals.append(
+            get_flow_timerange_where_literal(
+                TimeRange.from_str(parameters["timerange"])
+            )
+        )
+    skip, page_literals = parse_page_parameter("flow", parameters.get("page"))
     limit = min(
         (
             parameters["limit"]
@@ -452,12 +672,12 @@ def query_flows(parameters: dict) -> tuple[list, int, int]:
             "source": props["source_properties"],
             "essence_parameters": props["essence_properties"],
         },
-        where_literals=where_literals,
+        where_literals=where_literals + page_literals,
     )
     query = (
         query.return_literal(constants.RETURN_LITERAL["flow"])
         .order_by("flow.id")
-        .skip(page)
+        .skip(skip)
         .limit(limit)
         .get()
     )
@@ -465,7 +685,7 @@ def query_flows(parameters: dict) -> tuple[list, int, int]:
     deserialised_results = [
         deserialise_neptune_obj(result["flow"]) for result in results["results"]
     ]
-    next_page = page + limit if len(deserialised_results) == limit else None
+    next_page = get_next_page(deserialised_results, limit)
     return deserialised_results, next_page, limit
 
 
@@ -487,12 +707,12 @@ def query_delete_requests() -> list:
 
 
 @tracer.capture_method(capture_response=False)
-def query_webhooks(parameters: dict) -> tuple[list, int, int]:
+def query_webhooks(parameters: dict) -> tuple[list, str | None, int]:
     """Returns a list of the TAMS Webhooks from the Neptune Database"""
     props, where_literals = parse_api_gw_parameters(
         {k: parameters[k] for k in parameters.keys() & {"tag_values", "tag_exists"}}
     )
-    page = int(parameters.get("page") or 0)
+    skip, page_literals = parse_page_parameter("webhook", parameters.get("page"))
     limit = min(
         (
             parameters["limit"]
@@ -505,12 +725,12 @@ def query_webhooks(parameters: dict) -> tuple[list, int, int]:
         {
             "webhook": props["properties"],
         },
-        where_literals=where_literals,
+        where_literals=where_literals + page_literals,
     )
     query = (
         query.return_literal(constants.RETURN_LITERAL["webhook"])
         .order_by("webhook.id")
-        .skip(page)
+        .skip(skip)
         .limit(limit)
         .get()
     )
@@ -518,7 +738,7 @@ def query_webhooks(parameters: dict) -> tuple[list, int, int]:
     deserialised_results = [
         deserialise_neptune_obj(result["webhook"]) for result in results["results"]
     ]
-    next_page = page + limit if len(deserialised_results) == limit else None
+    next_page = get_next_page(deserialised_results, limit)
     return deserialised_results, next_page, limit
 
 
@@ -619,6 +839,7 @@ def merge_flow(flow_dict: dict, existing_dict: dict) -> dict:
     if query_collection:
         query = query + query_collection
     execute_open_cypher_query(query.get())
+    clear_flow_resources_cache()
     # Check if source was updated
     if (
         existing_dict.get("source_id")
@@ -749,6 +970,7 @@ def delete_flow(flow_id: str) -> str | None:
             "DETACH DELETE flow", "DETACH DELETE flow DELETE t DELETE e"
         )  # Limitation in Cymple library, unable to stack DELETE
         results = execute_open_cypher_query(query)
+        clear_flow_resources_cache()
         return results["results"][0]["source_id"]
     except IndexError:
         return None
@@ -772,7 +994,7 @@ def delete_webhook(webhook_id: str) -> None:
 
 
 @tracer.capture_method(capture_response=False)
-def set_node_property_base(record_type: str, record_id: str, props: dict) -> dict:
+def set_node_property_base(record_type: str, record_id: str, props: dict | str) -> dict:
     """Performs an OpenCypher Set operation on the specified Node and properties"""
     try:
         query = (
@@ -786,7 +1008,10 @@ def set_node_property_base(record_type: str, record_id: str, props: dict) -> dic
         )
         results = execute_open_cypher_query(query)
         deserialised_results = [
-            deserialise_neptune_obj(result[record_type])
+            filter_dict(
+                deserialise_neptune_obj(result[record_type]),
+                constants.FLOW_INTERNAL_PROPERTIES,
+            )
             for result in results["results"]
         ]
         return deserialised_results[0]
@@ -835,78 +1060,236 @@ def set_flow_collection(flow_id: str, username: str, flow_collection: list) -> d
     if query_collection:
         query = query + query_collection
     execute_open_cypher_query(query.get())
+    clear_flow_resources_cache()
     # Too complex to try and get OpenCypher to return the object in the same query so calling the DB to get it separately
     return query_node("flow", flow_id)
 
 
 @tracer.capture_method(capture_response=False)
-def update_flow_segments_updated(flow_id: str) -> None:
-    """Update the segments_updated field on the specified Flow"""
-    try:
-        item_dict = set_node_property_base(
-            "flow",
-            flow_id,
-            {
-                "flow.segments_updated": datetime.now()
-                .astimezone(timezone.utc)
-                .strftime(constants.DATETIME_FORMAT)
-            },
+def get_flow_timerange_set_literals(
+    segments_timerange: str, extend: bool, index: bool = True
+) -> list:
+    """Returns the OpenCypher Set literals to store the segments timerange bounds of a Flow.
+
+    The bounds are replaced when extend is False. Otherwise they are only
+    widened, so concurrent writers cannot narrow them. A Flow that has not been
+    indexed yet has its bounds replaced when index is True, and is left
+    unindexed otherwise, for when segments_timerange may not cover all of its
+    segments.
+    """
+    timerange = TimeRange.from_str(segments_timerange)
+    # The indexed flag is set last as the bounds are conditional on its old value
+    indexed_literal = "flow.segments_timerange_indexed = true"
+    if timerange.is_empty():
+        if extend:
+            return [indexed_literal] if index else []
+        return [
+            "flow.segments_timerange_start = null",
+            "flow.segments_timerange_end = null",
+            indexed_literal,
+        ]
+    start, end = get_timerange_bounds(timerange)
+    if not extend:
+        return [
+            f"flow.segments_timerange_start = {start}",
+            f"flow.segments_timerange_end = {end}",
+            indexed_literal,
+        ]
+    if not index:
+        widen = "flow.segments_timerange_indexed IS NOT NULL AND (flow.{0} IS NULL OR flow.{0} {1} {2})"
+        return [
+            f"flow.segments_timerange_start = CASE WHEN {widen.format('segments_timerange_start', '>', start)} THEN {start} ELSE flow.segments_timerange_start END",
+            f"flow.segments_timerange_end = CASE WHEN {widen.format('segments_timerange_end', '<', end)} THEN {end} ELSE flow.segments_timerange_end END",
+        ]
+    replace = "flow.segments_timerange_indexed IS NULL OR flow.{0} IS NULL OR flow.{0} {1} {2}"
+    return [
+        f"flow.segments_timerange_start = CASE WHEN {replace.format('segments_timerange_start', '>', start)} THEN {start} ELSE flow.segments_timerange_start END",
+        f"flow.segments_timerange_end = CASE WHEN {replace.format('segments_timerange_end', '<', end)} THEN {end} ELSE flow.segments_timerange_end END",
+        indexed_literal,
+    ]
+
+
+@tracer.capture_method(capture_response=False)
+def set_flow_segments_timerange(
+    flow_id: str, segments_timerange: str, extend: bool = True
+) -> None:
+    """Set the segments timerange bounds of the specified Flow, see get_flow_timerange_set_literals"""
+    query = (
+        qb.match()
+        .node(ref_name="flow", labels="flow", properties={"id": flow_id})
+        .set(
+            ", ".join(get_flow_timerange_set_literals(segments_timerange, extend)),
         )
-        publish_event(
-            "flows/updated",
-            {"flow": item_dict},
-            enhance_resources(
-                [
-                    f"tams:flow:{item_dict['id']}",
-                    f"tams:source:{item_dict['source_id']}",
-                    *set(
-                        f"tams:flow-collected-by:{c_id}"
-                        for c_id in item_dict.get("collected_by", [])
-                    ),
-                ]
-            ),
+        .get()
+    )
+    execute_open_cypher_query(query)
+
+
+@tracer.capture_method(capture_response=False)
+def write_flow_segments_updated(
+    flow_id: str,
+    segments_timerange: str | None = None,
+    extend: bool = True,
+    publish: bool = True,
+) -> None:
+    """Set the segments_updated field on the specified Flow and publish a flows/updated event"""
+    set_literals = [
+        f"flow.segments_updated = {json.dumps(datetime.now().astimezone(timezone.utc).strftime(constants.DATETIME_FORMAT))}",
+        f"flow.segments_version = {json.dumps(str(uuid.uuid4()))}",
+    ]
+    if segments_timerange is not None:
+        set_literals += get_flow_timerange_set_literals(
+            segments_timerange, extend, index=False
         )
+    try:
+        item_dict = set_node_property_base("flow", flow_id, ", ".join(set_literals))
     except ValueError:
         # The set_node_property_base function will throw an exception
         # if specified flow does not exist. When setting the segments_updated
         # field in the database don't need to worry if the flow does not exist.
         return
+    if not publish:
+        return
+    publish_event(
+        "flows/updated",
+        {"flow": item_dict},
+        enhance_resources(
+            [
+                f"tams:flow:{item_dict['id']}",
+                f"tams:source:{item_dict['source_id']}",
+                *set(
+                    f"tams:flow-collected-by:{c_id}"
+                    for c_id in item_dict.get("collected_by", [])
+                ),
+            ]
+        ),
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def update_flow_segments_updated(
+    flow_id: str,
+    segments_timerange: str | None = None,
+    extend: bool = True,
+    coalesce: bool = False,
+) -> None:
+    """Update the segments_updated field on the specified Flow.
+
+    When segments_timerange is supplied, the Flow's segments timerange bounds
+    used to filter Flow listings are updated too, see
+    get_flow_timerange_set_literals. With extend it need only cover the
+    segments that were added, as the bounds of an indexed Flow are widened to
+    include it, otherwise it must cover all of the Flow's segments.
+
+    With coalesce the update is held until flush_flow_segments_updated is
+    called, so repeated updates of a Flow in one invocation result in a
+    single write and flows/updated event.
+    """
+    if not coalesce:
+        write_flow_segments_updated(flow_id, segments_timerange, extend)
+        return
+    pending = _pending_flow_updates.get(flow_id)
+    if pending is None:
+        _pending_flow_updates[flow_id] = {
+            "segments_timerange": segments_timerange,
+            "extend": extend,
+            "count": 1,
+        }
+        return
+    if segments_timerange is not None:
+        if extend and pending["segments_timerange"] is not None:
+            # Both timeranges must be covered, so widen the held one to include it
+            pending["segments_timerange"] = str(
+                TimeRange.from_str(
+                    pending["segments_timerange"]
+                ).extend_to_encompass_timerange(TimeRange.from_str(segments_timerange))
+            )
+        else:
+            # A timerange covering all of the Flow's segments replaces the held one
+            pending["segments_timerange"] = segments_timerange
+    pending["extend"] = pending["extend"] and extend
+    pending["count"] += 1
+
+
+@tracer.capture_method(capture_response=False)
+def flush_flow_segments_updated() -> None:
+    """Write the updates held by update_flow_segments_updated.
+
+    A flows/updated event is published for each Flow unless one was already
+    published for it within the last FLOWS_UPDATED_EVENT_WINDOW seconds. The
+    segments_updated field is always written.
+    """
+    current_time = time.time()
+    for flow_id, event_time in list(_flows_updated_event_time.items()):
+        if current_time - event_time >= flows_updated_event_window:
+            del _flows_updated_event_time[flow_id]
+    writes_saved = 0
+    events_saved = 0
+    while _pending_flow_updates:
+        flow_id, pending = _pending_flow_updates.popitem()
+        writes_saved += pending["count"] - 1
+        publish = flow_id not in _flows_updated_event_time
+        if publish and flows_updated_event_window > 0:
+            _flows_updated_event_time[flow_id] = current_time
+        events_saved += pending["count"] - (1 if publish else 0)
+        write_flow_segments_updated(
+            flow_id, pending["segments_timerange"], pending["extend"], publish
+        )
+    if writes_saved or events_saved:
+        logger.info(
+            "Coalesced flow segments_updated writes",
+            extra={"writes_saved": writes_saved, "events_saved": events_saved},
+        )
+        metrics.add_metric(
+            name="FlowSegmentsUpdatedWritesSaved",
+            unit=MetricUnit.Count,
+            value=writes_saved,
+        )
+        metrics.add_metric(
+            name="FlowsUpdatedEventsSaved", unit=MetricUnit.Count, value=events_saved
+        )
 
 
 @tracer.capture_method(capture_response=False)
 def enhance_resources(resources) -> list:
     """Publishes the supplied events to an EventBridge EventBus"""
-    if all(not r.startswith("tams:source:") for r in resources) and any(
-        r.startswith("tams:flow:") for r in resources
-    ):
-        flow_id = next(
-            r[len("tams:flow:") :] for r in resources if r.startswith("tams:flow:")
-        )
-        source_id = get_flow_source_id(flow_id)
-        if source_id:
-            resources.append(f"tams:source:{source_id}")
-    if all(not r.startswith("tams:source-collected-by:") for r in resources) and any(
-        r.startswith("tams:source:") for r in resources
+    flow_id = next(
+        (r[len("tams:flow:") :] for r in resources if r.startswith("tams:flow:")),
+        None,
+    )
+    source_id = next(
+        (r[len("tams:source:") :] for r in resources if r.startswith("tams:source:")),
+        None,
+    )
+    need_source_collected_by = all(
+        not r.startswith("tams:source-collected-by:") for r in resources
+    )
+    need_flow_collected_by = all(
+        not r.startswith("tams:flow-collected-by:") for r in resources
+    )
+    flow_resources = {}
+    if flow_id and (
+        not source_id or need_source_collected_by or need_flow_collected_by
     ):
-        source_id = next(
-            r[len("tams:source:") :] for r in resources if r.startswith("tams:source:")
+        flow_resources = get_flow_resources(flow_id) or {}
+    if not source_id and flow_resources.get("source_id"):
+        source_id = flow_resources["source_id"]
+        resources.append(f"tams:source:{source_id}")
+    if source_id and need_source_collected_by:
+        # An explicitly supplied Source may not be the one the Flow represents
+        source_collected_by = (
+            flow_resources["source_collected_by"]
+            if source_id == flow_resources.get("source_id")
+            else get_source_collected_by(source_id)
         )
         resources.extend(
-            set(
-                f"tams:source-collected-by:{s_id}"
-                for s_id in get_source_collected_by(source_id)
-            )
-        )
-    if all(not r.startswith("tams:flow-collected-by:") for r in resources) and any(
-        r.startswith("tams:flow:") for r in resources
-    ):
-        flow_id = next(
-            r[len("tams:flow:") :] for r in resources if r.startswith("tams:flow:")
+            set(f"tams:source-collected-by:{s_id}" for s_id in source_collected_by)
         )
+    if flow_id and need_flow_collected_by:
         resources.extend(
             set(
                 f"tams:flow-collected-by:{s_id}"
-                for s_id in get_flow_collected_by(flow_id)
+                for s_id in flow_resources.get("flow_collected_by", [])
             )
         )
     return resources
@@ -917,12 +1300,17 @@ def validate_flow_collection(flow_id: str, flow_collection: Flowcollection):
     """Checks whether the supplied Flow Collection is valid"""
     if not flow_collection:
         return True
-    for collection in flow_collection.root:
-        if flow_id == collection.id.root or not check_node_exists(
-            "flow", collection.id.root
-        ):
-            return False
-    return True
+    collection_ids = [collection.id.root for collection in flow_collection.root]
+    if flow_id in collection_ids:
+        return False
+    # The existence checks are independent so they are run together
+    results = execute_many(
+        [
+            generate_check_node_exists_query("flow", collection_id)
+            for collection_id in collection_ids
+        ]
+    )
+    return all(len(result["results"]) > 0 for result in results)
 
 
 @tracer.capture_method(capture_response=False)
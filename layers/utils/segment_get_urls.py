@@ -1,13 +1,21 @@
-import concurrent.futures
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from urllib.parse import urlparse
 
-from aws_lambda_powertools import Tracer
-from dynamodb import list_storage_backends
-from schema import Storagebackend
-from utils import generate_presigned_url, model_dump
+import constants
+from aws_lambda_powertools import Metrics, Tracer
+from aws_lambda_powertools.metrics import MetricUnit
+from dynamodb import get_object_instances, storage_backend_registry
+from utils import generate_presigned_url
 
 tracer = Tracer()
+metrics = Metrics()
+
+executor = ThreadPoolExecutor(max_workers=constants.PRESIGN_MAX_WORKERS)
+# Cache for presigned urls - keyed by (bucket, key, expiry bucket)
+_presigned_url_cache: OrderedDict[tuple[str, str, int], str] = OrderedDict()
 
 
 @tracer.capture_method(capture_response=False)
@@ -21,56 +29,76 @@ def create_presigned_get_url(s3_url: str) -> tuple[str, str]:
         Tuple of (original_url, presigned_url)
     """
     url_parse = urlparse(s3_url)
+    # botocore derives the SigV4 signing key again for every url. That is only
+    # around 5% of the cost of signing, so the urls are signed by botocore,
+    # which handles credential refresh and endpoint resolution, rather than
+    # with a hand rolled signer that reuses the key.
+    # Valid for an extra expiry bucket, so the url is still valid for at least
+    # MIN_PRESIGNED_URL_TIMEOUT_SECS whenever it is reused from the cache
     url = generate_presigned_url(
         "get_object",
         url_parse.netloc.split(".")[0],
         url_parse.path.split("/", 1)[1],
+        expires_in=constants.MIN_PRESIGNED_URL_TIMEOUT_SECS
+        + constants.PRESIGNED_URL_CACHE_BUCKET_SECS,
     )
     return (s3_url, url)
 
 
 @tracer.capture_method(capture_response=False)
-def create_direct_s3_get_url(
-    object_id: str, storage_backend: dict[str, str], include_storage_id: bool
-) -> dict[str, str]:
-    """Generate a non-signed S3 URL for object access.
-
-    Args:
-        object_id: The S3 object identifier
-        storage_backend: Storage backend configuration dict
-
-    Returns:
-        Dict containing label and URL
-    """
-    get_url = {
-        "label": storage_backend["label"],
-        "url": f"https://{storage_backend['bucket_name']}.s3.{storage_backend['region']}.amazonaws.com/{object_id}",
-    }
-    if include_storage_id:
-        get_url["storage_id"] = storage_backend["id"]
-    return get_url
+def get_presigned_url_cache_key(
+    s3_url: str, expiry_bucket: int
+) -> tuple[str, str, int]:
+    """Get the presigned url cache key for an S3 URL"""
+    url_parse = urlparse(s3_url)
+    return (
+        url_parse.netloc.split(".")[0],
+        url_parse.path.split("/", 1)[1],
+        expiry_bucket,
+    )
 
 
 @tracer.capture_method(capture_response=False)
 def create_presigned_urls_parallel(url_set: set[str]) -> dict[str, str]:
     """Generate presigned URLs in parallel using ThreadPoolExecutor.
 
+    Presigned URLs are cached for the current expiry bucket of
+    PRESIGNED_URL_CACHE_BUCKET_SECS, so only URLs not already signed in the
+    bucket are signed again.
+
     Args:
         urls: Set of s3 URLs to generate presigned URLs for
 
     Returns:
         Dict mapping original URLs to presigned URLs
     """
-    # Asynchronous call to pre-signed url API
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = []
-        for s3_url in url_set:
-            futures.append(executor.submit(create_presigned_get_url, s3_url))
-    # Build dict of returned urls
+    expiry_bucket = int(time.time() // constants.PRESIGNED_URL_CACHE_BUCKET_SECS)
     url_mapping = {}
-    for future in futures:
-        key, url = future.result()
-        url_mapping[key] = url
+    cache_keys = {}
+    for s3_url in url_set:
+        cache_key = get_presigned_url_cache_key(s3_url, expiry_bucket)
+        if cache_key in _presigned_url_cache:
+            _presigned_url_cache.move_to_end(cache_key)
+            url_mapping[s3_url] = _presigned_url_cache[cache_key]
+        else:
+            cache_keys[s3_url] = cache_key
+    # Asynchronous call to pre-signed url API
+    for s3_url, url in executor.map(create_presigned_get_url, cache_keys):
+        url_mapping[s3_url] = url
+        _presigned_url_cache[cache_keys[s3_url]] = url
+    while len(_presigned_url_cache) > constants.PRESIGNED_URL_CACHE_SIZE:
+        _presigned_url_cache.popitem(last=False)
+    if url_set:
+        metrics.add_metric(
+            name="PresignedUrlCacheHits",
+            unit=MetricUnit.Count,
+            value=len(url_set) - len(cache_keys),
+        )
+        metrics.add_metric(
+            name="PresignedUrlCacheMisses",
+            unit=MetricUnit.Count,
+            value=len(cache_keys),
+        )
     return url_mapping
 
 
@@ -86,56 +114,145 @@ def get_storage_backends(
     Returns:
         Dict mapping storage IDs to their backend configurations
     """
-    storage_backends = {
-        storage_backend["id"]: storage_backend
-        for storage_backend in list_storage_backends()
-    }
+    storage_backends = storage_backend_registry.get().by_id
     if not accept_storage_ids:
         return storage_backends
-    filter_ids = set(accept_storage_ids.split(",")) if accept_storage_ids else None
+    filter_ids = set(accept_storage_ids.split(","))
     return {k: v for k, v in storage_backends.items() if k in filter_ids}
 
 
 @tracer.capture_method(capture_response=False)
-def create_segment_access_urls(
-    segment: dict,
-    storage_backend: dict,
+def compile_get_url_builders(
+    storage_backends: dict[str, dict],
     generate_presigned_urls: bool,
     verbose_storage: bool,
     include_storage_id: bool,
-) -> list[dict]:
-    """Generate controlled access URLs for a segment.
+    filter_labels: Optional[list[str]],
+    presigned: Optional[bool],
+) -> dict[str, tuple[str, list[dict]]]:
+    """Compile the get_url builder of each storage backend.
+
+    A builder is the url prefix of the storage backend and the get_url entries,
+    less the url, that it provides. The label and presigned filters are applied
+    once here, so building the get_urls of an object only needs to append the
+    object id to the prefix.
 
     Args:
-        segment: Segment dictionary containing object_id
-        storage_backend: Storage backend configuration
+        storage_backends: Dict mapping storage IDs to their backend configurations
         generate_presigned_urls: Whether to generate presigned URLs
         verbose_storage: Whether to include verbose storage info
+        include_storage_id: Whether to include the storage_id
+        filter_labels: list of URL labels to accept
+        presigned: Whether to generate presigned URLs only
 
     Returns:
-        list of URL dictionaries with labels and URLs
+        Dict mapping storage IDs to their (url prefix, get_url templates)
     """
-    direct_url = create_direct_s3_get_url(
-        segment["object_id"], storage_backend, include_storage_id
-    )
-    if verbose_storage:
-        direct_url = {
-            **direct_url,
-            **model_dump(Storagebackend(**storage_backend)),
-            "storage_id": storage_backend["id"],
-            "controlled": True,
-        }
-    get_urls = [direct_url]
-    if generate_presigned_urls:
-        presigned_url_template = direct_url.copy()
-        presigned_url_template["label"] = presigned_url_template["label"].replace(
-            ":s3:", ":s3.presigned:"
+    registry = storage_backend_registry.get()
+    get_url_builders = {}
+    for storage_id, storage_backend in storage_backends.items():
+        direct_url = {"label": storage_backend["label"]}
+        if include_storage_id:
+            direct_url["storage_id"] = storage_id
+        if verbose_storage:
+            direct_url = {
+                **direct_url,
+                **registry.verbose_storage[storage_id],
+                "storage_id": storage_id,
+                "controlled": True,
+            }
+        templates = [direct_url]
+        if generate_presigned_urls:
+            templates.append(
+                {
+                    **direct_url,
+                    "label": direct_url["label"].replace(":s3:", ":s3.presigned:"),
+                    "presigned": True,
+                }
+            )
+        get_url_builders[storage_id] = (
+            registry.url_prefixes[storage_id],
+            filter_get_urls(templates, filter_labels, presigned),
         )
-        presigned_url_template["presigned"] = True
-        get_urls.append(presigned_url_template)
+    return get_url_builders
+
+
+@tracer.capture_method(capture_response=False)
+def filter_get_urls(
+    get_urls: list[dict], filter_labels: Optional[list[str]], presigned: Optional[bool]
+) -> list[dict]:
+    """Filter get_urls by label and whether they are presigned"""
+    if filter_labels:
+        get_urls = [
+            get_url for get_url in get_urls if get_url["label"] in filter_labels
+        ]
+    if presigned is not None:
+        get_urls = [
+            get_url
+            for get_url in get_urls
+            if get_url.get("presigned", False) == presigned
+        ]
+    return get_urls
+
+
+@tracer.capture_method(capture_response=False)
+def build_get_urls(
+    object_id: str,
+    storage_ids: list[str],
+    uncontrolled_get_urls: list[dict],
+    get_url_builders: dict[str, tuple[str, list[dict]]],
+    filter_labels: Optional[list[str]],
+    presigned: Optional[bool],
+) -> list[dict]:
+    """Build the get_urls of an object from its storage ids and uncontrolled get_urls.
+
+    Args:
+        object_id: The S3 object identifier
+        storage_ids: The storage IDs of the controlled instances of the object
+        uncontrolled_get_urls: The get_urls of the uncontrolled instances of the object
+        get_url_builders: The compiled get_url builders of the storage backends
+        filter_labels: list of URL labels to accept
+        presigned: Whether to generate presigned URLs only
+
+    Returns:
+        list of URL dictionaries with labels and URLs
+    """
+    get_urls = filter_get_urls(uncontrolled_get_urls, filter_labels, presigned)
+    for storage_id in storage_ids:
+        get_url_builder = get_url_builders.get(storage_id)
+        if get_url_builder:
+            url = get_url_builder[0] + object_id
+            get_urls.extend({**template, "url": url} for template in get_url_builder[1])
     return get_urls
 
 
+@tracer.capture_method(capture_response=False)
+def join_object_instances(segments: list[dict]) -> None:
+    """Replace the instances of segments with those held on their Objects' storage records.
+
+    The instances of an Object are held on its storage record once they have
+    been changed through the objects endpoints, in which case the lists on
+    the segments referencing it are no longer updated. Objects without such
+    a record keep the instances held on their segments.
+    """
+    instances = get_object_instances(
+        object_id
+        for segment in segments
+        for object_id in (segment["object_id"], segment.get("init_object_id"))
+        if object_id
+    )
+    for segment in segments:
+        for id_attr, storage_attr, get_urls_attr in (
+            ("object_id", "storage_ids", "get_urls"),
+            ("init_object_id", "init_storage_ids", "init_get_urls"),
+        ):
+            object_instances = instances.get(segment.get(id_attr))
+            if object_instances is not None:
+                # Copied as segments may share an Object and get_urls are extended in place
+                segment[storage_attr] = list(object_instances["storage_ids"])
+                segment[get_urls_attr] = list(object_instances["get_urls"])
+
+
 @tracer.capture_method(capture_response=False)
 def populate_get_urls(
     segments: list[dict],
@@ -164,6 +281,7 @@ def populate_get_urls(
                 segment.pop("init_get_urls", None)
                 segment["init_object"] = {"object_id": init_id, "get_urls": []}
         return
+    join_object_instances(segments)
     should_create_presigned_urls = (presigned or presigned is None) and (
         accept_get_urls is None or ":s3.presigned:" in accept_get_urls
     )
@@ -171,64 +289,48 @@ def populate_get_urls(
         None if accept_get_urls is None else accept_get_urls.split(",")
     )  # Test explictly for None as empty string has special meaning but would be falsey
     storage_backends = get_storage_backends(accept_storage_ids)
-    default_storage_backend = next(
-        (v for v in storage_backends.values() if v.get("default_storage")), None
+    default_storage_ids = [
+        k for k, v in storage_backends.items() if v.get("default_storage")
+    ][:1]
+    get_url_builders = compile_get_url_builders(
+        storage_backends,
+        should_create_presigned_urls,
+        verbose_storage,
+        include_storage_id,
+        filter_labels,
+        presigned,
     )
     # Keep track of unique needed presigned urls during the loop
     urls_needing_presigning = set()
     for segment in segments:
-        storage_ids = segment.get("storage_ids", [])
-        get_urls = [] if accept_storage_ids else segment.get("get_urls", [])
-        if not storage_ids and not segment.get("get_urls"):
-            if default_storage_backend:
-                get_urls.extend(
-                    create_segment_access_urls(
-                        segment,
-                        default_storage_backend,
-                        should_create_presigned_urls,
-                        verbose_storage,
-                        include_storage_id,
-                    )
-                )
-        for storage_id in storage_ids:
-            if storage_backends.get(storage_id):
-                get_urls.extend(
-                    create_segment_access_urls(
-                        segment,
-                        storage_backends[storage_id],
-                        should_create_presigned_urls,
-                        verbose_storage,
-                        include_storage_id,
-                    )
-                )
-        if filter_labels:
-            get_urls = [
-                get_url for get_url in get_urls if get_url["label"] in filter_labels
-            ]
-        if presigned is not None:
-            get_urls = [
-                get_url
-                for get_url in get_urls
-                if get_url.get("presigned", False) == presigned
-            ]
+        uncontrolled_get_urls = segment.get("get_urls", [])
+        get_urls = build_get_urls(
+            segment["object_id"],
+            segment.get("storage_ids")
+            or ([] if uncontrolled_get_urls else default_storage_ids),
+            [] if accept_storage_ids else uncontrolled_get_urls,
+            get_url_builders,
+            filter_labels,
+            presigned,
+        )
         # Add needed presigned urls to set for later parallel processing
         urls_needing_presigning.update(
             get_url["url"] for get_url in get_urls if get_url.get("presigned", False)
         )
         segment["get_urls"] = get_urls
     # Generate presigned urls for all unique urls needed
-    presigned_url_mapping = create_presigned_urls_parallel(urls_needing_presigning)
-    # Update the url for the presigned get_urls present
-    for segment in segments:
-        get_urls = []
-        for get_url in segment["get_urls"]:
-            if get_url.get("presigned", False):
-                get_urls.append(
+    if urls_needing_presigning:
+        presigned_url_mapping = create_presigned_urls_parallel(urls_needing_presigning)
+        # Update the url for the presigned get_urls present
+        for segment in segments:
+            segment["get_urls"] = [
+                (
                     {**get_url, "url": presigned_url_mapping[get_url["url"]]}
+                    if get_url.get("presigned", False)
+                    else get_url
                 )
-            else:
-                get_urls.append(get_url)
-        segment["get_urls"] = get_urls
+                for get_url in segment["get_urls"]
+            ]
     # Build init_object for segments that have init_object_id
     init_segments = [s for s in segments if s.get("init_object_id")]
     if not init_segments:
@@ -252,43 +354,16 @@ def populate_get_urls(
                     init_object_map[init_id]["uncontrolled_get_urls"].append(get_url)
     # Generate get_urls for each unique init object
     for item in init_object_map.values():
-        storage_ids = item.get("storage_ids", [])
-        get_urls = (
-            [] if accept_storage_ids else list(item.get("uncontrolled_get_urls", []))
+        uncontrolled_get_urls = item["uncontrolled_get_urls"]
+        item["get_urls"] = build_get_urls(
+            item["object_id"],
+            item["storage_ids"]
+            or ([] if uncontrolled_get_urls else default_storage_ids),
+            [] if accept_storage_ids else uncontrolled_get_urls,
+            get_url_builders,
+            filter_labels,
+            presigned,
         )
-        if not storage_ids and not item.get("uncontrolled_get_urls"):
-            if default_storage_backend:
-                get_urls.extend(
-                    create_segment_access_urls(
-                        item,
-                        default_storage_backend,
-                        should_create_presigned_urls,
-                        verbose_storage,
-                        include_storage_id,
-                    )
-                )
-        for storage_id in storage_ids:
-            if storage_backends.get(storage_id):
-                get_urls.extend(
-                    create_segment_access_urls(
-                        item,
-                        storage_backends[storage_id],
-                        should_create_presigned_urls,
-                        verbose_storage,
-                        include_storage_id,
-                    )
-                )
-        if filter_labels:
-            get_urls = [
-                get_url for get_url in get_urls if get_url["label"] in filter_labels
-            ]
-        if presigned is not None:
-            get_urls = [
-                get_url
-                for get_url in get_urls
-                if get_url.get("presigned", False) == presigned
-            ]
-        item["get_urls"] = get_urls
     # Generate presigned urls for init objects
     init_urls_needing_presigning = {
         get_url["url"]
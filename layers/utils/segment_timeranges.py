@@ -0,0 +1,160 @@
+from bisect import bisect_left
+
+from aws_lambda_powertools import Tracer
+from mediatimestamp.immutable import TimeRange, Timestamp
+
+tracer = Tracer()
+
+
+@tracer.capture_method(capture_response=False)
+def get_timerange_bounds(timerange: TimeRange) -> tuple[int, int]:
+    """Get the inclusive nanosecond start and end of a timerange.
+
+    Args:
+        timerange: A bounded TimeRange
+
+    Returns:
+        Tuple of (start, end), matching how timerange_start and timerange_end
+        are stored on a Flow Segment
+    """
+    return (
+        timerange.start.to_nanosec() + (0 if timerange.includes_start() else 1),
+        timerange.end.to_nanosec() - (0 if timerange.includes_end() else 1),
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def get_timerange_limits(timerange: TimeRange) -> tuple[int | None, int | None]:
+    """Get the inclusive nanosecond start and end of a timerange, None when unbounded.
+
+    An empty timerange returns a start after its end, so that it contains and
+    overlaps no interval.
+    """
+    if timerange.is_empty():
+        return (1, 0)
+    return (
+        None
+        if timerange.start is None
+        else timerange.start.to_nanosec() + (0 if timerange.includes_start() else 1),
+        None
+        if timerange.end is None
+        else timerange.end.to_nanosec() - (0 if timerange.includes_end() else 1),
+    )
+
+
+def get_segment_bounds(item: dict) -> tuple[int, int]:
+    """Get the inclusive nanosecond start and end of a Flow Segment item.
+
+    The stored timerange_start and timerange_end are used when present, so the
+    timerange string is only parsed for items that do not have them. This is
+    called per item, so it is not traced.
+    """
+    if "timerange_start" in item and "timerange_end" in item:
+        return (int(item["timerange_start"]), int(item["timerange_end"]))
+    return get_timerange_bounds(TimeRange.from_str(item["timerange"]))
+
+
+def is_within_limits(
+    bounds: tuple[int, int], limits: tuple[int | None, int | None]
+) -> bool:
+    """Check whether inclusive nanosecond bounds are entirely within limits, see get_timerange_limits"""
+    return (limits[0] is None or bounds[0] >= limits[0]) and (
+        limits[1] is None or bounds[1] <= limits[1]
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def get_bounds_timerange(start: int, end: int) -> TimeRange:
+    """Get the timerange of inclusive nanosecond bounds, see get_timerange_bounds"""
+    return TimeRange(
+        Timestamp.from_nanosec(start),
+        Timestamp.from_nanosec(end + 1),
+        TimeRange.INCLUDE_START,
+    )
+
+
+@tracer.capture_method(capture_response=False)
+def get_coverage(
+    intervals, start: int | None = None, end: int | None = None
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """Merge inclusive intervals into the contiguous ranges they cover between start and end, and the gaps between those ranges.
+
+    The intervals must not overlap and must be ordered, as Flow Segments are
+    returned by a query. They are consumed lazily and iteration stops at the
+    first interval after end. An unbounded start or end is limited to the
+    first or last interval, so no gaps are returned beyond them.
+
+    Returns:
+        Tuple of (coverage, gaps), each a list of inclusive (start, end) tuples
+    """
+    coverage = []
+    gaps = []
+    if start is not None and end is not None and start > end:
+        return coverage, gaps
+    cursor = start
+    for interval_start, interval_end in intervals:
+        if end is not None and interval_start > end:
+            break
+        if start is not None and interval_end < start:
+            continue
+        interval_start = interval_start if start is None else max(interval_start, start)
+        interval_end = interval_end if end is None else min(interval_end, end)
+        if coverage and interval_start == cursor:
+            coverage[-1] = (coverage[-1][0], interval_end)
+        else:
+            if cursor is not None and interval_start > cursor:
+                gaps.append((cursor, interval_start - 1))
+            coverage.append((interval_start, interval_end))
+        cursor = interval_end + 1
+    if cursor is not None and end is not None and cursor <= end:
+        gaps.append((cursor, end))
+    return coverage, gaps
+
+
+@tracer.capture_method(capture_response=False)
+def get_sample_points(
+    start: int, end: int, interval: int, after: int | None, limit: int
+) -> tuple[list[int], bool]:
+    """Get up to limit nanosecond sample points start + k * interval within start to end, after the point after.
+
+    Returns:
+        Tuple of (points, more), where more is True when further points
+        within the range follow the last one returned
+    """
+    first = 0 if after is None or after < start else (after - start) // interval + 1
+    points = []
+    point = start + first * interval
+    while point <= end and len(points) < limit:
+        points.append(point)
+        point += interval
+    return points, point <= end
+
+
+class SegmentIntervalIndex:
+    """Sorted index of the inclusive nanosecond intervals of a Flow's Segments.
+
+    Segments in a Flow never overlap, so ordering the intervals by end also
+    orders them by start. This allows the only interval that can overlap a
+    candidate to be found with a single bisect on the ends.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals, key=lambda interval: interval[1]):
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """Check whether the inclusive interval start to end overlaps any interval in the index"""
+        index = bisect_left(self.ends, start)
+        return index < len(self.ends) and self.starts[index] <= end
+
+    def add(self, start: int, end: int) -> None:
+        """Add an inclusive interval, which must not overlap any interval in the index"""
+        index = bisect_left(self.ends, end)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
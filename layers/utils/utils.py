@@ -1,11 +1,17 @@
+import hashlib
 import json
 import math
 import os
+import random
+import time
 import urllib.parse
 import uuid
+from abc import ABC, abstractmethod
 from collections import defaultdict
 from datetime import datetime, timezone
 from itertools import batched
+from types import UnionType
+from typing import Annotated, Callable, Union, get_args, get_origin
 
 import boto3
 
@@ -21,10 +27,16 @@ from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy_event import
     APIGatewayEventRequestContext,
 )
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from mediatimestamp.immutable import TimeRange, Timestamp
 from params import essence_params
-from pydantic import BaseModel
+from pydantic import BaseModel, RootModel
 from schema import FailedSegment, Flowsegmentpost
+from segment_timeranges import (
+    get_segment_bounds,
+    get_timerange_limits,
+    is_within_limits,
+)
 
 tracer = Tracer()
 
@@ -72,6 +84,29 @@ def generate_link_url(current_event: APIGatewayProxyEvent, page_value: str) -> s
     return f'<https://{host}{path}?{query_string}page={urllib.parse.quote_plus(page_value)}>; rel="next"'
 
 
+@tracer.capture_method(capture_response=False)
+def generate_etag(*values) -> str:
+    """Generates a weak ETag from the supplied values"""
+    digest = hashlib.sha256(
+        json.dumps(values, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+@tracer.capture_method(capture_response=False)
+def check_if_none_match(current_event: APIGatewayProxyEvent, etag: str) -> bool:
+    """Returns True if the If-None-Match header of the request matches the supplied ETag"""
+    if_none_match = current_event.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison, so the W/ prefix is ignored
+    weak_etag = etag.removeprefix("W/")
+    return any(
+        value == "*" or value.removeprefix("W/") == weak_etag
+        for value in (value.strip() for value in if_none_match.split(","))
+    )
+
+
 @tracer.capture_method(capture_response=False)
 def get_message_batches(items: list) -> list:
     """Split a list of items into a list of batches all smaller than the defined maximum message size"""
@@ -247,11 +282,12 @@ def model_dump(
 @tracer.capture_method(capture_response=False)
 def pop_outliers(timerange: TimeRange, items: list) -> list:
     """Remove ends of a list of Timerange items if they do not fully cover the supplied Timerange"""
+    limits = get_timerange_limits(timerange)
     if len(items) > 1:
-        if not timerange.contains_subrange(TimeRange.from_str(items[-1]["timerange"])):
+        if not is_within_limits(get_segment_bounds(items[-1]), limits):
             return items[:-1]
     if len(items) > 0:
-        if not timerange.contains_subrange(TimeRange.from_str(items[0]["timerange"])):
+        if not is_within_limits(get_segment_bounds(items[0]), limits):
             return items[1:]
     return items
 
@@ -279,6 +315,62 @@ def remove_null(obj: dict | list) -> None:
                 remove_null(v)
 
 
+@tracer.capture_method(capture_response=False)
+def get_value_serialiser(annotation: any) -> Callable[[any], any] | None:
+    """Returns a function converting a stored value of the supplied type annotation to its JSON form, None when no conversion is needed"""
+    origin = get_origin(annotation)
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    if origin in (Union, UnionType):
+        return get_value_serialiser(args[0]) if len(args) == 1 else None
+    if origin is Annotated:
+        return get_value_serialiser(args[0])
+    if origin is list:
+        item_serialiser = get_value_serialiser(args[0])
+        if item_serialiser is None:
+            return None
+        return lambda value: [item_serialiser(v) for v in value]
+    if (
+        isinstance(annotation, type)
+        and issubclass(annotation, BaseModel)
+        and not issubclass(annotation, RootModel)
+    ):
+        return get_model_serialiser(annotation)
+    if annotation in (int, float):
+        # DynamoDB returns all numbers as Decimal
+        return annotation
+    return None
+
+
+@tracer.capture_method(capture_response=False)
+def get_model_serialiser(model: type[BaseModel]) -> Callable[[dict], dict]:
+    """Returns a function that serialises a dict like model_dump of the model built from it.
+
+    The fields and their conversions are resolved once up front, so each call
+    avoids pydantic validation and the datetime probing of remove_null. Unlike
+    model_dump, string values that parse as datetimes are returned as stored
+    rather than normalised to DATETIME_FORMAT, so the output only matches for
+    models without such values, e.g. Flowsegment. Only use it for trusted data
+    that was validated before it was stored.
+    """
+    fields = [
+        (field.alias or name, get_value_serialiser(field.annotation))
+        for name, field in model.model_fields.items()
+    ]
+
+    def serialise(obj: dict) -> dict:
+        serialised = {}
+        for key, value_serialiser in fields:
+            value = obj.get(key)
+            if value is None or value == {} or value == []:
+                continue
+            serialised[key] = (
+                value if value_serialiser is None else value_serialiser(value)
+            )
+        return serialised
+
+    return serialise
+
+
 @tracer.capture_method(capture_response=False)
 def parse_tag_parameters(params: None) -> tuple[dict, dict]:
     """Parse Tags Value and Exist parameters from request query string parameters"""
@@ -404,11 +496,110 @@ def filter_dict(obj: dict, keys: set) -> dict:
     return {k: v for k, v in obj.items() if k not in keys}
 
 
-@tracer.capture_method(capture_response=False)
-def publish_event(detail_type: str, details: dict, resources) -> None:
-    """Publishes the supplied events to an EventBridge EventBus"""
-    events.put_events(
-        Entries=[
+def backoff(attempt: int) -> None:
+    """Sleeps before retry number attempt (counted from 1) with full jitter exponential backoff"""
+    time.sleep(
+        random.uniform(
+            0,
+            min(
+                constants.RETRY_BACKOFF_MAX_SECS,
+                constants.RETRY_BACKOFF_BASE_SECS * 2**attempt,
+            ),
+        )
+    )
+
+
+class EntryBuffer(ABC):
+    """Buffers entries for a batch API, sending them in as few calls as its entry count and payload size limits allow.
+
+    The buffer is flushed when full and when used as a context manager on exit,
+    unless the block raised. Entries that fail, or a whole batch that is
+    throttled, are retried up to BATCH_MAX_RETRIES times with backoff, after
+    which the flush raises.
+    """
+
+    max_entries = 1
+    max_size = 0
+
+    def __init__(self):
+        self.entries = []
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Entries buffered by a failed block are dropped rather than sent
+        if exc_type is None:
+            self.flush()
+
+    @abstractmethod
+    def entry_size(self, entry: dict) -> int:
+        """Returns the size of an entry as counted against the payload limit"""
+
+    @abstractmethod
+    def send(self, entries: list[dict]) -> list[dict]:
+        """Sends a batch of entries, returning those that failed"""
+
+    def put(self, entry: dict) -> None:
+        """Adds an entry, flushing the buffer first if it would not fit"""
+        size = self.entry_size(entry)
+        if self.entries and (
+            len(self.entries) >= self.max_entries or self.size + size > self.max_size
+        ):
+            self.flush()
+        self.entries.append(entry)
+        self.size += size
+
+    @tracer.capture_method(capture_response=False)
+    def flush(self) -> None:
+        """Sends all buffered entries, raising if any still fail once the retries are exhausted"""
+        entries = self.entries
+        self.entries = []
+        self.size = 0
+        if not entries:
+            return
+        for attempt in range(constants.BATCH_MAX_RETRIES + 1):
+            if attempt:
+                backoff(attempt)
+            try:
+                entries = self.send(entries)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in constants.THROTTLING_ERROR_CODES:
+                    raise
+                continue
+            if not entries:
+                return
+        raise RuntimeError(f"Failed to send {len(entries)} entries")
+
+
+class EventBuffer(EntryBuffer):
+    """Buffers events for the EventBridge EventBus, see EntryBuffer"""
+
+    max_entries = constants.PUT_EVENTS_ENTRY_LIMIT
+    max_size = constants.PUT_EVENTS_SIZE_LIMIT
+
+    def entry_size(self, entry: dict) -> int:
+        # Calculated as documented for PutEvents, with 14 bytes for the Time
+        return (
+            14
+            + len(entry["Source"].encode("utf-8"))
+            + len(entry["DetailType"].encode("utf-8"))
+            + len(entry["Detail"].encode("utf-8"))
+            + sum(len(resource.encode("utf-8")) for resource in entry["Resources"])
+        )
+
+    def send(self, entries: list[dict]) -> list[dict]:
+        response = events.put_events(Entries=entries)
+        return [
+            entry
+            for entry, result in zip(entries, response.get("Entries", []))
+            if "ErrorCode" in result
+        ]
+
+    def add(self, detail_type: str, details: dict, resources) -> None:
+        """Adds an event to the buffer"""
+        self.put(
             {
                 "Source": "tams.api",
                 "EventBusName": os.environ["EVENT_BUS"],
@@ -417,8 +608,50 @@ def publish_event(detail_type: str, details: dict, resources) -> None:
                 "Detail": json.dumps(details),
                 "Resources": resources,
             }
-        ],
-    )
+        )
+
+
+class MessageBuffer(EntryBuffer):
+    """Buffers messages for an SQS queue, see EntryBuffer"""
+
+    max_entries = constants.SEND_MESSAGE_BATCH_LIMIT
+    max_size = constants.MAX_MESSAGE_SIZE
+
+    def __init__(self, queue: str):
+        super().__init__()
+        self.queue = queue
+
+    def entry_size(self, entry: dict) -> int:
+        return len(entry["MessageBody"].encode("utf-8"))
+
+    def send(self, entries: list[dict]) -> list[dict]:
+        batch_entries = [
+            {**entry, "Id": str(index)} for index, entry in enumerate(entries)
+        ]
+        response = sqs.send_message_batch(QueueUrl=self.queue, Entries=batch_entries)
+        failed_ids = {failed["Id"] for failed in response.get("Failed", [])}
+        return [
+            entry for index, entry in enumerate(entries) if str(index) in failed_ids
+        ]
+
+    def add(self, item: dict) -> None:
+        """Adds a message to the buffer"""
+        self.put({"MessageBody": json.dumps(item)})
+
+
+@tracer.capture_method(capture_response=False)
+def publish_event(detail_type: str, details: dict, resources) -> None:
+    """Publishes the supplied events to an EventBridge EventBus"""
+    with EventBuffer() as event_buffer:
+        event_buffer.add(detail_type, details, resources)
+
+
+@tracer.capture_method(capture_response=False)
+def publish_events(detail_type: str, details_list: list[dict], resources) -> None:
+    """Publishes one event per supplied details dict to an EventBridge EventBus, using as few PutEvents calls as possible"""
+    with EventBuffer() as event_buffer:
+        for details in details_list:
+            event_buffer.add(detail_type, details, resources)
 
 
 @tracer.capture_method(capture_response=False)
@@ -432,7 +665,11 @@ def put_message(queue: str, item: dict) -> None:
 
 @tracer.capture_method(capture_response=False)
 def generate_presigned_url(
-    method: str, bucket: str, key: str, **kwargs: None | dict
+    method: str,
+    bucket: str,
+    key: str,
+    expires_in: int = constants.MIN_PRESIGNED_URL_TIMEOUT_SECS,
+    **kwargs: None | dict,
 ) -> str:
     """Generates an S3 pre-signed URL"""
     url = s3.generate_presigned_url(
@@ -442,7 +679,7 @@ def generate_presigned_url(
             "Key": key,
             **kwargs,
         },
-        ExpiresIn=constants.MIN_PRESIGNED_URL_TIMEOUT_SECS,
+        ExpiresIn=expires_in,
     )
     return url
 
@@ -0,0 +1,119 @@
+import logging
+import uuid
+from unittest.mock import patch
+
+import pytest
+from conftest import DEFAULT_STORAGE_ID, best_time
+from schema import Flowsegmentpost
+
+pytestmark = [
+    pytest.mark.benchmark,
+]
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_COUNT = 100
+REPEAT = 5
+
+
+############
+# FIXTURES #
+############
+
+
+@pytest.fixture(autouse=True)
+def event_bus(monkeypatch):
+    """Publish the segments_added events to the default EventBridge bus"""
+    monkeypatch.setenv("EVENT_BUS", "default")
+
+
+@pytest.fixture(scope="module")
+def api_flow_segments():
+    """
+    Import api_flow_segments Lambda handler after moto is active.
+
+    Returns:
+        module: The api_flow_segments Lambda handler module
+    """
+    # pylint: disable=import-outside-toplevel
+    from api_flow_segments import app
+
+    return app
+
+
+@pytest.fixture
+# pylint: disable=redefined-outer-name
+def new_flow_segments(storage_table):
+    """
+    Factory fixture creating a new Flow with SEGMENT_COUNT contiguous segments to post.
+
+    Returns:
+        function: A factory returning a (flow, segments) tuple
+    """
+
+    def _create():
+        flow = {
+            "id": str(uuid.uuid4()),
+            "source_id": str(uuid.uuid4()),
+            "container": "video/mp2t",
+        }
+        segments = []
+        with storage_table.batch_writer() as batch:
+            for i in range(SEGMENT_COUNT):
+                object_id = f"{flow['id']}-{i}"
+                batch.put_item(
+                    Item={
+                        "id": object_id,
+                        "flow_id": flow["id"],
+                        "expire_at": 9999999999,
+                        "storage_id": DEFAULT_STORAGE_ID,
+                    }
+                )
+                segments.append(
+                    Flowsegmentpost(object_id=object_id, timerange=f"[{i}:0_{i + 1}:0)")
+                )
+        return flow, segments
+
+    return _create
+
+
+#########
+# TESTS #
+#########
+
+
+# pylint: disable=redefined-outer-name
+def test_post_segments_overlap_queries(api_flow_segments, new_flow_segments):
+    """Posting segments one at a time queries the Flow for overlaps per segment, a batch queries once."""
+    segments_table = api_flow_segments.segments_table
+    with patch.object(
+        segments_table, "query", wraps=segments_table.query
+    ) as mock_query:
+        single_time = best_time(
+            lambda args: [
+                api_flow_segments.process_single_segment(args[0], segment)
+                for segment in args[1]
+            ],
+            new_flow_segments,
+            REPEAT,
+        )
+        single_queries = mock_query.call_count
+        mock_query.reset_mock()
+        batch_time = best_time(
+            lambda args: api_flow_segments.process_segments_batch(*args),
+            new_flow_segments,
+            REPEAT,
+        )
+        batch_queries = mock_query.call_count
+
+    logger.info(
+        "%d segments: one at a time %.1f ms with %d queries, batch %.1f ms with %d",
+        SEGMENT_COUNT,
+        single_time * 1000,
+        single_queries // REPEAT,
+        batch_time * 1000,
+        batch_queries // REPEAT,
+    )
+    assert SEGMENT_COUNT * REPEAT == single_queries
+    assert REPEAT == batch_queries
+    assert batch_time < single_time
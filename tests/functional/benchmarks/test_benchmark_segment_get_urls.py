@@ -0,0 +1,96 @@
+import logging
+import uuid
+from unittest.mock import patch
+
+import pytest
+from conftest import ALTERNATIVE_STORAGE_ID, DEFAULT_STORAGE_ID, best_time
+
+pytestmark = [
+    pytest.mark.benchmark,
+]
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_COUNT = 300
+REPEAT = 20
+
+
+############
+# FIXTURES #
+############
+
+
+@pytest.fixture(scope="module")
+def segment_get_urls():
+    """
+    Import segment_get_urls after moto is active.
+
+    Returns:
+        module: The segment_get_urls layer module
+    """
+    # pylint: disable=import-outside-toplevel
+    import segment_get_urls
+
+    return segment_get_urls
+
+
+@pytest.fixture
+# pylint: disable=redefined-outer-name
+def new_segments_page(segment_get_urls):
+    """
+    Factory fixture creating a page of SEGMENT_COUNT segments stored in both storage backends.
+
+    The presigned url cache is cleared so each page signs its urls afresh.
+
+    Returns:
+        function: A factory returning a list of segment dicts
+    """
+    flow_id = str(uuid.uuid4())
+
+    def _create():
+        segment_get_urls._presigned_url_cache.clear()
+        return [
+            {
+                "flow_id": flow_id,
+                "object_id": f"{flow_id}-{i}",
+                "timerange": f"[{i}:0_{i + 1}:0)",
+                "storage_ids": [DEFAULT_STORAGE_ID, ALTERNATIVE_STORAGE_ID],
+            }
+            for i in range(SEGMENT_COUNT)
+        ]
+
+    return _create
+
+
+#########
+# TESTS #
+#########
+
+
+# pylint: disable=redefined-outer-name
+def test_populate_get_urls(segment_get_urls, new_segments_page):
+    """Time building the get_urls of a page of segments for common request parameters."""
+    label = segment_get_urls.storage_backend_registry.get().by_id[DEFAULT_STORAGE_ID][
+        "label"
+    ]
+    cases = {
+        "default": ({}, 4),
+        "verbose_storage": ({"verbose_storage": True}, 4),
+        "presigned=false": ({"presigned": False}, 2),
+        "single label": ({"accept_get_urls": label}, 1),
+    }
+    # The segments already hold their storage_ids, so only the get_urls are built
+    with patch.object(segment_get_urls, "join_object_instances"):
+        for name, (kwargs, get_urls_count) in cases.items():
+            segments = new_segments_page()
+            segment_get_urls.populate_get_urls(segments, **kwargs)
+            assert all(len(s["get_urls"]) == get_urls_count for s in segments)
+
+            elapsed = best_time(
+                lambda segments, kwargs=kwargs: segment_get_urls.populate_get_urls(
+                    segments, **kwargs
+                ),
+                new_segments_page,
+                REPEAT,
+            )
+            logger.info("%d segments, %s: %.1f ms", SEGMENT_COUNT, name, elapsed * 1000)
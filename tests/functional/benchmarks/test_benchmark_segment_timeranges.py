@@ -0,0 +1,180 @@
+import logging
+import uuid
+from decimal import Decimal
+
+import pytest
+from conftest import best_time
+from mediatimestamp.immutable import TimeRange
+
+pytestmark = [
+    pytest.mark.benchmark,
+]
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_COUNT = 10000
+PAGE_SIZE = 100
+REPEAT = 5
+
+
+############
+# FIXTURES #
+############
+
+
+@pytest.fixture(scope="module")
+def api_flow_segments():
+    """
+    Import api_flow_segments Lambda handler after moto is active.
+
+    Returns:
+        module: The api_flow_segments Lambda handler module
+    """
+    # pylint: disable=import-outside-toplevel
+    from api_flow_segments import app
+
+    return app
+
+
+@pytest.fixture(scope="module")
+def segment_timeranges():
+    """
+    Import segment_timeranges after moto is active.
+
+    Returns:
+        module: The segment_timeranges layer module
+    """
+    # pylint: disable=import-outside-toplevel
+    import segment_timeranges
+
+    return segment_timeranges
+
+
+@pytest.fixture
+def stored_segments():
+    """
+    Segments as read back from DynamoDB, with Decimal bounds.
+
+    Returns:
+        list: SEGMENT_COUNT contiguous segment dicts
+    """
+    flow_id = str(uuid.uuid4())
+    return [
+        {
+            "flow_id": flow_id,
+            "timerange_start": Decimal(i * 1000000000),
+            "timerange_end": Decimal((i + 1) * 1000000000 - 1),
+            "timerange": f"[{i}:0_{i + 1}:0)",
+            "object_id": f"{flow_id}-{i}",
+        }
+        for i in range(SEGMENT_COUNT)
+    ]
+
+
+#############
+# FUNCTIONS #
+#############
+
+
+def get_pages(items):
+    """
+    Get every page of PAGE_SIZE consecutive segments, in both orders.
+
+    Args:
+        items (list): The segments
+
+    Returns:
+        list: Lists of PAGE_SIZE segments, ascending then descending
+    """
+    pages = [items[i : i + PAGE_SIZE] for i in range(len(items) - PAGE_SIZE + 1)]
+    return pages + [page[::-1] for page in pages]
+
+
+def parse_paging_timerange(items):
+    """
+    Get the paging timerange of a page by parsing its first and last timerange.
+
+    Args:
+        items (list): A page of segments
+
+    Returns:
+        str: The timerange encompassing the page
+    """
+    return str(
+        TimeRange.from_str(items[0]["timerange"]).extend_to_encompass_timerange(
+            TimeRange.from_str(items[-1]["timerange"])
+        )
+    )
+
+
+#########
+# TESTS #
+#########
+
+
+# pylint: disable=redefined-outer-name
+def test_get_paging_timerange(api_flow_segments, stored_segments):
+    """The paging timerange from the stored bounds matches parsing the timerange strings."""
+    pages = get_pages(stored_segments)
+    # Compare the implementations, without the tracer wrapper both would pay
+    get_paging_timerange = api_flow_segments.get_paging_timerange.__wrapped__
+
+    parse_time = best_time(
+        lambda: [parse_paging_timerange(page) for page in pages], repeat=REPEAT
+    )
+    bounds_time = best_time(
+        lambda: [get_paging_timerange(page) for page in pages],
+        repeat=REPEAT,
+    )
+
+    logger.info(
+        "%d pages of %d segments: parsing %.1f ms, bounds %.1f ms",
+        len(pages),
+        PAGE_SIZE,
+        parse_time * 1000,
+        bounds_time * 1000,
+    )
+    assert [parse_paging_timerange(page) for page in pages] == [
+        get_paging_timerange(page) for page in pages
+    ]
+    assert bounds_time < parse_time
+
+
+# pylint: disable=redefined-outer-name
+def test_segment_interval_index(segment_timeranges, stored_segments):
+    """Indexing the stored bounds of a Flow's segments matches parsing their timerange strings."""
+    candidates = [
+        (
+            int(item["timerange_start"]) + 500000000,
+            int(item["timerange_end"]) + 500000000,
+        )
+        for item in stored_segments
+    ]
+
+    def parse_index():
+        index = segment_timeranges.SegmentIntervalIndex(
+            segment_timeranges.get_timerange_bounds(
+                TimeRange.from_str(item["timerange"])
+            )
+            for item in stored_segments
+        )
+        return [index.overlaps(start, end) for start, end in candidates]
+
+    def bounds_index():
+        index = segment_timeranges.SegmentIntervalIndex(
+            segment_timeranges.get_segment_bounds(item) for item in stored_segments
+        )
+        return [index.overlaps(start, end) for start, end in candidates]
+
+    parse_time = best_time(parse_index, repeat=REPEAT)
+    bounds_time = best_time(bounds_index, repeat=REPEAT)
+
+    logger.info(
+        "%d segments: parsing %.1f ms, bounds %.1f ms",
+        SEGMENT_COUNT,
+        parse_time * 1000,
+        bounds_time * 1000,
+    )
+    assert parse_index() == bounds_index()
+    assert all(bounds_index())
+    assert bounds_time < parse_time
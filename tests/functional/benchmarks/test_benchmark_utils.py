@@ -0,0 +1,99 @@
+import logging
+import uuid
+from decimal import Decimal
+
+import pytest
+from conftest import DEFAULT_STORAGE_ID, best_time
+from schema import Flowsegment
+
+pytestmark = [
+    pytest.mark.benchmark,
+]
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_COUNT = 300
+REPEAT = 20
+
+
+############
+# FIXTURES #
+############
+
+
+@pytest.fixture(scope="module")
+def utils():
+    """
+    Import utils after moto is active.
+
+    Returns:
+        module: The utils layer module
+    """
+    # pylint: disable=import-outside-toplevel
+    import utils
+
+    return utils
+
+
+@pytest.fixture
+def stored_segments():
+    """
+    Segments as read back from DynamoDB, with Decimal numbers and populated get_urls.
+
+    Returns:
+        list: SEGMENT_COUNT segment dicts
+    """
+    flow_id = str(uuid.uuid4())
+    return [
+        {
+            "flow_id": flow_id,
+            "timerange_end": Decimal((i + 1) * 1000000000 - 1),
+            "object_id": f"{flow_id}-{i}",
+            "timerange": f"[{i}:0_{i + 1}:0)",
+            "key_frame_count": Decimal(1),
+            "sample_offset": Decimal(0),
+            "sample_count": Decimal(25),
+            "storage_ids": [DEFAULT_STORAGE_ID],
+            "get_urls": [
+                {
+                    "url": f"https://test-bucket.s3.eu-west-1.amazonaws.com/{flow_id}-{i}",
+                    "label": f"aws.eu-west-1:s3:{label}",
+                    "storage_id": DEFAULT_STORAGE_ID,
+                    "presigned": presigned,
+                    "controlled": True,
+                }
+                for label, presigned in (("test-bucket", False), ("presigned", True))
+            ],
+        }
+        for i in range(SEGMENT_COUNT)
+    ]
+
+
+#########
+# TESTS #
+#########
+
+
+# pylint: disable=redefined-outer-name
+def test_serialise_flow_segments(utils, stored_segments):
+    """The segment serialiser matches model_dump without the pydantic round trip."""
+    serialise_flowsegment = utils.get_model_serialiser(Flowsegment)
+    expected = [utils.model_dump(Flowsegment(**item)) for item in stored_segments]
+
+    model_time = best_time(
+        lambda: [utils.model_dump(Flowsegment(**item)) for item in stored_segments],
+        repeat=REPEAT,
+    )
+    serialiser_time = best_time(
+        lambda: [serialise_flowsegment(item) for item in stored_segments],
+        repeat=REPEAT,
+    )
+
+    logger.info(
+        "%d segments: model_dump %.1f ms, serialiser %.1f ms",
+        SEGMENT_COUNT,
+        model_time * 1000,
+        serialiser_time * 1000,
+    )
+    assert expected == [serialise_flowsegment(item) for item in stored_segments]
+    assert serialiser_time < model_time
@@ -2,6 +2,7 @@ import base64
 import json
 import logging
 import os
+import timeit
 import uuid
 import warnings
 from unittest.mock import MagicMock, patch
@@ -403,3 +404,24 @@ def serialise_dict(input_dict):
         else:
             result[k] = v
     return result
+
+
+def best_time(func, setup=None, repeat=5):
+    """
+    Time func with the timeit timer, returning the best of repeat runs.
+
+    Args:
+        func (callable): The code to time
+        setup (callable): Called untimed before each run, its result is passed to func
+        repeat (int): The number of runs
+
+    Returns:
+        float: The fastest run in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = timeit.default_timer()
+        func(*args)
+        times.append(timeit.default_timer() - start)
+    return min(times)
@@ -0,0 +1,737 @@
+import base64
+import json
+import uuid
+from http import HTTPStatus
+from unittest.mock import patch
+
+import pytest
+from conftest import DEFAULT_STORAGE_ID
+from mediatimestamp.immutable import TimeRange
+
+pytestmark = [
+    pytest.mark.functional,
+]
+
+FLOW_ID = str(uuid.uuid4())
+
+############
+# FIXTURES #
+############
+
+
+@pytest.fixture(autouse=True)
+def event_bus(monkeypatch):
+    """Publish the segment and flow events to the default EventBridge bus"""
+    monkeypatch.setenv("EVENT_BUS", "default")
+
+
+@pytest.fixture(scope="module")
+def api_flow_segments():
+    """
+    Import api_flow_segments Lambda handler after moto is active.
+
+    Returns:
+        module: The api_flow_segments Lambda handler module
+    """
+    # pylint: disable=import-outside-toplevel
+    from api_flow_segments import app
+
+    return app
+
+
+@pytest.fixture
+def neptune_flows(mock_neptune_client):
+    """
+    Answer the Neptune queries about a Flow with a row describing it.
+
+    Queries mentioning the id of a Flow in the returned dict get a single row
+    holding the Flow record, its segments_version and its event resources.
+    Other queries get no results.
+
+    Args:
+        mock_neptune_client: The mock Neptune client fixture
+
+    Returns:
+        dict: The Flow rows keyed by flow id, add to it to create a Flow
+    """
+    flows = {}
+
+    def _execute_open_cypher_query(openCypherQuery):
+        for flow_id, row in flows.items():
+            if flow_id in openCypherQuery:
+                return {"results": [row]}
+        return {"results": []}
+
+    mock_neptune_client.execute_open_cypher_query.side_effect = (
+        _execute_open_cypher_query
+    )
+    return flows
+
+
+@pytest.fixture
+# pylint: disable=redefined-outer-name
+def new_flow(neptune_flows):
+    """
+    Factory fixture creating a new Flow known to the mocked Neptune client.
+
+    Returns:
+        function: A factory returning the Neptune row of the new Flow
+    """
+
+    def _create(**properties):
+        flow_id = str(uuid.uuid4())
+        source_id = str(uuid.uuid4())
+        neptune_flows[flow_id] = {
+            "flow": {
+                "id": flow_id,
+                "source_id": source_id,
+                "format": "urn:x-nmos:format:video",
+                "container": "video/mp2t",
+                **properties,
+            },
+            "segments_version": str(uuid.uuid4()),
+            "source_id": source_id,
+            "source_collected_by": [],
+            "flow_collected_by": [],
+        }
+        return neptune_flows[flow_id]
+
+    return _create
+
+
+@pytest.fixture
+def put_segments(segments_table):
+    """
+    Factory fixture writing segments of a Flow straight to the segments table.
+
+    Returns:
+        function: A factory returning the written segment items
+    """
+
+    def _put(flow_id, timeranges):
+        items = []
+        for timerange in timeranges:
+            start, end = get_bounds(timerange)
+            items.append(
+                {
+                    "flow_id": flow_id,
+                    "timerange_start": start,
+                    "timerange_end": end,
+                    "timerange": timerange,
+                    "object_id": f"{flow_id}-{start}",
+                }
+            )
+        with segments_table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+        return items
+
+    return _put
+
+
+@pytest.fixture
+def new_object(storage_table):
+    """
+    Factory fixture creating a new, not yet used, Object for a Flow.
+
+    Returns:
+        function: A factory returning the id of the new Object
+    """
+
+    def _create(flow_id):
+        object_id = str(uuid.uuid4())
+        storage_table.put_item(
+            Item={
+                "id": object_id,
+                "flow_id": flow_id,
+                "expire_at": 9999999999,
+                "storage_id": DEFAULT_STORAGE_ID,
+            }
+        )
+        return object_id
+
+    return _create
+
+
+#############
+# FUNCTIONS #
+#############
+
+
+def get_bounds(timerange):
+    """
+    Get the inclusive nanosecond bounds a segment timerange is stored with.
+
+    Args:
+        timerange (str): The segment timerange
+
+    Returns:
+        tuple: The (timerange_start, timerange_end) of the segment
+    """
+    parsed = TimeRange.from_str(timerange)
+    return (
+        parsed.start.to_nanosec() + (0 if parsed.includes_start() else 1),
+        parsed.end.to_nanosec() - (0 if parsed.includes_end() else 1),
+    )
+
+
+def create_segments_event(api_event_factory, query_params):
+    """
+    Create a GET /segments event carrying its query string as API Gateway does.
+
+    API Gateway also supplies every parameter in multiValueQueryStringParameters,
+    without splitting the comma separated flow_id value.
+
+    Args:
+        api_event_factory: The API event factory fixture
+        query_params (dict): The query string parameters
+
+    Returns:
+        dict: The API Gateway event
+    """
+    event = api_event_factory("GET", "/segments", query_params=query_params)
+    event["multiValueQueryStringParameters"] = {
+        key: [value] for key, value in query_params.items()
+    }
+    return event
+
+
+def encode_page(pages):
+    """
+    Encode a GET /segments page token.
+
+    Args:
+        pages: The value to encode, normally a dict of flow id to timerange_end
+
+    Returns:
+        str: The base64 encoded JSON page token
+    """
+    return base64.b64encode(json.dumps(pages).encode("utf-8")).decode("utf-8")
+
+
+def decode_page(page):
+    """
+    Decode a GET /segments page token.
+
+    Args:
+        page (str): The base64 encoded JSON page token
+
+    Returns:
+        dict: The timerange_end to continue from keyed by flow id
+    """
+    return json.loads(base64.b64decode(page))
+
+
+def get_merged_segments(response_body):
+    """
+    Get the flow and timerange of each segment in a GET /segments response body.
+
+    Args:
+        response_body (list): The segments returned
+
+    Returns:
+        list: A (flow_id, timerange) tuple per segment
+    """
+    return [(segment["flow_id"], segment["timerange"]) for segment in response_body]
+
+
+#########
+# TESTS #
+#########
+
+
+# pylint: disable=redefined-outer-name
+def test_GET_segments_wait_without_start_returns_only_segments_added_during_wait(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, put_segments
+):
+    """
+    Verifies that a long poll without a timerange start returns only the segments
+    written after the last segment present when the wait started, not the whole Flow.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    put_segments(flow_id, ["[0:0_1:0)", "[1:0_2:0)"])
+    lambda_context.get_remaining_time_in_millis = lambda: 30000
+
+    def add_segment(_):
+        # pylint: disable=import-outside-toplevel
+        from dynamodb import extend_flow_timerange_summary
+
+        extend_flow_timerange_summary(flow_id, put_segments(flow_id, ["[2:0_3:0)"]))
+
+    event = api_event_factory(
+        "GET", f"/flows/{flow_id}/segments", query_params={"wait_timeout": "5"}
+    )
+
+    # Act
+    with patch("dynamodb.time.sleep", side_effect=add_segment):
+        response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.OK.value
+    assert [segment["timerange"] for segment in response_body] == ["[2:0_3:0)"]
+
+
+# pylint: disable=redefined-outer-name
+def test_GET_segments_wait_without_start_returns_nothing_when_no_segment_added(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, put_segments
+):
+    """
+    Verifies that a long poll without a timerange start that times out returns
+    no segments rather than the segments that already existed.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    put_segments(flow_id, ["[0:0_1:0)", "[1:0_2:0)"])
+    lambda_context.get_remaining_time_in_millis = lambda: 30000
+    event = api_event_factory(
+        "GET",
+        f"/flows/{flow_id}/segments",
+        query_params={"wait_timeout": "0.1", "timerange": "_5:0)"},
+    )
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.OK.value
+    assert response_body == []
+
+
+@pytest.fixture
+# pylint: disable=redefined-outer-name
+def interleaved_flows(put_segments):
+    """
+    Two Flows whose segments interleave in the timeline.
+
+    Returns:
+        list: The (flow_id, timerange) of every segment in timeline order
+    """
+    flow_a, flow_b = str(uuid.uuid4()), str(uuid.uuid4())
+    put_segments(flow_a, ["[0:0_1:0)", "[2:0_3:0)", "[4:0_5:0)"])
+    put_segments(flow_b, ["[1:0_2:0)", "[3:0_4:0)"])
+    return [
+        (flow_a, "[0:0_1:0)"),
+        (flow_b, "[1:0_2:0)"),
+        (flow_a, "[2:0_3:0)"),
+        (flow_b, "[3:0_4:0)"),
+        (flow_a, "[4:0_5:0)"),
+    ]
+
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize("reverse_order", [False, True])
+def test_GET_multi_flow_segments_merges_flows_in_timeline_order(
+    lambda_context,
+    api_event_factory,
+    api_flow_segments,
+    interleaved_flows,
+    reverse_order,
+):
+    """
+    Verifies that the segments of several flows are merged by timerange start,
+    in reverse when requested, and that a single page needs no page token.
+    """
+    # Arrange
+    flow_a, flow_b = interleaved_flows[0][0], interleaved_flows[1][0]
+    event = create_segments_event(
+        api_event_factory,
+        {"flow_id": f"{flow_a},{flow_b}", "reverse_order": str(reverse_order).lower()},
+    )
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_headers = response["multiValueHeaders"]
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.OK.value
+    assert get_merged_segments(response_body) == (
+        interleaved_flows[::-1] if reverse_order else interleaved_flows
+    )
+    assert response_headers["X-Paging-Timerange"] == ["[0:0_5:0)"]
+    assert response_headers["X-Paging-Reverse-Order"] == [str(reverse_order)]
+    assert "X-Paging-NextKey" not in response_headers
+
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize("reverse_order", [False, True])
+def test_GET_multi_flow_segments_continues_each_flow_from_page_token(
+    lambda_context,
+    api_event_factory,
+    api_flow_segments,
+    interleaved_flows,
+    reverse_order,
+):
+    """
+    Verifies that the page token holds where each flow continues from, drops
+    flows without segments left, and that following it returns every segment
+    once in timeline order.
+    """
+    # Arrange
+    flow_a, flow_b = interleaved_flows[0][0], interleaved_flows[1][0]
+    query_params = {
+        "flow_id": f"{flow_a},{flow_b}",
+        "limit": "2",
+        "reverse_order": str(reverse_order).lower(),
+    }
+    segments = []
+    tokens = []
+
+    # Act
+    while True:
+        response = api_flow_segments.lambda_handler(
+            create_segments_event(api_event_factory, query_params),
+            lambda_context,
+        )
+        assert response["statusCode"] == HTTPStatus.OK.value
+        segments.extend(get_merged_segments(json.loads(response["body"])))
+        next_key = response["multiValueHeaders"].get("X-Paging-NextKey")
+        if next_key is None:
+            break
+        tokens.append(decode_page(next_key[0]))
+        query_params["page"] = next_key[0]
+
+    # Assert
+    assert segments == (interleaved_flows[::-1] if reverse_order else interleaved_flows)
+    if reverse_order:
+        # [4:0_5:0) and [3:0_4:0), then [2:0_3:0) and [1:0_2:0) are taken
+        assert tokens == [
+            {flow_a: 4999999999, flow_b: 3999999999},
+            {flow_a: 2999999999},
+        ]
+    else:
+        # [0:0_1:0) and [1:0_2:0), then [2:0_3:0) and [3:0_4:0) are taken
+        assert tokens == [
+            {flow_a: 999999999, flow_b: 1999999999},
+            {flow_a: 2999999999},
+        ]
+
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize(
+    "page",
+    [
+        "not-base64!",
+        encode_page([1]),
+        encode_page({}),
+        encode_page({str(uuid.uuid4()): 1}),
+        encode_page({FLOW_ID: "1"}),
+    ],
+)
+def test_GET_multi_flow_segments_returns_400_when_page_token_is_invalid(
+    lambda_context, api_event_factory, api_flow_segments, page
+):
+    """
+    Verifies that a page token that is not base64 encoded JSON of a timerange_end
+    per requested flow returns 400 Bad Request.
+    """
+    # Arrange
+    event = create_segments_event(api_event_factory, {"flow_id": FLOW_ID, "page": page})
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.BAD_REQUEST.value
+    assert response_body.get("message") == "Invalid page parameter value"
+
+
+# pylint: disable=redefined-outer-name
+def test_POST_segments_list_returns_201_when_every_segment_is_stored(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, new_object
+):
+    """
+    Verifies that a list of valid segments returns 201 Created and stores each
+    segment with its bounds.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    body = [
+        {"object_id": new_object(flow_id), "timerange": timerange}
+        for timerange in ["[0:0_1:0)", "[1:0_2:0)"]
+    ]
+    event = api_event_factory("POST", f"/flows/{flow_id}/segments", json_body=body)
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    stored = api_flow_segments.segments_table.query(
+        KeyConditionExpression="flow_id = :flow_id",
+        ExpressionAttributeValues={":flow_id": flow_id},
+    )["Items"]
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.CREATED.value
+    assert [
+        (item["object_id"], item["timerange_start"], item["timerange_end"])
+        for item in stored
+    ] == [(segment["object_id"], *get_bounds(segment["timerange"])) for segment in body]
+
+
+# pylint: disable=redefined-outer-name
+def test_POST_segments_list_returns_200_with_each_failed_segment(
+    lambda_context,
+    api_event_factory,
+    api_flow_segments,
+    new_flow,
+    new_object,
+    put_segments,
+):
+    """
+    Verifies that a list of segments stores the valid segments and returns
+    200 OK with a FailedSegment for each rejected one: an overlap within the
+    request, an overlap with a stored segment, a timerange that cannot be stored
+    and an unknown Object.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    put_segments(flow_id, ["[10:0_11:0)"])
+    body = [
+        {"object_id": new_object(flow_id), "timerange": "[0:0_1:0)"},
+        {"object_id": new_object(flow_id), "timerange": "[0:5_1:5)"},
+        {"object_id": new_object(flow_id), "timerange": "[10:5_11:5)"},
+        {"object_id": new_object(flow_id), "timerange": "[20:0_"},
+        {"object_id": new_object(flow_id), "timerange": "[30:0_30:0)"},
+        {"object_id": str(uuid.uuid4()), "timerange": "[40:0_41:0)"},
+        {"object_id": new_object(flow_id), "timerange": "[1:0_2:0)"},
+    ]
+    event = api_event_factory("POST", f"/flows/{flow_id}/segments", json_body=body)
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+    stored = api_flow_segments.segments_table.query(
+        KeyConditionExpression="flow_id = :flow_id",
+        ExpressionAttributeValues={":flow_id": flow_id},
+    )["Items"]
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.OK.value
+    assert [
+        (failed["object_id"], failed["timerange"], failed["error"]["summary"])
+        for failed in response_body
+    ] == [
+        (
+            body[1]["object_id"],
+            "[0:5_1:5)",
+            "Bad request. The timerange of the segment MUST NOT overlap any other segment in the same Flow.",
+        ),
+        (
+            body[2]["object_id"],
+            "[10:5_11:5)",
+            "Bad request. The timerange of the segment MUST NOT overlap any other segment in the same Flow.",
+        ),
+        (
+            body[3]["object_id"],
+            "[20:0_",
+            "Bad request. The timerange of the segment MUST be bounded and not empty.",
+        ),
+        (
+            body[4]["object_id"],
+            "[30:0_30:0)",
+            "Bad request. The timerange of the segment MUST be bounded and not empty.",
+        ),
+        (
+            body[5]["object_id"],
+            "[40:0_41:0)",
+            "Bad request. The object id does not exist and no get_urls supplied.",
+        ),
+    ]
+    assert [item["timerange"] for item in stored] == [
+        "[0:0_1:0)",
+        "[1:0_2:0)",
+        "[10:0_11:0)",
+    ]
+
+
+# pylint: disable=redefined-outer-name
+def test_POST_segments_list_lets_later_segments_reuse_an_object_created_earlier(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, storage_table
+):
+    """
+    Verifies that an Object created by a segment supplying get_urls can be
+    re-used by a later segment of the same request, and that both references
+    are counted on its storage record.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    object_id = str(uuid.uuid4())
+    body = [
+        {
+            "object_id": object_id,
+            "timerange": "[0:0_1:0)",
+            "get_urls": [{"url": "https://example.com/media", "label": "example"}],
+        },
+        {"object_id": object_id, "timerange": "[1:0_2:0)"},
+    ]
+    event = api_event_factory("POST", f"/flows/{flow_id}/segments", json_body=body)
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    storage_item = storage_table.get_item(Key={"id": object_id})["Item"]
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.CREATED.value
+    assert storage_item["flow_id"] == flow_id
+    assert storage_item["ref_count"] == 2
+
+
+# pylint: disable=redefined-outer-name
+def test_POST_segment_returns_201_when_flow_update_fails(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, new_object
+):
+    """
+    Verifies that a failure to write the Flow's segments_updated once the
+    segment is stored is logged rather than failing the request.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    body = {"object_id": new_object(flow_id), "timerange": "[0:0_1:0)"}
+    event = api_event_factory("POST", f"/flows/{flow_id}/segments", json_body=body)
+
+    # Act
+    with patch(
+        "neptune.write_flow_segments_updated", side_effect=RuntimeError("Neptune")
+    ) as mock_write:
+        response = api_flow_segments.lambda_handler(event, lambda_context)
+    stored = api_flow_segments.segments_table.query(
+        KeyConditionExpression="flow_id = :flow_id",
+        ExpressionAttributeValues={":flow_id": flow_id},
+    )["Items"]
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.CREATED.value
+    mock_write.assert_called_once()
+    assert [item["timerange"] for item in stored] == ["[0:0_1:0)"]
+
+
+# pylint: disable=redefined-outer-name
+def test_GET_segments_coverage_returns_coverage_and_gaps(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, put_segments
+):
+    """
+    Verifies that the coverage endpoint merges contiguous segments and returns
+    the gaps between them within the requested timerange, with an ETag.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    put_segments(flow_id, ["[0:0_1:0)", "[1:0_2:0)", "[3:0_4:0)"])
+    event = api_event_factory(
+        "GET",
+        f"/flows/{flow_id}/segments/coverage",
+        query_params={"timerange": "[0:0_5:0)"},
+    )
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_headers = response["multiValueHeaders"]
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.OK.value
+    assert len(response_headers["ETag"]) == 1
+    assert response_body == {
+        "coverage": ["[0:0_2:0)", "[3:0_4:0)"],
+        "gaps": ["[2:0_3:0)", "[4:0_5:0)"],
+    }
+
+
+# pylint: disable=redefined-outer-name,unused-argument
+def test_GET_segments_coverage_returns_404_when_flow_does_not_exist(
+    lambda_context, api_event_factory, api_flow_segments, neptune_flows
+):
+    """
+    Verifies that the coverage of a Flow unknown to Neptune returns 404 Not Found.
+    """
+    # Arrange
+    event = api_event_factory("GET", f"/flows/{uuid.uuid4()}/segments/coverage")
+
+    # Act
+    response = api_flow_segments.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.NOT_FOUND.value
+    assert response_body.get("message") == "The requested flow does not exist."
+
+
+# pylint: disable=redefined-outer-name
+def test_GET_segments_coverage_is_recalculated_when_segments_version_changes(
+    lambda_context, api_event_factory, api_flow_segments, new_flow, put_segments
+):
+    """
+    Verifies that the cached coverage of a Flow is returned while its
+    segments_version is unchanged, and recalculated once it changes.
+    """
+    # Arrange
+    flow = new_flow()
+    flow_id = flow["flow"]["id"]
+    put_segments(flow_id, ["[0:0_1:0)"])
+    event = api_event_factory("GET", f"/flows/{flow_id}/segments/coverage")
+
+    # Act
+    first = json.loads(api_flow_segments.lambda_handler(event, lambda_context)["body"])
+    # Written without changing the segments_version, so the cache is not invalidated
+    put_segments(flow_id, ["[1:0_2:0)"])
+    cached = json.loads(api_flow_segments.lambda_handler(event, lambda_context)["body"])
+    flow["segments_version"] = str(uuid.uuid4())
+    recalculated = json.loads(
+        api_flow_segments.lambda_handler(event, lambda_context)["body"]
+    )
+
+    # Assert
+    assert first == {"coverage": ["[0:0_1:0)"], "gaps": []}
+    assert cached == first
+    assert recalculated == {"coverage": ["[0:0_2:0)"], "gaps": []}
+
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize("reverse_order", [False, True])
+def test_HEAD_segments_returns_same_paging_headers_as_GET(
+    lambda_context,
+    api_event_factory,
+    api_flow_segments,
+    new_flow,
+    put_segments,
+    reverse_order,
+):
+    """
+    Verifies that HEAD, which only reads the keys and timerange of the
+    segments, returns the same paging headers and Link as GET, without a body.
+    """
+    # Arrange
+    flow_id = new_flow()["flow"]["id"]
+    put_segments(flow_id, ["[0:0_1:0)", "[1:0_2:0)", "[2:0_3:0)"])
+    query_params = {"limit": "2", "reverse_order": str(reverse_order).lower()}
+    paging_headers = [
+        "X-Paging-Timerange",
+        "X-Paging-NextKey",
+        "X-Paging-Limit",
+        "Link",
+    ]
+
+    # Act
+    get_response = api_flow_segments.lambda_handler(
+        api_event_factory("GET", f"/flows/{flow_id}/segments", query_params),
+        lambda_context,
+    )
+    head_response = api_flow_segments.lambda_handler(
+        api_event_factory("HEAD", f"/flows/{flow_id}/segments", query_params),
+        lambda_context,
+    )
+    head_headers = head_response["multiValueHeaders"]
+
+    # Assert
+    assert head_response["statusCode"] == HTTPStatus.OK.value
+    assert json.loads(head_response["body"]) is None
+    assert head_headers["X-Paging-Timerange"] == [
+        "[1:0_3:0)" if reverse_order else "[0:0_2:0)"
+    ]
+    assert {header: head_headers.get(header) for header in paging_headers} == {
+        header: get_response["multiValueHeaders"].get(header)
+        for header in paging_headers
+    }
+    assert f"page={head_headers['X-Paging-NextKey'][0]}" in head_headers["Link"][0]
@@ -168,6 +168,62 @@ def test_GET_object_returns_404_when_object_id_does_not_exist(
     assert response_body.get("message") == "The requested Object does not exist."
 
 
+# pylint: disable=redefined-outer-name
+def test_GET_object_returns_404_when_ref_count_is_zero_and_object_is_unreferenced(
+    lambda_context, api_event_factory, storage_table, api_objects
+):
+    """
+    Verifies that a GET request for an Object whose storage record counts no
+    references, and which no segment references, returns 404 Not Found.
+    """
+    # Arrange
+    object_id = f"test-object-{uuid.uuid4()}"
+    storage_table.put_item(
+        Item={"id": object_id, "flow_id": str(uuid.uuid4()), "ref_count": 0}
+    )
+    event = api_event_factory("GET", f"/objects/{object_id}")
+
+    # Act
+    response = api_objects.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.NOT_FOUND.value
+    assert response_body.get("message") == "The requested Object does not exist."
+
+
+# pylint: disable=redefined-outer-name
+def test_GET_object_returns_200_when_ref_count_is_zero_but_object_is_referenced(
+    lambda_context, api_event_factory, segments_table, storage_table, api_objects
+):
+    """
+    Verifies that a reference count of zero left behind the segments does not
+    hide an Object a segment still references.
+    """
+    # Arrange
+    object_id = f"test-object-{uuid.uuid4()}"
+    flow_id = str(uuid.uuid4())
+    segments_table.put_item(
+        Item={
+            "flow_id": flow_id,
+            "timerange_end": 999999999,
+            "object_id": object_id,
+            "timerange": "[0:0_1:0)",
+        }
+    )
+    storage_table.put_item(Item={"id": object_id, "flow_id": flow_id, "ref_count": 0})
+    event = api_event_factory("GET", f"/objects/{object_id}")
+
+    # Act
+    response = api_objects.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.OK.value
+    assert response_body.get("id") == object_id
+    assert response_body.get("referenced_by_flows") == [flow_id]
+
+
 # pylint: disable=redefined-outer-name
 def test_GET_object_returns_200_with_complete_flow_references_when_object_exists(
     lambda_context, api_event_factory, test_object_id, multiple_flow_ids, api_objects
@@ -376,3 +432,37 @@ def test_GET_object_handles_invalid_page_parameter(
     # Assert
     assert response["statusCode"] == HTTPStatus.BAD_REQUEST.value
     assert response_body.get("message") == "Invalid page parameter value"
+
+
+# pylint: disable=redefined-outer-name
+def test_POST_object_instances_returns_404_when_storage_record_does_not_exist(
+    lambda_context, api_event_factory, segments_table, storage_table, api_objects
+):
+    """
+    Verifies that adding an instance to an Object without a storage record
+    returns 404 Not Found and does not create the record.
+    """
+    # Arrange
+    object_id = f"test-object-{uuid.uuid4()}"
+    segments_table.put_item(
+        Item={
+            "flow_id": str(uuid.uuid4()),
+            "timerange_end": 999999999,
+            "object_id": object_id,
+            "timerange": "[0:0_1:0)",
+        }
+    )
+    event = api_event_factory(
+        "POST",
+        f"/objects/{object_id}/instances",
+        json_body={"url": "https://example.com/media", "label": "example"},
+    )
+
+    # Act
+    response = api_objects.lambda_handler(event, lambda_context)
+    response_body = json.loads(response["body"])
+
+    # Assert
+    assert response["statusCode"] == HTTPStatus.NOT_FOUND.value
+    assert response_body.get("message") == "The Object does not exist."
+    assert "Item" not in storage_table.get_item(Key={"id": object_id})
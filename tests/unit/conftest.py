@@ -11,6 +11,7 @@ os.environ["BUCKET"] = "test-bucket"
 os.environ["BUCKET_REGION"] = "eu-west-1"
 os.environ["COGNITO_LAMBDA_NAME"] = "test-lambda-name"
 os.environ["NEPTUNE_ENDPOINT"] = "example.com"
+os.environ["POWERTOOLS_METRICS_NAMESPACE"] = "TAMS"
 os.environ["SEGMENTS_TABLE"] = "segments-table"
 os.environ["STORAGE_TABLE"] = "storage-table"
 os.environ["USER_POOL_ID"] = "123"
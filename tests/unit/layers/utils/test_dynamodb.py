@@ -1,7 +1,9 @@
 import base64
 import json
+import threading
+from collections import Counter
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
 import boto3
 import pytest
@@ -30,48 +32,60 @@ with patch("boto3.client"):
 
 
 class TestDynamoDB:
-    @patch("dynamodb.publish_event")
+    @patch("dynamodb.update_object_ref_counts")
+    @patch("dynamodb.EventBuffer")
     @patch("dynamodb.segments_table")
-    def test_delete_segment_items(self, mock_segments_table, mock_publish_event):
+    @patch("dynamodb.dynamodb")
+    def test_delete_segment_items(
+        self,
+        mock_dynamodb,
+        mock_segments_table,
+        mock_event_buffer,
+        mock_update_object_ref_counts,
+    ):
+        mock_segments_table.name = "segments-table"
         items = [
             {
                 "flow_id": "1",
-                "timerange_end": "1",
-                "object_id": "123",
-                "timerange": "123",
-            },
-            {
-                "flow_id": "2",
-                "timerange_end": "1",
-                "object_id": "456",
-                "timerange": "123",
-            },
-            {
-                "flow_id": "3",
-                "timerange_end": "2",
-                "object_id": "789",
+                "timerange_end": i,
+                "object_id": f"obj-{i}",
                 "timerange": "123",
-            },
+            }
+            for i in range(30)
         ]
-
-        delete_item_results = [{}, {"Attributes": []}, {"Attributes": []}]
-        mock_segments_table.delete_item.side_effect = delete_item_results
-        expected_success_count = len(
-            [n for n in delete_item_results if "Attributes" in n]
+        # Segment 3 was deleted concurrently by another request
+        mock_dynamodb.meta.client.delete_item.side_effect = lambda TableName, Key, **_: (
+            {}
+            if Key["timerange_end"] == 3
+            else {"Attributes": items[Key["timerange_end"]]}
         )
 
         object_ids = set()
         result = dynamodb.delete_segment_items(items, object_ids)
 
-        assert mock_segments_table.delete_item.call_count == len(items)
-        assert len(object_ids) == expected_success_count
-        assert mock_publish_event.call_count == expected_success_count
+        calls = mock_dynamodb.meta.client.delete_item.call_args_list
+        assert len(items) == len(calls)
+        assert all("ALL_OLD" == call.kwargs["ReturnValues"] for call in calls)
+        assert len(items) - 1 == len(object_ids)
+        assert ("obj-3", ()) not in object_ids
+        assert (
+            len(items) - 1
+            == mock_event_buffer.return_value.__enter__.return_value.add.call_count
+        )
+        # Only the references of the segments deleted here are subtracted
+        ref_counts, sign = (
+            mock_update_object_ref_counts.call_args.args[0],
+            mock_update_object_ref_counts.call_args.kwargs["sign"],
+        )
+        assert -1 == sign
+        assert "obj-3" not in ref_counts
+        assert len(items) - 1 == len(ref_counts)
         assert result is None
 
-    @patch("dynamodb.publish_event")
-    @patch("dynamodb.segments_table")
+    @patch("dynamodb.EventBuffer")
+    @patch("dynamodb.dynamodb")
     def test_delete_segment_items_captures_init_object(
-        self, mock_segments_table, mock_publish_event
+        self, mock_dynamodb, mock_event_buffer
     ):
         items = [
             {
@@ -84,20 +98,20 @@ class TestDynamoDB:
                 "timerange": "123",
             },
         ]
-        mock_segments_table.delete_item.return_value = {"Attributes": []}
+        mock_dynamodb.meta.client.delete_item.return_value = {"Attributes": items[0]}
 
         object_ids = set()
         dynamodb.delete_segment_items(items, object_ids)
 
         assert ("media-1", ("s-1",)) in object_ids
         assert ("init-1", ("s-init",)) in object_ids
-        assert 1 == mock_publish_event.call_count
+        assert 1 == mock_event_buffer.return_value.__enter__.return_value.add.call_count
 
     @patch("dynamodb.enhance_resources")
-    @patch("dynamodb.publish_event")
-    @patch("dynamodb.segments_table")
+    @patch("dynamodb.EventBuffer")
+    @patch("dynamodb.dynamodb")
     def test_delete_segment_items_uses_supplied_resources(
-        self, mock_segments_table, mock_publish_event, mock_enhance_resources
+        self, mock_dynamodb, mock_event_buffer, mock_enhance_resources
     ):
         """When resources are supplied (Flow being deleted), they are used
         verbatim for the flows/segments_deleted event and enhance_resources is
@@ -110,19 +124,22 @@ class TestDynamoDB:
                 "timerange": "123",
             },
         ]
-        mock_segments_table.delete_item.return_value = {"Attributes": []}
+        mock_dynamodb.meta.client.delete_item.return_value = {"Attributes": items[0]}
         resources = ["tams:flow:1", "tams:source:src-1"]
 
         dynamodb.delete_segment_items(items, set(), resources)
 
         assert 0 == mock_enhance_resources.call_count
-        assert resources == mock_publish_event.call_args[0][2]
+        assert (
+            resources
+            == mock_event_buffer.return_value.__enter__.return_value.add.call_args[0][2]
+        )
 
     @patch("dynamodb.enhance_resources")
-    @patch("dynamodb.publish_event")
-    @patch("dynamodb.segments_table")
+    @patch("dynamodb.EventBuffer")
+    @patch("dynamodb.dynamodb")
     def test_delete_segment_items_falls_back_to_enhance_resources(
-        self, mock_segments_table, mock_publish_event, mock_enhance_resources
+        self, mock_dynamodb, mock_event_buffer, mock_enhance_resources
     ):
         """When no resources are supplied (segment-only deletion, Flow still
         exists), resources are resolved live via enhance_resources."""
@@ -134,7 +151,7 @@ class TestDynamoDB:
                 "timerange": "123",
             },
         ]
-        mock_segments_table.delete_item.return_value = {"Attributes": []}
+        mock_dynamodb.meta.client.delete_item.return_value = {"Attributes": items[0]}
         mock_enhance_resources.return_value = ["tams:flow:1", "tams:source:src-1"]
 
         dynamodb.delete_segment_items(items, set())
@@ -142,20 +159,24 @@ class TestDynamoDB:
         assert 1 == mock_enhance_resources.call_count
         assert ["tams:flow:1"] == mock_enhance_resources.call_args[0][0]
 
-    @patch("dynamodb.segments_table")
-    def test_delete_segment_items_returns_exception(self, mock_segments_table):
+    @patch("dynamodb.EventBuffer")
+    @patch("dynamodb.dynamodb")
+    def test_delete_segment_items_returns_exception(
+        self, mock_dynamodb, mock_event_buffer
+    ):
         items = [
             {
                 "flow_id": "1",
-                "timerange_end": "1",
-                "object_id": "XXX",
+                "timerange_end": i,
+                "object_id": f"obj-{i}",
                 "timerange": "123",
             }
+            for i in range(30)
         ]
 
         error_code = "404"
         error_message = "help"
-        mock_segments_table.delete_item.side_effect = ClientError(
+        client_error = ClientError(
             {
                 "Error": {
                     "Code": error_code,
@@ -166,11 +187,25 @@ class TestDynamoDB:
             "delete_item",
         )
 
-        result = dynamodb.delete_segment_items(items, set())
+        def delete_item(TableName, Key, ReturnValues):
+            if Key["timerange_end"] % 2:
+                raise client_error
+            return {"Attributes": items[Key["timerange_end"]]}
+
+        mock_dynamodb.meta.client.delete_item.side_effect = delete_item
+
+        object_ids = set()
+        result = dynamodb.delete_segment_items(items, object_ids)
 
         assert result is not None
         assert result["type"] == error_code
         assert result["summary"] == error_message
+        # Only the items that were deleted are reported as deleted
+        assert len(items) // 2 == len(object_ids)
+        assert (
+            len(object_ids)
+            == mock_event_buffer.return_value.__enter__.return_value.add.call_count
+        )
 
     @patch("dynamodb.segments_table")
     def test_get_flow_timerange_with_first_and_last(self, mock_segments_table):
@@ -238,6 +273,128 @@ class TestDynamoDB:
         result = dynamodb.get_flow_timerange("123")
         assert last.to_sec_nsec_range() == result
 
+    @patch("dynamodb.service_table")
+    def test_extend_flow_timerange_summary(self, mock_service_table):
+        items = [
+            {"timerange": "[1:0_2:0)", "timerange_end": 1_999_999_999},
+            {"timerange": "[0:0_1:0)", "timerange_end": 999_999_999},
+            {"timerange": "[2:0_3:0)", "timerange_end": 2_999_999_999},
+        ]
+
+        dynamodb.extend_flow_timerange_summary("flow-1", items)
+
+        assert 2 == mock_service_table.update_item.call_count
+        first_args, last_args = [
+            call[1] for call in mock_service_table.update_item.call_args_list
+        ]
+        assert {
+            "record_type": constants.FLOW_TIMERANGE_RECORD_TYPE,
+            "id": "flow-1",
+        } == first_args["Key"]
+        assert "first_end >" in first_args["ConditionExpression"]
+        assert "[0:0_1:0)" == first_args["ExpressionAttributeValues"][":timerange"]
+        assert "last_end <" in last_args["ConditionExpression"]
+        assert "[2:0_3:0)" == last_args["ExpressionAttributeValues"][":timerange"]
+
+    @patch("dynamodb.service_table")
+    def test_extend_flow_timerange_summary_ignores_condition_failure(
+        self, mock_service_table
+    ):
+        mock_service_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+            "UpdateItem",
+        )
+
+        dynamodb.extend_flow_timerange_summary(
+            "flow-1", [{"timerange": "[0:0_1:0)", "timerange_end": 999_999_999}]
+        )
+
+        assert 2 == mock_service_table.update_item.call_count
+
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.segments_table")
+    @patch("dynamodb.service_table")
+    def test_get_flow_timeranges_uses_summaries(
+        self, mock_service_table, mock_segments_table, mock_dynamodb
+    ):
+        mock_service_table.name = "service-table"
+        refreshed_at = int(datetime.now().timestamp())
+        mock_dynamodb.batch_get_item.return_value = {
+            "Responses": {
+                "service-table": [
+                    {
+                        "id": "flow-1",
+                        "first_timerange": "[0:0_1:0)",
+                        "last_timerange": "[9:0_10:0)",
+                        "refreshed_at": refreshed_at,
+                    },
+                    {"id": "flow-2", "refreshed_at": refreshed_at},
+                ]
+            }
+        }
+
+        result = dynamodb.get_flow_timeranges(["flow-1", "flow-2"])
+
+        assert {"flow-1": "[0:0_10:0)", "flow-2": "()"} == result
+        assert 1 == mock_dynamodb.batch_get_item.call_count
+        assert 0 == mock_segments_table.query.call_count
+
+    @pytest.mark.parametrize(
+        "summary",
+        [
+            None,  # No record yet
+            {"id": "flow-1", "last_timerange": "[9:0_10:0)", "last_end": 1},
+            {
+                "id": "flow-1",
+                "first_timerange": "[0:0_1:0)",
+                "last_timerange": "[9:0_10:0)",
+                "refreshed_at": 1,
+            },
+        ],
+    )
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.segments_table")
+    @patch("dynamodb.service_table")
+    def test_get_flow_timeranges_refreshes_summary(
+        self, mock_service_table, mock_segments_table, mock_dynamodb, summary
+    ):
+        mock_service_table.name = "service-table"
+        mock_dynamodb.batch_get_item.return_value = {
+            "Responses": {"service-table": [summary] if summary else []}
+        }
+        mock_segments_table.query.side_effect = [
+            {"Items": [{"timerange": "[1:0_2:0)", "timerange_end": 1_999_999_999}]},
+            {"Items": [{"timerange": "[5:0_6:0)", "timerange_end": 5_999_999_999}]},
+        ]
+
+        result = dynamodb.get_flow_timeranges(["flow-1"])
+
+        assert {"flow-1": "[1:0_6:0)"} == result
+        assert 2 == mock_segments_table.query.call_count
+        # Record recreated from the segments and marked as refreshed
+        assert 1 == mock_service_table.delete_item.call_count
+        assert 3 == mock_service_table.update_item.call_count
+        assert (
+            "refreshed_at"
+            in mock_service_table.update_item.call_args_list[-1][1]["UpdateExpression"]
+        )
+
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.segments_table")
+    @patch("dynamodb.service_table")
+    def test_get_flow_timeranges_refresh_empty_flow(
+        self, mock_service_table, mock_segments_table, mock_dynamodb
+    ):
+        mock_service_table.name = "service-table"
+        mock_dynamodb.batch_get_item.return_value = {"Responses": {}}
+        mock_segments_table.query.return_value = {"Items": []}
+
+        result = dynamodb.get_flow_timeranges(["flow-1"])
+
+        assert {"flow-1": "()"} == result
+        # Only the refreshed_at marker is written for an empty flow
+        assert 1 == mock_service_table.update_item.call_count
+
     @pytest.mark.parametrize(
         "boundary, inclusivity, conditionType",
         [
@@ -363,15 +520,15 @@ class TestDynamoDB:
             sorted(actual_values.values())
         )
 
-    @patch("dynamodb.segments_table")
-    def test_get_key_and_args_with_timerange(self, mock_segments_table):
+    @patch("dynamodb.query_segments")
+    def test_get_key_and_args_with_timerange(self, mock_query_segments):
         flow_id = "test-flow"
 
         now = datetime.now()
         end_ns = Timestamp.from_datetime(now + timedelta(hours=2)).to_nanosec()
         # The both-bounds path probes get_exact_timerange_end for the upper key
         # bound; return an exact-match so upper == end_ns.
-        mock_segments_table.query.return_value = {"Items": [{"timerange_end": end_ns}]}
+        mock_query_segments.return_value = {"Items": [{"timerange_end": end_ns}]}
         time_range = TimeRange(
             start=Timestamp.from_datetime(now + timedelta(hours=1)),
             end=Timestamp.from_datetime(now + timedelta(hours=2)),
@@ -394,8 +551,8 @@ class TestDynamoDB:
 
         assert "FilterExpression" not in result
 
-    @patch("dynamodb.segments_table")
-    def test_get_key_and_args_both_bounds_bounds_key_window(self, mock_segments_table):
+    @patch("dynamodb.query_segments")
+    def test_get_key_and_args_both_bounds_bounds_key_window(self, mock_query_segments):
         """A timerange with both a start and an end bounds the sort key on both
         sides (BETWEEN) so pagination cannot scan past the requested range, and
         retains the end boundary as a FilterExpression."""
@@ -404,7 +561,7 @@ class TestDynamoDB:
         end_ns = 2 * 3600 * 1_000_000_000  # 2h
         # get_exact_timerange_end probes the first segment with
         # timerange_end >= end_ns; return an exact-match so upper == end_ns.
-        mock_segments_table.query.return_value = {"Items": [{"timerange_end": end_ns}]}
+        mock_query_segments.return_value = {"Items": [{"timerange_end": end_ns}]}
         time_range = TimeRange(
             start=Timestamp.from_nanosec(start_ns),
             end=Timestamp.from_nanosec(end_ns),
@@ -427,14 +584,14 @@ class TestDynamoDB:
         assert set(filter_names.values()) == {"timerange_start"}
         assert "IndexName" not in result
 
-    @patch("dynamodb.segments_table")
-    def test_get_key_and_args_both_bounds_exclusive_start(self, mock_segments_table):
+    @patch("dynamodb.query_segments")
+    def test_get_key_and_args_both_bounds_exclusive_start(self, mock_query_segments):
         """An exclusive start boundary is folded into the BETWEEN lower bound as
         start + 1ns, mirroring how timerange_start is stored on write."""
         flow_id = "test-flow"
         start_ns = 1 * 3600 * 1_000_000_000
         end_ns = 2 * 3600 * 1_000_000_000
-        mock_segments_table.query.return_value = {"Items": [{"timerange_end": end_ns}]}
+        mock_query_segments.return_value = {"Items": [{"timerange_end": end_ns}]}
         time_range = TimeRange(
             start=Timestamp.from_nanosec(start_ns),
             end=Timestamp.from_nanosec(end_ns),
@@ -447,9 +604,9 @@ class TestDynamoDB:
         _, _, key_values = parse_dynamo_expression(result["KeyConditionExpression"])
         assert (start_ns + 1) in key_values.values()
 
-    @patch("dynamodb.segments_table")
+    @patch("dynamodb.query_segments")
     def test_get_key_and_args_empty_range_clamps_between_bounds(
-        self, mock_segments_table
+        self, mock_query_segments
     ):
         """An empty range (e.g. "[5:0_5:0)") normalises to () with start == end ==
         0 yet is not eternity, so it reaches the both-bounds branch. The
@@ -461,7 +618,7 @@ class TestDynamoDB:
         # An empty flow: get_exact_timerange_end finds no segment and echoes the
         # requested end back. The empty range normalises to end == 0, so the raw
         # upper is 0 while the folded lower is 1.
-        mock_segments_table.query.return_value = {"Items": []}
+        mock_query_segments.return_value = {"Items": []}
         time_range = TimeRange(
             start=Timestamp.from_nanosec(instant_ns),
             end=Timestamp.from_nanosec(instant_ns),
@@ -478,9 +635,9 @@ class TestDynamoDB:
         assert len(between_values) == 2
         assert between_values[0] == between_values[1] == 1
 
-    @patch("dynamodb.segments_table")
+    @patch("dynamodb.query_segments")
     def test_get_key_and_args_object_id_and_timerange_ands_filters(
-        self, mock_segments_table
+        self, mock_query_segments
     ):
         """object_id + a both-bounded timerange applies BOTH timerange
         conditions as a single ANDed FilterExpression on the object-id-index
@@ -507,7 +664,7 @@ class TestDynamoDB:
         _, filter_names, _ = parse_dynamo_expression(result["FilterExpression"])
         assert set(filter_names.values()) == {"timerange_start", "timerange_end"}
         # get_exact_timerange_end must NOT be called on the object_id path.
-        assert not mock_segments_table.query.called
+        assert not mock_query_segments.called
 
     @patch("dynamodb.segments_table")
     def test_get_key_and_args_object_id_and_start_only_timerange(
@@ -758,8 +915,8 @@ class TestDynamoDB:
         assert mock_merge_delete_request.called
         assert mock_merge_delete_request.call_args[0][0]["status"] == "error"
 
-    @patch("dynamodb.segments_table")
-    def test_get_exact_timerange_end_first_item_differs(self, mock_segments_table):
+    @patch("dynamodb.query_segments")
+    def test_get_exact_timerange_end_first_item_differs(self, mock_query_segments):
         flow_id = "test-flow"
         time_range_end = 789
 
@@ -771,14 +928,14 @@ class TestDynamoDB:
             ]
         }
 
-        mock_segments_table.query.return_value = return_items
+        mock_query_segments.return_value = return_items
 
         result = dynamodb.get_exact_timerange_end(flow_id, time_range_end)
 
         assert result == first_item_timerange_end
 
-    @patch("dynamodb.segments_table")
-    def test_get_exact_timerange_end_first_item_matches(self, mock_segments_table):
+    @patch("dynamodb.query_segments")
+    def test_get_exact_timerange_end_first_item_matches(self, mock_query_segments):
         flow_id = "test-flow"
         time_range_end = 789
 
@@ -789,7 +946,7 @@ class TestDynamoDB:
             ]
         }
 
-        mock_segments_table.query.return_value = return_items
+        mock_query_segments.return_value = return_items
 
         result = dynamodb.get_exact_timerange_end(flow_id, time_range_end)
 
@@ -1148,6 +1305,121 @@ class TestDynamoDB:
         assert result["valid"]
         assert result["init_storage_id"] == "init-sid"
 
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.storage_table")
+    def test_batch_get_storage_items(self, mock_storage_table, mock_dynamodb):
+        mock_storage_table.name = "storage-table"
+        object_ids = [f"obj-{i:03}" for i in range(150)]
+        mock_dynamodb.batch_get_item.side_effect = [
+            {"Responses": {"storage-table": [{"id": "obj-000"}]}},
+            {"Responses": {"storage-table": [{"id": "obj-149"}]}},
+        ]
+
+        result = dynamodb.batch_get_storage_items([*object_ids, "obj-000"])
+
+        # Keys are de-duplicated and requested in batches of 100
+        assert 2 == mock_dynamodb.batch_get_item.call_count
+        first_keys = mock_dynamodb.batch_get_item.call_args_list[0][1]["RequestItems"][
+            "storage-table"
+        ]["Keys"]
+        assert constants.BATCH_GET_ITEM_LIMIT == len(first_keys)
+        assert 0 == mock_storage_table.get_item.call_count
+        assert set(object_ids) == set(result)
+        assert {"id": "obj-000"} == result["obj-000"]
+        assert result["obj-001"] is None
+
+    @patch("dynamodb.backoff")
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.storage_table")
+    def test_batch_get_storage_items_unprocessed_keys(
+        self, mock_storage_table, mock_dynamodb, mock_backoff
+    ):
+        mock_storage_table.name = "storage-table"
+        unprocessed = {"storage-table": {"Keys": [{"id": "b"}]}}
+        mock_dynamodb.batch_get_item.return_value = {
+            "Responses": {"storage-table": [{"id": "a"}]},
+            "UnprocessedKeys": unprocessed,
+        }
+        mock_storage_table.get_item.return_value = {"Item": {"id": "b"}}
+
+        result = dynamodb.batch_get_storage_items(["a", "b"])
+
+        # Retried up to the limit, backing off before each retry, then fetched individually
+        assert constants.DDB_MAX_RETRIES == mock_dynamodb.batch_get_item.call_count
+        assert [
+            call(attempt) for attempt in range(1, constants.DDB_MAX_RETRIES)
+        ] == mock_backoff.call_args_list
+        mock_storage_table.get_item.assert_called_once_with(Key={"id": "b"})
+        assert {"a": {"id": "a"}, "b": {"id": "b"}} == result
+
+    @patch("dynamodb.backoff")
+    @patch("dynamodb.dynamodb")
+    def test_batch_get_items_retries_unprocessed_keys(
+        self, mock_dynamodb, mock_backoff
+    ):
+        mock_dynamodb.batch_get_item.side_effect = [
+            {
+                "Responses": {"table": [{"id": "a"}]},
+                "UnprocessedKeys": {"table": {"Keys": [{"id": "b"}]}},
+            },
+            {"Responses": {"table": [{"id": "b"}]}},
+        ]
+
+        items, unprocessed_keys = dynamodb.batch_get_items(
+            "table", {"Keys": [{"id": "a"}, {"id": "b"}]}
+        )
+
+        assert [{"id": "a"}, {"id": "b"}] == items
+        assert [] == unprocessed_keys
+        assert {"table": {"Keys": [{"id": "b"}]}} == (
+            mock_dynamodb.batch_get_item.call_args.kwargs["RequestItems"]
+        )
+        mock_backoff.assert_called_once_with(1)
+
+    @patch("dynamodb.storage_table")
+    def test_validate_object_id_uses_storage_items(self, mock_storage_table):
+        segment = Flowsegmentpost(
+            object_id="abc", timerange="[0:0_1:0)", init_object_id="init-123"
+        )
+        storage_items = {
+            "abc": {"id": "abc", "flow_id": "123", "expire_at": 12345},
+            "init-123": {"id": "init-123", "is_init_object": True},
+        }
+
+        result = dynamodb.validate_object_id(segment, "123", storage_items)
+
+        assert 0 == mock_storage_table.get_item.call_count
+        assert result["valid"]
+        assert "init-123" == result["init_object_id"]
+
+    @patch("dynamodb.storage_table")
+    def test_validate_object_id_storage_items_missing_object(self, mock_storage_table):
+        segment = Flowsegmentpost(object_id="abc", timerange="[0:0_1:0)")
+
+        result = dynamodb.validate_object_id(segment, "123", {"abc": None})
+
+        assert 0 == mock_storage_table.get_item.call_count
+        assert not result["valid"]
+
+    def test_apply_object_claim(self):
+        storage_items = {
+            "abc": {"id": "abc", "flow_id": "123", "expire_at": 12345},
+            "new": None,
+        }
+        segment = Flowsegmentpost(object_id="abc", timerange="[0:0_1:0)")
+        with patch("dynamodb.storage_table"):
+            validation = dynamodb.validate_object_id(segment, "123", storage_items)
+
+        dynamodb.apply_object_claim(validation["claim"], storage_items)
+        dynamodb.apply_object_claim(
+            [{"op": "put", "item": {"id": "new", "flow_id": "123"}}], storage_items
+        )
+
+        # The first use is consumed so the Object is now treated as re-used
+        assert "expire_at" not in storage_items["abc"]
+        assert "[0:0_1:0)" == storage_items["abc"]["timerange"]
+        assert {"id": "new", "flow_id": "123"} == storage_items["new"]
+
     @patch("dynamodb.segments_table")
     @patch("dynamodb.storage_table")
     def test_delete_flow_storage_record_delete(
@@ -1195,6 +1467,339 @@ class TestDynamoDB:
         assert 0 == mock_storage_table.delete_item.call_count
         assert 1 == mock_storage_table.update_item.call_count
 
+    @patch("dynamodb.segments_table")
+    @patch("dynamodb.storage_table")
+    def test_delete_flow_storage_record_uses_ref_count(
+        self, mock_storage_table, mock_segments_table
+    ):
+        mock_storage_table.get_item.return_value = {
+            "Item": {"id": "abc", "ref_count": 0}
+        }
+        mock_segments_table.query.return_value = {"Count": 0}
+
+        dynamodb.delete_flow_storage_record("abc", "123")
+
+        # A zero count is only confirmed against the segments, never counted
+        assert all(
+            1 == call.kwargs["Limit"]
+            for call in mock_segments_table.query.call_args_list
+        )
+        assert 1 == mock_storage_table.delete_item.call_count
+        assert "ConditionExpression" in mock_storage_table.delete_item.call_args.kwargs
+        assert 0 == mock_storage_table.update_item.call_count
+
+    @patch("dynamodb.segments_table")
+    @patch("dynamodb.storage_table")
+    def test_delete_flow_storage_record_referenced_since_read(
+        self, mock_storage_table, mock_segments_table
+    ):
+        mock_storage_table.get_item.return_value = {
+            "Item": {"id": "abc", "ref_count": 0}
+        }
+        mock_storage_table.delete_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+            "DeleteItem",
+        )
+        mock_segments_table.query.return_value = {"Count": 0}
+
+        dynamodb.delete_flow_storage_record("abc", "123")
+
+        assert 1 == mock_storage_table.update_item.call_count
+
+    @patch("dynamodb.segments_table")
+    @patch("dynamodb.storage_table")
+    def test_delete_flow_storage_record_zero_count_still_referenced(
+        self, mock_storage_table, mock_segments_table
+    ):
+        """A count of zero contradicted by a live segment reference must NOT delete the record."""
+        mock_storage_table.get_item.return_value = {
+            "Item": {"id": "abc", "ref_count": 0}
+        }
+        mock_segments_table.query.return_value = {"Count": 1}
+
+        dynamodb.delete_flow_storage_record("abc", "123")
+
+        assert 0 == mock_storage_table.delete_item.call_count
+        assert 1 == mock_storage_table.update_item.call_count
+
+    def test_get_object_ref_counts(self):
+        ref_counts = dynamodb.get_object_ref_counts(
+            [
+                {"object_id": "a", "storage_ids": ["s1"]},
+                {
+                    "object_id": "a",
+                    "storage_ids": ["s1", "s2"],
+                    "init_object_id": "i",
+                    "init_storage_ids": ["s1"],
+                },
+                {"object_id": "b"},
+            ]
+        )
+
+        assert {None: 2, "s1": 2, "s2": 1} == ref_counts["a"]
+        assert {None: 1, "s1": 1} == ref_counts["i"]
+        assert {None: 1} == ref_counts["b"]
+
+    @patch("dynamodb.storage_table")
+    def test_update_object_ref_counts(self, mock_storage_table):
+        dynamodb.update_object_ref_counts(
+            {"a": Counter({None: 2, "s1": 1, "s2": 0})}, sign=-1
+        )
+
+        kwargs = mock_storage_table.update_item.call_args.kwargs
+        names = kwargs["ExpressionAttributeNames"]
+        values = kwargs["ExpressionAttributeValues"]
+        assert {"id": "a"} == kwargs["Key"]
+        assert kwargs["UpdateExpression"].startswith("ADD ")
+        assert {"ref_count": -2, "ref_count_s1": -1} == {
+            names[name]: values[f":{name[1:]}"] for name in names
+        }
+
+    @patch("dynamodb.storage_table")
+    def test_update_object_ref_counts_ignores_uncounted_objects(
+        self, mock_storage_table
+    ):
+        mock_storage_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+            "UpdateItem",
+        )
+
+        dynamodb.update_object_ref_counts(
+            {"a": Counter({None: 1}), "b": Counter({None: 1})}
+        )
+
+        assert 2 == mock_storage_table.update_item.call_count
+
+    @pytest.mark.parametrize(
+        "item,expected",
+        [
+            (None, (None, None)),
+            ({"id": "a"}, (None, None)),
+            ({"id": "a", "ref_count": 0}, (0, set())),
+            (
+                {"id": "a", "ref_count": 2, "ref_count_s1": 2, "ref_count_s2": 0},
+                (2, {"s1"}),
+            ),
+            (
+                {
+                    "id": "a",
+                    "ref_count": 2,
+                    "ref_count_s1": 2,
+                    "instance_storage_ids": ["s2"],
+                    "instance_get_urls": [],
+                },
+                (2, {"s2"}),
+            ),
+            ({"id": "a", "instance_storage_ids": ["s2"]}, (None, {"s2"})),
+        ],
+    )
+    @patch("dynamodb.is_object_referenced")
+    @patch("dynamodb.storage_table")
+    def test_get_object_references(
+        self, mock_storage_table, mock_is_object_referenced, item, expected
+    ):
+        mock_storage_table.get_item.return_value = (
+            {} if item is None else {"Item": item}
+        )
+        mock_is_object_referenced.return_value = False
+
+        assert expected == dynamodb.get_object_references("a")
+
+    @patch("dynamodb.is_object_referenced")
+    @patch("dynamodb.storage_table")
+    def test_get_object_references_ignores_contradicted_zero_count(
+        self, mock_storage_table, mock_is_object_referenced
+    ):
+        mock_storage_table.get_item.return_value = {
+            "Item": {"id": "a", "ref_count": 0, "ref_count_s1": 0}
+        }
+        mock_is_object_referenced.return_value = True
+
+        assert (None, None) == dynamodb.get_object_references("a")
+
+    @pytest.mark.parametrize(
+        "counts,expected",
+        [([0, 0], False), ([1], True), ([0, 1], True)],
+    )
+    @patch("dynamodb.segments_table")
+    def test_is_object_referenced(self, mock_segments_table, counts, expected):
+        mock_segments_table.query.side_effect = [{"Count": c} for c in counts]
+
+        assert expected == dynamodb.is_object_referenced("a")
+        assert len(counts) == mock_segments_table.query.call_count
+
+    @pytest.mark.parametrize(
+        "init_object,index_name",
+        [(False, "object-id-index"), (True, "init-object-id-index")],
+    )
+    @patch("dynamodb.segments_table")
+    def test_query_object_flow_segments(
+        self, mock_segments_table, init_object, index_name
+    ):
+        mock_segments_table.query.side_effect = [
+            {"Items": [{"flow_id": "f1", "storage_ids": ["s1"]}]},
+            {"Items": [{"flow_id": "f2", "storage_ids": ["s2"]}]},
+            {"Items": []},
+        ]
+
+        items = dynamodb.query_object_flow_segments("a", init_object)
+
+        calls = mock_segments_table.query.call_args_list
+        assert ["f1", "f2"] == [item["flow_id"] for item in items]
+        assert 3 == len(calls)
+        assert all(1 == c.kwargs["Limit"] for c in calls)
+        assert all(index_name == c.kwargs["IndexName"] for c in calls)
+        # Each query skips the segments of the Flow found by the previous one
+        expression = builder.build_expression(
+            calls[2].kwargs["KeyConditionExpression"], is_key_condition=True
+        )
+        assert ["a", "f2"] == sorted(expression.attribute_value_placeholders.values())
+        assert "flow_id" in expression.attribute_name_placeholders.values()
+        assert " > " in expression.condition_expression
+
+    def test_seed_object_instances(self):
+        get_url = {"label": "l", "url": "u"}
+
+        assert {
+            "storage_ids": ["s1", "s2"],
+            "get_urls": [get_url],
+        } == dynamodb.seed_object_instances(
+            [
+                {"init_storage_ids": ["s1"], "init_get_urls": [get_url]},
+                {"init_storage_ids": ["s1", "s2"], "init_get_urls": [get_url]},
+                {},
+            ],
+            "init_storage_ids",
+            "init_get_urls",
+        )
+
+    @patch("dynamodb.batch_get_storage_items")
+    def test_get_object_instances(self, mock_batch_get_storage_items):
+        mock_batch_get_storage_items.return_value = {
+            "a": {"id": "a", "instance_storage_ids": ["s1"]},
+            "b": {"id": "b"},
+            "c": None,
+        }
+
+        first = dynamodb.get_object_instances(["a", "b", "c", "a"])
+        second = dynamodb.get_object_instances(["a", "b", "c"])
+
+        assert {
+            "a": {"storage_ids": ["s1"], "get_urls": []},
+            "b": None,
+            "c": None,
+        } == first
+        assert first == second
+        # Instances are read afresh for every request, as they may change under the same ETag
+        assert 2 == mock_batch_get_storage_items.call_count
+
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.storage_table")
+    def test_get_object_instances_more_than_batch_limit(
+        self, mock_storage_table, mock_dynamodb
+    ):
+        mock_storage_table.name = "storage-table"
+        object_ids = [f"obj-{i:03}" for i in range(250)]
+        mock_dynamodb.batch_get_item.side_effect = lambda RequestItems: {
+            "Responses": {
+                "storage-table": [
+                    {"id": key["id"], "instance_storage_ids": [key["id"]]}
+                    for key in RequestItems["storage-table"]["Keys"]
+                ]
+            }
+        }
+
+        result = dynamodb.get_object_instances(object_ids)
+
+        # Requested in batches within the BatchGetItem limit
+        assert 3 == mock_dynamodb.batch_get_item.call_count
+        assert all(
+            len(kwargs["RequestItems"]["storage-table"]["Keys"])
+            <= constants.BATCH_GET_ITEM_LIMIT
+            for _, kwargs in mock_dynamodb.batch_get_item.call_args_list
+        )
+        assert {
+            object_id: {"storage_ids": [object_id], "get_urls": []}
+            for object_id in object_ids
+        } == result
+
+    @patch("dynamodb.storage_table")
+    def test_update_object_instances_seeds_record(self, mock_storage_table):
+        mock_storage_table.get_item.return_value = {"Item": {"id": "a"}}
+        seed = {"storage_ids": ["s1"], "get_urls": [{"label": "l", "url": "u"}]}
+
+        instances = dynamodb.update_object_instances("a", seed, add_storage_id="s2")
+
+        kwargs = mock_storage_table.update_item.call_args.kwargs
+        assert {"storage_ids": ["s1", "s2"], "get_urls": seed["get_urls"]} == instances
+        assert ["s1", "s2"] == kwargs["ExpressionAttributeValues"][":storage_ids"]
+        condition_expression = builder.build_expression(
+            kwargs["ConditionExpression"]
+        ).condition_expression
+        assert "attribute_not_exists" in condition_expression
+        # The update never creates the storage record
+        assert "attribute_exists" in condition_expression
+        # The seed is not modified
+        assert ["s1"] == seed["storage_ids"]
+
+    @patch("dynamodb.storage_table")
+    def test_update_object_instances_without_record(self, mock_storage_table):
+        mock_storage_table.get_item.return_value = {}
+
+        with pytest.raises(ValueError):
+            dynamodb.update_object_instances(
+                "a", {"storage_ids": ["s1"], "get_urls": []}, add_storage_id="s2"
+            )
+
+        mock_storage_table.update_item.assert_not_called()
+
+    @patch("dynamodb.storage_table")
+    def test_update_object_instances_record_deleted_before_update(
+        self, mock_storage_table
+    ):
+        mock_storage_table.get_item.side_effect = [{"Item": {"id": "a"}}, {}]
+        mock_storage_table.update_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+            "UpdateItem",
+        )
+
+        with pytest.raises(ValueError):
+            dynamodb.update_object_instances(
+                "a", {"storage_ids": ["s1"], "get_urls": []}, add_storage_id="s2"
+            )
+
+        assert 1 == mock_storage_table.update_item.call_count
+
+    @patch("dynamodb.storage_table")
+    def test_update_object_instances_retries_on_conflict(self, mock_storage_table):
+        mock_storage_table.get_item.side_effect = [
+            {"Item": {"id": "a"}},
+            {
+                "Item": {
+                    "id": "a",
+                    "instance_storage_ids": ["s1", "s2"],
+                    "instance_get_urls": [{"label": "l", "url": "u"}],
+                }
+            },
+        ]
+        mock_storage_table.update_item.side_effect = [
+            ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+                "UpdateItem",
+            ),
+            {},
+        ]
+
+        instances = dynamodb.update_object_instances(
+            "a",
+            {"storage_ids": ["s1"], "get_urls": []},
+            remove_storage_id="s1",
+            remove_label="l",
+        )
+
+        assert {"storage_ids": ["s2"], "get_urls": []} == instances
+        assert 2 == mock_storage_table.update_item.call_count
+
     def test_decode_and_validate_page_valid(self):
         """Test decode_and_validate_page with valid base64 encoded pagination key"""
         object_id = "test-object-123"
@@ -1414,3 +2019,446 @@ class TestDynamoDB:
 
         assert len(items) == 12
         assert mock_segments_table.query.call_count == 3
+
+    @patch("dynamodb.time")
+    @patch("dynamodb.service_table")
+    def test_storage_backend_registry(self, mock_service_table, mock_time):
+        mock_time.time.return_value = 1000
+        mock_service_table.get_item.return_value = {"Item": {"name": "store"}}
+        mock_service_table.query.return_value = {
+            "Items": [
+                {
+                    "id": "default-id",
+                    "bucket_name": "default-bucket",
+                    "region": "eu-west-1",
+                    "store_type": "http_object_store",
+                    "default_storage": True,
+                },
+                {
+                    "id": "other-id",
+                    "bucket_name": "other-bucket",
+                    "region": "eu-west-2",
+                    "store_type": "http_object_store",
+                },
+            ]
+        }
+        registry = dynamodb.StorageBackendRegistry(ttl=60)
+
+        registry.get()
+
+        assert "store" == registry.store_name
+        assert "default-id" == registry.default["id"]
+        assert {"default-id", "other-id"} == set(registry.by_id)
+        assert [registry.by_id["other-id"]] == registry.by_label[
+            "aws.eu-west-2:s3.presigned:store"
+        ]
+        assert (
+            "https://other-bucket.s3.eu-west-2.amazonaws.com/"
+            == registry.url_prefixes["other-id"]
+        )
+        assert {
+            "region": "eu-west-2",
+            "store_type": "http_object_store",
+        } == registry.verbose_storage["other-id"]
+
+    @patch("dynamodb.time")
+    @patch("dynamodb.service_table")
+    def test_storage_backend_registry_ttl(self, mock_service_table, mock_time):
+        mock_service_table.get_item.return_value = {}
+        mock_service_table.query.return_value = {"Items": []}
+        registry = dynamodb.StorageBackendRegistry(ttl=60)
+
+        mock_time.time.return_value = 1000
+        registry.get()
+        mock_time.time.return_value = 1059
+        registry.get()
+        assert 1 == mock_service_table.query.call_count
+
+        mock_time.time.return_value = 1060
+        registry.get()
+        assert 2 == mock_service_table.query.call_count
+        assert "tams" == registry.store_name
+
+    @patch("dynamodb.storage_backend_registry")
+    def test_get_storage_backend_refreshes_unknown_id(self, mock_registry):
+        mock_registry.get.return_value = mock_registry
+        mock_registry.by_id = {}
+
+        def refresh():
+            mock_registry.by_id = {"new-id": {"id": "new-id"}}
+
+        mock_registry.refresh.side_effect = refresh
+
+        result = dynamodb.get_storage_backend("new-id")
+
+        assert {"id": "new-id"} == result
+        mock_registry.refresh.assert_called_once()
+
+    @patch("dynamodb.storage_backend_registry")
+    def test_get_storage_backend_invalid_id(self, mock_registry):
+        mock_registry.get.return_value = mock_registry
+        mock_registry.by_id = {}
+
+        with pytest.raises(BadRequestError):
+            dynamodb.get_storage_backend("missing-id")
+
+    @patch("dynamodb.refresh_flow_timerange_summary")
+    @patch("dynamodb.service_table")
+    def test_get_flow_last_end(self, mock_service_table, mock_refresh):
+        mock_service_table.get_item.side_effect = [{}, {"Item": {"last_end": 10}}]
+
+        assert 10 == dynamodb.get_flow_last_end("flow-id")
+        mock_refresh.assert_called_once_with("flow-id")
+
+    @patch("dynamodb.time")
+    @patch("dynamodb.get_flow_last_end")
+    def test_wait_for_flow_segments_existing(self, mock_get_flow_last_end, mock_time):
+        mock_time.monotonic.return_value = 0
+        mock_get_flow_last_end.return_value = 100
+
+        assert (False, 100) == dynamodb.wait_for_flow_segments("flow-id", 100, 10)
+        mock_time.sleep.assert_not_called()
+
+    @patch("dynamodb.time")
+    @patch("dynamodb.get_flow_last_end")
+    def test_wait_for_flow_segments_added(self, mock_get_flow_last_end, mock_time):
+        mock_time.monotonic.return_value = 0
+        mock_get_flow_last_end.side_effect = [None, 50, 150]
+
+        assert (True, None) == dynamodb.wait_for_flow_segments("flow-id", 100, 10)
+        assert 2 == mock_time.sleep.call_count
+
+    @patch("dynamodb.time")
+    @patch("dynamodb.get_flow_last_end")
+    def test_wait_for_flow_segments_next_segment(
+        self, mock_get_flow_last_end, mock_time
+    ):
+        mock_time.monotonic.return_value = 0
+        mock_get_flow_last_end.side_effect = [100, 100, 101]
+
+        assert (True, 100) == dynamodb.wait_for_flow_segments("flow-id", None, 10)
+
+    @patch("dynamodb.time")
+    @patch("dynamodb.get_flow_last_end")
+    def test_wait_for_flow_segments_timeout(self, mock_get_flow_last_end, mock_time):
+        mock_time.monotonic.side_effect = [0, 0, 0, 5, 5, 10]
+        mock_get_flow_last_end.return_value = 50
+
+        assert (False, 50) == dynamodb.wait_for_flow_segments("flow-id", 100, 10)
+        assert 3 == mock_get_flow_last_end.call_count
+
+    @patch("dynamodb.segments_table")
+    def test_query_segment_bounds(self, mock_segments_table):
+        mock_segments_table.query.side_effect = [
+            {
+                "Items": [{"timerange_start": 0, "timerange_end": 9}],
+                "LastEvaluatedKey": {"flow_id": "flow-id", "timerange_end": 9},
+            },
+            {"Items": [{"timerange_start": 10, "timerange_end": 19}]},
+        ]
+
+        assert [(0, 9), (10, 19)] == list(dynamodb.query_segment_bounds("flow-id", 5))
+        args = mock_segments_table.query.call_args_list[1].kwargs
+        assert "timerange_start, timerange_end" == args["ProjectionExpression"]
+        assert {"flow_id": "flow-id", "timerange_end": 9} == args["ExclusiveStartKey"]
+
+    @patch("dynamodb.segments_table")
+    def test_query_segment_bounds_stops_with_consumer(self, mock_segments_table):
+        mock_segments_table.query.return_value = {
+            "Items": [{"timerange_start": 0, "timerange_end": 9}],
+            "LastEvaluatedKey": {"flow_id": "flow-id", "timerange_end": 9},
+        }
+
+        assert (0, 9) == next(dynamodb.query_segment_bounds("flow-id"))
+        assert 1 == mock_segments_table.query.call_count
+
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.segments_table")
+    def test_query_segments_uses_client(self, mock_segments_table, mock_dynamodb):
+        mock_segments_table.name = "segments-table"
+
+        dynamodb.query_segments(Limit=1)
+
+        mock_dynamodb.meta.client.query.assert_called_once_with(
+            TableName="segments-table", Limit=1
+        )
+        assert not mock_segments_table.query.called
+
+    @patch("dynamodb.query_segments")
+    def test_plan_segments_query_defers_boundary(self, mock_query_segments):
+        parameters = {"timerange": "[1:0_2:0)"}
+
+        args, boundary = dynamodb.plan_segments_query("test-flow", parameters)
+
+        assert (1_000_000_000, 2_000_000_000) == boundary
+        assert 0 == mock_query_segments.call_count
+        key_expr, _, key_values = parse_dynamo_expression(
+            args["KeyConditionExpression"]
+        )
+        assert "BETWEEN" not in key_expr
+        assert 1_000_000_000 in key_values.values()
+        _, filter_names, _ = parse_dynamo_expression(args["FilterExpression"])
+        assert {"timerange_start"} == set(filter_names.values())
+
+    @patch("dynamodb.query_segments")
+    def test_plan_segments_query_end_only_filters_boundary_segment(
+        self, mock_query_segments
+    ):
+        args, boundary = dynamodb.plan_segments_query(
+            "test-flow", {"timerange": "_2:0)"}
+        )
+
+        assert (None, 2_000_000_000) == boundary
+        assert 0 == mock_query_segments.call_count
+        _, filter_names, _ = parse_dynamo_expression(args["FilterExpression"])
+        assert {"timerange_start"} == set(filter_names.values())
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_probes_concurrently(self, mock_query_segments):
+        page_started = threading.Event()
+        overlapped = []
+
+        def query(**kwargs):
+            if kwargs.get("ProjectionExpression") == "timerange_end":
+                # The probe only returns once the page query has started
+                overlapped.append(page_started.wait(5))
+                return {"Items": [{"timerange_end": 2_999_999_999}]}
+            page_started.set()
+            return {
+                "Items": [{"timerange_end": 1_999_999_999}],
+                "LastEvaluatedKey": {"timerange_end": 3_999_999_999},
+            }
+
+        mock_query_segments.side_effect = query
+        args, boundary = dynamodb.plan_segments_query(
+            "test-flow", {"timerange": "[1:0_2:0)", "limit": 2}
+        )
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args, boundary)
+
+        assert [True] == overlapped
+        # One round trip each for the probe and the page. The LastEvaluatedKey
+        # past the boundary is dropped instead of queried.
+        assert 2 == mock_query_segments.call_count
+        assert 1 == len(items)
+        assert next_key is None
+        key_expr, _, key_values = parse_dynamo_expression(
+            args["KeyConditionExpression"]
+        )
+        assert "BETWEEN" in key_expr
+        assert 2_999_999_999 in key_values.values()
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_follow_up_uses_boundary(self, mock_query_segments):
+        page_key_conditions = []
+
+        def query(**kwargs):
+            if kwargs.get("ProjectionExpression") == "timerange_end":
+                return {"Items": [{"timerange_end": 2_999_999_999}]}
+            page_key_conditions.append(
+                parse_dynamo_expression(kwargs["KeyConditionExpression"])[0]
+            )
+            if "ExclusiveStartKey" not in kwargs:
+                return {"Items": [], "LastEvaluatedKey": {"timerange_end": 1}}
+            return {"Items": [{"timerange_end": 1_999_999_999}]}
+
+        mock_query_segments.side_effect = query
+        args, boundary = dynamodb.plan_segments_query(
+            "test-flow", {"timerange": "[0:0_2:0)", "limit": 2}
+        )
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args, boundary)
+
+        assert 3 == mock_query_segments.call_count
+        assert "BETWEEN" not in page_key_conditions[0]
+        assert "BETWEEN" in page_key_conditions[1]
+        assert [{"timerange_end": 1_999_999_999}] == items
+        assert next_key is None
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_reverse_probes_first(self, mock_query_segments):
+        mock_query_segments.side_effect = [
+            {"Items": [{"timerange_end": 2_999_999_999}]},
+            {"Items": [{"timerange_end": 1_999_999_999}]},
+        ]
+        args, boundary = dynamodb.plan_segments_query(
+            "test-flow", {"timerange": "[1:0_2:0)", "reverse_order": True}
+        )
+
+        dynamodb.query_segments_page("test-flow", args, boundary)
+
+        assert 2 == mock_query_segments.call_count
+        probe, page = mock_query_segments.call_args_list
+        assert 1 == probe.kwargs["Limit"]
+        key_expr, _, _ = parse_dynamo_expression(page.kwargs["KeyConditionExpression"])
+        assert "BETWEEN" in key_expr
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_unbounded(self, mock_query_segments):
+        mock_query_segments.return_value = {
+            "Items": [{"timerange_end": 5}],
+            "LastEvaluatedKey": {"timerange_end": 5},
+        }
+        args, boundary = dynamodb.plan_segments_query(
+            "test-flow", {"timerange": "[0:0_", "limit": 1}
+        )
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args, boundary)
+
+        assert boundary is None
+        assert 1 == mock_query_segments.call_count
+        assert 5 == next_key
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_truncated_follow_up(self, mock_query_segments):
+        mock_query_segments.side_effect = [
+            {"Items": [{"timerange_end": 1}], "LastEvaluatedKey": {"timerange_end": 2}},
+            {"Items": [{"timerange_end": 3}, {"timerange_end": 4}]},
+        ]
+        args, _ = dynamodb.plan_segments_query("test-flow", {"limit": 2})
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args)
+
+        # The segment left out of the page must be returned by the next page
+        assert [1, 3] == [item["timerange_end"] for item in items]
+        assert 3 == next_key
+
+    @patch("dynamodb.metrics")
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_reads_ahead_by_selectivity(
+        self, mock_query_segments, mock_metrics
+    ):
+        mock_query_segments.side_effect = [
+            {
+                "Items": [{"timerange_end": 1}],
+                "ScannedCount": 10,
+                "LastEvaluatedKey": {"timerange_end": 10},
+                "ConsumedCapacity": {"CapacityUnits": 1.5},
+            },
+            {
+                "Items": [{"timerange_end": 20 + i} for i in range(4)],
+                "ScannedCount": 40,
+                "LastEvaluatedKey": {"timerange_end": 50},
+                "ConsumedCapacity": {"CapacityUnits": 4.5},
+            },
+        ]
+        args, _ = dynamodb.plan_segments_query(
+            "test-flow", {"limit": 5, "object_id": "test-object"}
+        )
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args)
+
+        # 4 more matches at the observed 1 in 10 selectivity
+        assert 40 == mock_query_segments.call_args_list[1].kwargs["Limit"]
+        assert 5 == args["Limit"]
+        assert 5 == len(items)
+        assert 50 == next_key
+        recorded = {
+            c.kwargs["name"]: c.kwargs["value"]
+            for c in mock_metrics.add_metric.call_args_list
+        }
+        assert 2 == recorded["SegmentsQueryIterations"]
+        assert 6.0 == recorded["SegmentsQueryConsumedCapacity"]
+        assert "SegmentsQueryCapacityBudgetExhausted" not in recorded
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_read_ahead_doubles_without_matches(
+        self, mock_query_segments
+    ):
+        mock_query_segments.side_effect = [
+            {"Items": [], "LastEvaluatedKey": {"timerange_end": 1}},
+            {"Items": [], "LastEvaluatedKey": {"timerange_end": 2}},
+            {"Items": [{"timerange_end": 3}]},
+        ]
+        args, _ = dynamodb.plan_segments_query("test-flow", {"limit": 5})
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args)
+
+        assert [5, 10, 20] == [
+            call.kwargs["Limit"] for call in mock_query_segments.call_args_list
+        ]
+        assert [{"timerange_end": 3}] == items
+        assert next_key is None
+
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_read_ahead_is_capped(self, mock_query_segments):
+        mock_query_segments.side_effect = [
+            {
+                "Items": [{"timerange_end": 1}],
+                "ScannedCount": 300,
+                "LastEvaluatedKey": {"timerange_end": 300},
+            },
+            {"Items": []},
+        ]
+        args, _ = dynamodb.plan_segments_query("test-flow", {"limit": 300})
+
+        dynamodb.query_segments_page("test-flow", args)
+
+        assert (
+            constants.SEGMENTS_READ_AHEAD_MAX_LIMIT
+            == mock_query_segments.call_args_list[1].kwargs["Limit"]
+        )
+
+    @patch("dynamodb.metrics")
+    @patch("dynamodb.query_segments")
+    def test_query_segments_page_capacity_budget(
+        self, mock_query_segments, mock_metrics
+    ):
+        mock_query_segments.return_value = {
+            "Items": [{"timerange_end": 1}],
+            "LastEvaluatedKey": {"timerange_end": 9},
+            "ConsumedCapacity": {
+                "CapacityUnits": constants.SEGMENTS_QUERY_CAPACITY_BUDGET
+            },
+        }
+        args, _ = dynamodb.plan_segments_query("test-flow", {"limit": 5})
+
+        items, next_key = dynamodb.query_segments_page("test-flow", args)
+
+        # A short page continues from the last evaluated segment
+        assert 1 == mock_query_segments.call_count
+        assert 1 == len(items)
+        assert 9 == next_key
+        recorded = {
+            c.kwargs["name"]: c.kwargs["value"]
+            for c in mock_metrics.add_metric.call_args_list
+        }
+        assert 1 == recorded["SegmentsQueryCapacityBudgetExhausted"]
+        assert 1 == recorded["SegmentsQueryIterations"]
+
+    def test_plan_segments_query_object_id_page(self):
+        args, _ = dynamodb.plan_segments_query(
+            "test-flow", {"object_id": "test-object", "page": "10"}
+        )
+
+        assert {
+            "flow_id": "test-flow",
+            "timerange_end": 10,
+            "object_id": "test-object",
+        } == args["ExclusiveStartKey"]
+
+    @patch("dynamodb.query_segments")
+    def test_get_segment_at(self, mock_query_segments):
+        mock_query_segments.return_value = {"Items": [{"timerange_end": 9}]}
+
+        assert {"timerange_end": 9} == dynamodb.get_segment_at("test-flow", 5, "p")
+
+        args = mock_query_segments.call_args.kwargs
+        assert 1 == args["Limit"]
+        assert "p" == args["ProjectionExpression"]
+        _, _, key_values = parse_dynamo_expression(args["KeyConditionExpression"])
+        assert 5 in key_values.values()
+
+    @patch("dynamodb.get_segment_at")
+    def test_get_segments_at(self, mock_get_segment_at):
+        segments = {0: {"timerange_end": 9}, 5: {"timerange_end": 9}, 20: None}
+        mock_get_segment_at.side_effect = lambda flow_id, point, projection: (
+            segments.get(point, {"timerange_end": point + 9})
+        )
+
+        result = dynamodb.get_segments_at("test-flow", [0, 5, 10, 20])
+
+        # One lookup per point, with the segments found more than once and the
+        # points past the last segment dropped
+        assert 4 == mock_get_segment_at.call_count
+        assert [{"timerange_end": 9}, {"timerange_end": 19}] == result
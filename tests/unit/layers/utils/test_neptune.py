@@ -0,0 +1,477 @@
+from unittest.mock import patch
+
+import pytest
+from aws_lambda_powertools.event_handler.exceptions import BadRequestError
+from mediatimestamp.immutable import TimeRange
+from schema import Flowcollection
+
+pytestmark = [
+    pytest.mark.unit,
+]
+
+with patch("boto3.client"):
+    with patch("boto3.resource"):
+        import neptune
+
+FLOW_1, FLOW_2, FLOW_3, FLOW_SELF = (
+    f"00000000-0000-1000-8000-00000000000{n}" for n in range(4)
+)
+
+
+class TestNeptune:
+    @pytest.mark.parametrize(
+        "timerange,expected",
+        [
+            (
+                "[10:0_20:0)",
+                "(flow.segments_timerange_indexed IS NULL OR (flow.segments_timerange_start IS NOT NULL AND flow.segments_timerange_end >= 10000000000 AND flow.segments_timerange_start <= 19999999999))",
+            ),
+            (
+                "(10:0_",
+                "(flow.segments_timerange_indexed IS NULL OR (flow.segments_timerange_start IS NOT NULL AND flow.segments_timerange_end >= 10000000001))",
+            ),
+            (
+                "_",
+                "(flow.segments_timerange_indexed IS NULL OR (flow.segments_timerange_start IS NOT NULL))",
+            ),
+            (
+                "()",
+                "(flow.segments_timerange_indexed IS NULL OR (flow.segments_timerange_start IS NULL))",
+            ),
+        ],
+    )
+    def test_get_flow_timerange_where_literal(self, timerange, expected):
+        result = neptune.get_flow_timerange_where_literal(TimeRange.from_str(timerange))
+
+        assert expected == result
+
+    def test_get_flow_timerange_set_literals_replace(self):
+        result = neptune.get_flow_timerange_set_literals("[1:0_2:0)", extend=False)
+
+        assert [
+            "flow.segments_timerange_start = 1000000000",
+            "flow.segments_timerange_end = 1999999999",
+            "flow.segments_timerange_indexed = true",
+        ] == result
+
+    def test_get_flow_timerange_set_literals_extend(self):
+        result = neptune.get_flow_timerange_set_literals("[1:0_2:0)", extend=True)
+
+        assert 3 == len(result)
+        assert result[0].startswith("flow.segments_timerange_start = CASE WHEN")
+        assert "flow.segments_timerange_start > 1000000000" in result[0]
+        assert "flow.segments_timerange_end < 1999999999" in result[1]
+        # The flag must be set after the bounds that are conditional on it
+        assert "flow.segments_timerange_indexed = true" == result[-1]
+
+    def test_get_flow_timerange_set_literals_extend_without_index(self):
+        result = neptune.get_flow_timerange_set_literals(
+            "[1:0_2:0)", extend=True, index=False
+        )
+
+        # Only indexed Flows are widened, unindexed Flows are left unindexed
+        assert 2 == len(result)
+        assert all(
+            "flow.segments_timerange_indexed IS NOT NULL AND" in literal
+            for literal in result
+        )
+        assert "flow.segments_timerange_start > 1000000000" in result[0]
+        assert "flow.segments_timerange_end < 1999999999" in result[1]
+
+    @pytest.mark.parametrize(
+        "extend,expected",
+        [
+            (True, ["flow.segments_timerange_indexed = true"]),
+            (
+                False,
+                [
+                    "flow.segments_timerange_start = null",
+                    "flow.segments_timerange_end = null",
+                    "flow.segments_timerange_indexed = true",
+                ],
+            ),
+        ],
+    )
+    def test_get_flow_timerange_set_literals_empty(self, extend, expected):
+        result = neptune.get_flow_timerange_set_literals("()", extend=extend)
+
+        assert expected == result
+
+    @patch("neptune.neptune")
+    def test_query_flows_timerange_filter(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+
+        neptune.query_flows({"timerange": "[10:0_20:0)"})
+
+        query = mock_neptune.execute_open_cypher_query.call_args[1]["openCypherQuery"]
+        assert "WHERE (flow.segments_timerange_indexed IS NULL OR" in query
+
+    @patch("neptune.neptune")
+    def test_query_node_removes_timerange_properties(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "results": [
+                {
+                    "flow": {
+                        "id": "abc",
+                        "segments_timerange_start": 0,
+                        "segments_timerange_end": 10,
+                        "segments_timerange_indexed": True,
+                    }
+                }
+            ]
+        }
+
+        result = neptune.query_node("flow", "abc")
+
+        assert {"id": "abc"} == result
+
+    @pytest.mark.parametrize(
+        "page,expected",
+        [
+            (None, (0, [])),
+            ("", (0, [])),
+            ("20", (20, [])),
+            (
+                "eyJpZCI6ICJhYmMifQ==",
+                (0, ['flow.id > "abc"']),
+            ),
+        ],
+    )
+    def test_parse_page_parameter(self, page, expected):
+        result = neptune.parse_page_parameter("flow", page)
+
+        assert expected == result
+
+    @pytest.mark.parametrize(
+        "page",
+        [
+            "not-valid-base64!!!",
+            "bm90IGpzb24=",  # not json
+            "eyJrZXkiOiAiYWJjIn0=",  # missing id
+            "eyJpZCI6IDF9",  # id not a string
+        ],
+    )
+    def test_parse_page_parameter_invalid(self, page):
+        with pytest.raises(BadRequestError, match="Invalid page parameter value"):
+            neptune.parse_page_parameter("flow", page)
+
+    def test_parse_page_parameter_escapes_id(self):
+        page = neptune.encode_page_token('abc" OR true //')
+
+        _, result = neptune.parse_page_parameter("flow", page)
+
+        assert ['flow.id > "abc\\" OR true //"'] == result
+
+    def test_get_next_page(self):
+        results = [{"id": "a"}, {"id": "b"}]
+
+        assert neptune.get_next_page(results, 3) is None
+        token = neptune.get_next_page(results, 2)
+        assert (0, ['flow.id > "b"']) == neptune.parse_page_parameter("flow", token)
+
+    @pytest.mark.parametrize(
+        "query_function,ref_name",
+        [
+            (neptune.query_sources, "source"),
+            (neptune.query_flows, "flow"),
+            (neptune.query_webhooks, "webhook"),
+        ],
+    )
+    @patch("neptune.neptune")
+    def test_query_keyset_pagination(self, mock_neptune, query_function, ref_name):
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "results": [{ref_name: {"id": f"id-{n}"}} for n in range(2)]
+        }
+        queries = []
+        page = None
+        # Walk several pages, the query for a deep page must not grow with its offset
+        for _ in range(3):
+            _, page, _ = query_function({"page": page, "limit": 2})
+            queries.append(
+                mock_neptune.execute_open_cypher_query.call_args[1]["openCypherQuery"]
+            )
+
+        assert "SKIP 0" in queries[-1]
+        assert f'{ref_name}.id > "id-1"' in queries[-1]
+        assert len(queries[1]) == len(queries[2])
+
+    @patch("neptune.neptune")
+    def test_query_flows_numeric_page(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "results": [{"flow": {"id": "abc"}}]
+        }
+
+        results, next_page, _ = neptune.query_flows({"page": "40", "limit": 1})
+
+        query = mock_neptune.execute_open_cypher_query.call_args[1]["openCypherQuery"]
+        assert "SKIP 40" in query
+        assert [{"id": "abc"}] == results
+        assert neptune.encode_page_token("abc") == next_page
+
+    @patch("neptune.metrics")
+    @patch("neptune.neptune")
+    def test_execute_open_cypher_query_metrics(self, mock_neptune, mock_metrics):
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "ResponseMetadata": {"HTTPHeaders": {"content-length": "42"}},
+            "results": [{"id": 1}, {"id": 2}],
+        }
+
+        neptune.execute_open_cypher_query("MATCH (n) RETURN n")
+
+        recorded = {
+            c.kwargs["name"]: c.kwargs["value"]
+            for c in mock_metrics.add_metric.call_args_list
+        }
+        assert 2 == recorded["NeptuneQueryRows"]
+        assert 42 == recorded["NeptuneQueryPayloadSize"]
+        assert "NeptuneQueryLatency" in recorded
+
+    @pytest.mark.parametrize("slow_query_ms,expected", [(0, 1), (60000, 0)])
+    @patch("neptune.logger")
+    @patch("neptune.neptune")
+    def test_execute_open_cypher_query_slow_query_log(
+        self, mock_neptune, mock_logger, slow_query_ms, expected
+    ):
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+
+        with patch("neptune.constants.NEPTUNE_SLOW_QUERY_MS", slow_query_ms):
+            neptune.execute_open_cypher_query("MATCH (n) RETURN n")
+
+        assert expected == mock_logger.warning.call_count
+        assert 0 == mock_logger.info.call_count
+
+    @patch("neptune.neptune")
+    def test_execute_many_preserves_order(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.side_effect = lambda openCypherQuery: {
+            "results": [{"query": openCypherQuery}]
+        }
+        queries = [f"RETURN {n}" for n in range(20)]
+
+        results = neptune.execute_many(queries)
+
+        assert queries == [r["results"][0]["query"] for r in results]
+
+    @pytest.mark.parametrize(
+        "collection_ids,missing_id,expected,query_count",
+        [
+            ([FLOW_1, FLOW_2, FLOW_3], None, True, 3),
+            ([FLOW_1, FLOW_2, FLOW_3], FLOW_2, False, 3),
+            ([FLOW_1, FLOW_SELF], None, False, 0),
+        ],
+    )
+    @patch("neptune.neptune")
+    def test_validate_flow_collection(
+        self, mock_neptune, collection_ids, missing_id, expected, query_count
+    ):
+        mock_neptune.execute_open_cypher_query.side_effect = lambda openCypherQuery: {
+            "results": ([] if missing_id and missing_id in openCypherQuery else [{}])
+        }
+        flow_collection = Flowcollection(
+            [{"id": collection_id, "role": "r"} for collection_id in collection_ids]
+        )
+
+        assert expected == neptune.validate_flow_collection(FLOW_SELF, flow_collection)
+        assert query_count == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.neptune")
+    def test_enhance_resources_flow(self, mock_neptune):
+        neptune.clear_flow_resources_cache()
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "results": [
+                {
+                    "source_id": "src",
+                    "source_collected_by": ["src-parent"],
+                    "flow_collected_by": ["flow-parent"],
+                }
+            ]
+        }
+
+        result = neptune.enhance_resources(["tams:flow:abc"])
+
+        assert [
+            "tams:flow:abc",
+            "tams:source:src",
+            "tams:source-collected-by:src-parent",
+            "tams:flow-collected-by:flow-parent",
+        ] == result
+        assert 1 == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.neptune")
+    def test_enhance_resources_flow_cached(self, mock_neptune):
+        neptune.clear_flow_resources_cache()
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "results": [
+                {
+                    "source_id": "src",
+                    "source_collected_by": [],
+                    "flow_collected_by": [],
+                }
+            ]
+        }
+
+        first = neptune.enhance_resources(["tams:flow:abc"])
+        second = neptune.enhance_resources(["tams:flow:abc"])
+
+        assert first == second
+        assert 1 == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.neptune")
+    def test_enhance_resources_flow_cache_expires(self, mock_neptune):
+        neptune.clear_flow_resources_cache()
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+
+        with patch("neptune.constants.FLOW_RESOURCES_CACHE_TTL_SECS", 0):
+            neptune.enhance_resources(["tams:flow:abc"])
+            neptune.enhance_resources(["tams:flow:abc"])
+
+        assert 2 == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.neptune")
+    def test_enhance_resources_flow_not_found(self, mock_neptune):
+        neptune.clear_flow_resources_cache()
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+
+        result = neptune.enhance_resources(["tams:flow:abc"])
+
+        assert ["tams:flow:abc"] == result
+        assert 1 == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.neptune")
+    def test_enhance_resources_explicit_source(self, mock_neptune):
+        neptune.clear_flow_resources_cache()
+        mock_neptune.execute_open_cypher_query.side_effect = [
+            {
+                "results": [
+                    {
+                        "source_id": "src",
+                        "source_collected_by": ["src-parent"],
+                        "flow_collected_by": [],
+                    }
+                ]
+            },
+            {"results": [{"source_collected_by": ["other-parent"]}]},
+        ]
+
+        result = neptune.enhance_resources(["tams:flow:abc", "tams:source:other"])
+
+        assert [
+            "tams:flow:abc",
+            "tams:source:other",
+            "tams:source-collected-by:other-parent",
+        ] == result
+        assert 2 == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.neptune")
+    def test_set_flow_collection_clears_flow_resources_cache(self, mock_neptune):
+        neptune.clear_flow_resources_cache()
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+        neptune.get_flow_resources("abc")
+
+        with patch("neptune.query_node"):
+            neptune.set_flow_collection("def", "user", [])
+        neptune.get_flow_resources("abc")
+
+        # One query for each lookup plus the set_flow_collection query
+        assert 3 == mock_neptune.execute_open_cypher_query.call_count
+
+    @patch("neptune.publish_event")
+    @patch("neptune.enhance_resources")
+    @patch("neptune.set_node_property_base")
+    def test_update_flow_segments_updated_coalesce(
+        self, mock_set_node_property_base, _mock_enhance_resources, mock_publish_event
+    ):
+        mock_set_node_property_base.return_value = {"id": "abc", "source_id": "src"}
+
+        neptune.update_flow_segments_updated("abc", "[0:0_1:0)", coalesce=True)
+        neptune.update_flow_segments_updated("abc", "[0:0_2:0)", coalesce=True)
+        neptune.update_flow_segments_updated(
+            "abc", "[1:0_2:0)", extend=False, coalesce=True
+        )
+
+        assert 0 == mock_set_node_property_base.call_count
+
+        neptune.flush_flow_segments_updated()
+
+        assert 1 == mock_set_node_property_base.call_count
+        assert 1 == mock_publish_event.call_count
+        # The latest timerange replaces the bounds as one of the updates shrank them
+        set_literal = mock_set_node_property_base.call_args[0][2]
+        assert "flow.segments_timerange_start = 1000000000" in set_literal
+        assert "CASE WHEN" not in set_literal
+
+        neptune.flush_flow_segments_updated()
+
+        assert 1 == mock_set_node_property_base.call_count
+
+    @patch("neptune.publish_event")
+    @patch("neptune.enhance_resources")
+    @patch("neptune.set_node_property_base")
+    def test_flush_flow_segments_updated_event_window(
+        self, mock_set_node_property_base, _mock_enhance_resources, mock_publish_event
+    ):
+        mock_set_node_property_base.return_value = {"id": "abc", "source_id": "src"}
+
+        with patch("neptune.flows_updated_event_window", 60):
+            for _ in range(3):
+                neptune.update_flow_segments_updated("abc", coalesce=True)
+                neptune.flush_flow_segments_updated()
+        neptune.flush_flow_segments_updated()
+
+        # The graph is always written but only the first event is published
+        assert 3 == mock_set_node_property_base.call_count
+        assert 1 == mock_publish_event.call_count
+
+    @patch("neptune.publish_event")
+    @patch("neptune.enhance_resources")
+    @patch("neptune.set_node_property_base")
+    def test_update_flow_segments_updated_coalesce_extends(
+        self, mock_set_node_property_base, _mock_enhance_resources, _mock_publish_event
+    ):
+        mock_set_node_property_base.return_value = {"id": "abc", "source_id": "src"}
+
+        neptune.update_flow_segments_updated("abc", "[2:0_3:0)", coalesce=True)
+        neptune.update_flow_segments_updated("abc", "[0:0_1:0)", coalesce=True)
+        neptune.flush_flow_segments_updated()
+
+        # The bounds are widened to cover the timeranges of both updates
+        set_literal = mock_set_node_property_base.call_args[0][2]
+        assert "THEN 0 ELSE" in set_literal
+        assert "THEN 2999999999 ELSE" in set_literal
+        assert "flow.segments_timerange_indexed = true" not in set_literal
+
+    @patch("neptune.publish_event")
+    @patch("neptune.set_node_property_base")
+    def test_write_flow_segments_updated_sets_segments_version(
+        self, mock_set_node_property_base, _mock_publish_event
+    ):
+        neptune.write_flow_segments_updated("abc", publish=False)
+
+        set_literal = mock_set_node_property_base.call_args[0][2]
+        assert "flow.segments_updated = " in set_literal
+        assert "flow.segments_version = " in set_literal
+
+    @patch("neptune.neptune")
+    def test_get_flow_segments_version(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.return_value = {
+            "results": [{"segments_version": "version"}]
+        }
+
+        assert "version" == neptune.get_flow_segments_version("abc")
+
+    @patch("neptune.neptune")
+    def test_get_flow_segments_version_not_found(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+
+        with pytest.raises(ValueError):
+            neptune.get_flow_segments_version("abc")
+
+    @patch("neptune.neptune")
+    def test_set_flows_segments_version(self, mock_neptune):
+        mock_neptune.execute_open_cypher_query.return_value = {"results": []}
+
+        neptune.set_flows_segments_version({"b", "a"})
+        neptune.set_flows_segments_version(set())
+
+        assert 1 == mock_neptune.execute_open_cypher_query.call_count
+        query = mock_neptune.execute_open_cypher_query.call_args[1]["openCypherQuery"]
+        assert 'WHERE flow.id IN ["a", "b"] SET flow.segments_version = ' in query
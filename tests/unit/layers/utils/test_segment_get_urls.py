@@ -0,0 +1,280 @@
+from unittest.mock import patch
+
+import pytest
+
+pytestmark = [
+    pytest.mark.unit,
+]
+
+with patch("boto3.client"):
+    with patch("boto3.resource"):
+        import segment_get_urls
+
+URL_ONE = "https://bucket.s3.eu-west-1.amazonaws.com/object-one"
+URL_TWO = "https://bucket.s3.eu-west-1.amazonaws.com/object-two"
+STORAGE_BACKENDS = {
+    f"storage-{i}": {
+        "id": f"storage-{i}",
+        "label": f"aws.eu-west-{i}:s3:store",
+        "bucket_name": f"bucket-{i}",
+        "region": f"eu-west-{i}",
+        **({"default_storage": True} if i == 1 else {}),
+    }
+    for i in range(1, 4)
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_presigned_url_cache():
+    segment_get_urls._presigned_url_cache.clear()
+    yield
+    segment_get_urls._presigned_url_cache.clear()
+
+
+class TestSegmentGetUrls:
+    @patch("segment_get_urls.generate_presigned_url")
+    def test_create_presigned_get_url(self, mock_generate_presigned_url):
+        mock_generate_presigned_url.return_value = "presigned"
+
+        result = segment_get_urls.create_presigned_get_url(URL_ONE)
+
+        assert (URL_ONE, "presigned") == result
+        mock_generate_presigned_url.assert_called_once_with(
+            "get_object",
+            "bucket",
+            "object-one",
+            expires_in=segment_get_urls.constants.MIN_PRESIGNED_URL_TIMEOUT_SECS
+            + segment_get_urls.constants.PRESIGNED_URL_CACHE_BUCKET_SECS,
+        )
+
+    @patch("segment_get_urls.time")
+    @patch("segment_get_urls.generate_presigned_url")
+    def test_create_presigned_urls_parallel_reuses_cache(
+        self, mock_generate_presigned_url, mock_time
+    ):
+        mock_time.time.return_value = 1000
+        mock_generate_presigned_url.side_effect = lambda method, bucket, key, **_: (
+            f"presigned/{key}"
+        )
+
+        first = segment_get_urls.create_presigned_urls_parallel({URL_ONE})
+        second = segment_get_urls.create_presigned_urls_parallel({URL_ONE, URL_TWO})
+
+        assert {URL_ONE: "presigned/object-one"} == first
+        assert {
+            URL_ONE: "presigned/object-one",
+            URL_TWO: "presigned/object-two",
+        } == second
+        assert 2 == mock_generate_presigned_url.call_count
+
+    @patch("segment_get_urls.time")
+    @patch("segment_get_urls.generate_presigned_url")
+    def test_create_presigned_urls_parallel_expiry_bucket(
+        self, mock_generate_presigned_url, mock_time
+    ):
+        mock_generate_presigned_url.return_value = "presigned"
+        bucket_secs = segment_get_urls.constants.PRESIGNED_URL_CACHE_BUCKET_SECS
+
+        mock_time.time.return_value = bucket_secs * 10
+        segment_get_urls.create_presigned_urls_parallel({URL_ONE})
+        mock_time.time.return_value = bucket_secs * 11 - 1
+        segment_get_urls.create_presigned_urls_parallel({URL_ONE})
+        mock_time.time.return_value = bucket_secs * 11
+        segment_get_urls.create_presigned_urls_parallel({URL_ONE})
+
+        assert 2 == mock_generate_presigned_url.call_count
+
+    @patch("segment_get_urls.constants.PRESIGNED_URL_CACHE_SIZE", 1)
+    @patch("segment_get_urls.time")
+    @patch("segment_get_urls.generate_presigned_url")
+    def test_create_presigned_urls_parallel_evicts_oldest(
+        self, mock_generate_presigned_url, mock_time
+    ):
+        mock_time.time.return_value = 1000
+        mock_generate_presigned_url.return_value = "presigned"
+
+        segment_get_urls.create_presigned_urls_parallel({URL_ONE})
+        segment_get_urls.create_presigned_urls_parallel({URL_TWO})
+        segment_get_urls.create_presigned_urls_parallel({URL_ONE})
+
+        assert 1 == len(segment_get_urls._presigned_url_cache)
+        assert 3 == mock_generate_presigned_url.call_count
+
+    @patch("segment_get_urls.storage_backend_registry")
+    def test_compile_get_url_builders(self, mock_registry):
+        mock_registry.get.return_value = mock_registry
+        mock_registry.url_prefixes = {"storage-1": "https://bucket-1/"}
+        mock_registry.verbose_storage = {"storage-1": {"region": "eu-west-1"}}
+
+        result = segment_get_urls.compile_get_url_builders(
+            {"storage-1": STORAGE_BACKENDS["storage-1"]},
+            generate_presigned_urls=True,
+            verbose_storage=True,
+            include_storage_id=False,
+            filter_labels=None,
+            presigned=None,
+        )
+
+        assert {
+            "storage-1": (
+                "https://bucket-1/",
+                [
+                    {
+                        "label": "aws.eu-west-1:s3:store",
+                        "region": "eu-west-1",
+                        "storage_id": "storage-1",
+                        "controlled": True,
+                    },
+                    {
+                        "label": "aws.eu-west-1:s3.presigned:store",
+                        "region": "eu-west-1",
+                        "storage_id": "storage-1",
+                        "controlled": True,
+                        "presigned": True,
+                    },
+                ],
+            )
+        } == result
+
+    @pytest.mark.parametrize(
+        "filter_labels,presigned,expected",
+        [
+            (
+                None,
+                None,
+                ["aws.eu-west-1:s3:store", "aws.eu-west-1:s3.presigned:store"],
+            ),
+            (None, False, ["aws.eu-west-1:s3:store"]),
+            (None, True, ["aws.eu-west-1:s3.presigned:store"]),
+            (
+                ["aws.eu-west-1:s3.presigned:store"],
+                None,
+                ["aws.eu-west-1:s3.presigned:store"],
+            ),
+            (["other"], None, []),
+        ],
+    )
+    @patch("segment_get_urls.storage_backend_registry")
+    def test_compile_get_url_builders_filters(
+        self, mock_registry, filter_labels, presigned, expected
+    ):
+        mock_registry.get.return_value = mock_registry
+        mock_registry.url_prefixes = {"storage-1": "https://bucket-1/"}
+
+        result = segment_get_urls.compile_get_url_builders(
+            {"storage-1": STORAGE_BACKENDS["storage-1"]},
+            generate_presigned_urls=True,
+            verbose_storage=False,
+            include_storage_id=False,
+            filter_labels=filter_labels,
+            presigned=presigned,
+        )
+
+        assert expected == [template["label"] for template in result["storage-1"][1]]
+
+    @patch("segment_get_urls.get_object_instances", return_value={})
+    @patch("segment_get_urls.create_presigned_urls_parallel")
+    @patch("segment_get_urls.storage_backend_registry")
+    def test_populate_get_urls_page(
+        self, mock_registry, mock_create_presigned_urls_parallel, _
+    ):
+        mock_registry.get.return_value = mock_registry
+        mock_registry.by_id = STORAGE_BACKENDS
+        mock_registry.url_prefixes = {
+            storage_id: f"https://{storage_backend['bucket_name']}/"
+            for storage_id, storage_backend in STORAGE_BACKENDS.items()
+        }
+        mock_create_presigned_urls_parallel.side_effect = lambda url_set: {
+            url: f"{url}?signed" for url in url_set
+        }
+        uncontrolled_get_url = {"label": "uncontrolled", "url": "https://example.com"}
+        segments = [
+            {"object_id": "no-storage"},
+            {"object_id": "uncontrolled", "get_urls": [uncontrolled_get_url]},
+            *(
+                {"object_id": f"object-{i}", "storage_ids": list(STORAGE_BACKENDS)}
+                for i in range(298)
+            ),
+        ]
+
+        segment_get_urls.populate_get_urls(segments)
+
+        assert [
+            {"label": "aws.eu-west-1:s3:store", "url": "https://bucket-1/no-storage"},
+            {
+                "label": "aws.eu-west-1:s3.presigned:store",
+                "url": "https://bucket-1/no-storage?signed",
+                "presigned": True,
+            },
+        ] == segments[0]["get_urls"]
+        assert [uncontrolled_get_url] == segments[1]["get_urls"]
+        assert all(len(segment["get_urls"]) == 6 for segment in segments[2:])
+        assert {
+            "url": "https://bucket-3/object-297?signed",
+            "label": "aws.eu-west-3:s3.presigned:store",
+            "presigned": True,
+        } == segments[-1]["get_urls"][-1]
+        mock_create_presigned_urls_parallel.assert_called_once()
+
+    @patch("segment_get_urls.get_object_instances")
+    def test_join_object_instances(self, mock_get_object_instances):
+        get_url = {"label": "added", "url": "https://example.com/media"}
+        mock_get_object_instances.return_value = {
+            "media": {"storage_ids": ["storage-2"], "get_urls": [get_url]},
+            "init": {"storage_ids": ["storage-3"], "get_urls": []},
+            "segment-held": None,
+        }
+        segments = [
+            {
+                "object_id": "media",
+                "storage_ids": ["storage-1"],
+                "init_object_id": "init",
+                "init_storage_ids": ["storage-1"],
+            },
+            {"object_id": "segment-held", "storage_ids": ["storage-1"]},
+        ]
+
+        segment_get_urls.join_object_instances(segments)
+
+        assert {"media", "init", "segment-held"} == set(
+            mock_get_object_instances.call_args.args[0]
+        )
+        assert ["storage-2"] == segments[0]["storage_ids"]
+        assert [get_url] == segments[0]["get_urls"]
+        assert ["storage-3"] == segments[0]["init_storage_ids"]
+        assert [] == segments[0]["init_get_urls"]
+        assert ["storage-1"] == segments[1]["storage_ids"]
+        # The cached instances are not shared with the segments
+        segments[0]["get_urls"].append({})
+        assert [get_url] == mock_get_object_instances.return_value["media"]["get_urls"]
+
+    @patch("dynamodb.dynamodb")
+    @patch("dynamodb.storage_table")
+    def test_join_object_instances_more_than_batch_limit(
+        self, mock_storage_table, mock_dynamodb
+    ):
+        mock_storage_table.name = "storage-table"
+        mock_dynamodb.batch_get_item.side_effect = lambda RequestItems: {
+            "Responses": {
+                "storage-table": [
+                    {"id": key["id"], "instance_storage_ids": ["storage-2"]}
+                    for key in RequestItems["storage-table"]["Keys"]
+                ]
+            }
+        }
+        segments = [
+            {
+                "object_id": f"object-{i}",
+                "storage_ids": ["storage-1"],
+                "init_object_id": "init",
+                "init_storage_ids": ["storage-1"],
+            }
+            for i in range(150)
+        ]
+
+        segment_get_urls.join_object_instances(segments)
+
+        # 151 distinct Objects are read in two BatchGetItem requests
+        assert 2 == mock_dynamodb.batch_get_item.call_count
+        assert all(segment["storage_ids"] == ["storage-2"] for segment in segments)
+        assert all(segment["init_storage_ids"] == ["storage-2"] for segment in segments)
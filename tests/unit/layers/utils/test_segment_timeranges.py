@@ -0,0 +1,143 @@
+from unittest.mock import patch
+
+import pytest
+from mediatimestamp.immutable import TimeRange
+
+pytestmark = [
+    pytest.mark.unit,
+]
+
+with patch("boto3.client"):
+    with patch("boto3.resource"):
+        import segment_timeranges
+
+
+class TestSegmentTimeranges:
+    @pytest.mark.parametrize(
+        "timerange,expected",
+        [
+            ("[0:0_6:0)", (0, 5_999_999_999)),
+            ("[0:0_6:0]", (0, 6_000_000_000)),
+            ("(0:0_6:0]", (1, 6_000_000_000)),
+            ("(0:0_6:0)", (1, 5_999_999_999)),
+        ],
+    )
+    def test_get_timerange_bounds(self, timerange, expected):
+        result = segment_timeranges.get_timerange_bounds(TimeRange.from_str(timerange))
+
+        assert expected == result
+
+    @pytest.mark.parametrize(
+        "start,end,expected",
+        [
+            (0, 9, True),  # overlaps first
+            (10, 19, False),  # gap between first and second
+            (10, 20, True),  # touches start of second
+            (25, 26, True),  # inside second
+            (30, 40, True),  # spans second and third
+            (51, 60, False),  # after last
+            (-10, -1, False),  # before first
+        ],
+    )
+    def test_segment_interval_index_overlaps(self, start, end, expected):
+        index = segment_timeranges.SegmentIntervalIndex([(40, 50), (0, 9), (20, 30)])
+
+        assert expected == index.overlaps(start, end)
+
+    def test_segment_interval_index_add(self):
+        index = segment_timeranges.SegmentIntervalIndex([(0, 9), (40, 50)])
+
+        index.add(20, 30)
+
+        assert 3 == len(index)
+        assert [0, 20, 40] == index.starts
+        assert [9, 30, 50] == index.ends
+        # Candidates within the same batch are checked against added intervals
+        assert index.overlaps(25, 35)
+        assert not index.overlaps(31, 39)
+
+    def test_segment_interval_index_empty(self):
+        index = segment_timeranges.SegmentIntervalIndex()
+
+        assert 0 == len(index)
+        assert not index.overlaps(0, 100)
+
+    @pytest.mark.parametrize(
+        "timerange,expected",
+        [
+            ("[0:0_6:0)", (0, 5_999_999_999)),
+            ("(0:0_", (1, None)),
+            ("_6:0]", (None, 6_000_000_000)),
+            ("_", (None, None)),
+            ("()", (1, 0)),
+        ],
+    )
+    def test_get_timerange_limits(self, timerange, expected):
+        result = segment_timeranges.get_timerange_limits(TimeRange.from_str(timerange))
+
+        assert expected == result
+
+    def test_get_segment_bounds(self):
+        assert (1, 2) == segment_timeranges.get_segment_bounds(
+            {"timerange": "[0:0_6:0)", "timerange_start": 1, "timerange_end": 2}
+        )
+        assert (0, 5_999_999_999) == segment_timeranges.get_segment_bounds(
+            {"timerange": "[0:0_6:0)"}
+        )
+
+    @pytest.mark.parametrize(
+        "limits,expected",
+        [
+            ((0, 9), True),
+            ((1, 9), False),
+            ((0, 8), False),
+            ((None, None), True),
+            ((1, 0), False),
+        ],
+    )
+    def test_is_within_limits(self, limits, expected):
+        assert expected == segment_timeranges.is_within_limits((0, 9), limits)
+
+    @pytest.mark.parametrize(
+        "start,end,coverage,gaps",
+        [
+            (None, None, [(0, 19), (40, 50)], [(20, 39)]),
+            (-5, 60, [(0, 19), (40, 50)], [(-5, -1), (20, 39), (51, 60)]),
+            (5, 45, [(5, 19), (40, 45)], [(20, 39)]),
+            (21, 30, [], [(21, 30)]),
+            (None, 30, [(0, 19)], [(20, 30)]),
+            (1, 0, [], []),
+        ],
+    )
+    def test_get_coverage(self, start, end, coverage, gaps):
+        intervals = [(0, 9), (10, 19), (40, 50)]
+
+        assert (coverage, gaps) == segment_timeranges.get_coverage(
+            iter(intervals), start, end
+        )
+
+    def test_get_coverage_stops_after_end(self):
+        intervals = iter([(0, 9), (10, 19), (40, 50)])
+
+        segment_timeranges.get_coverage(intervals, 0, 5)
+
+        assert [(40, 50)] == list(intervals)
+
+    def test_get_bounds_timerange(self):
+        assert "[0:0_6:0)" == str(
+            segment_timeranges.get_bounds_timerange(0, 5_999_999_999)
+        )
+
+    @pytest.mark.parametrize(
+        "after,limit,expected",
+        [
+            (None, 10, ([0, 10, 20, 30], False)),
+            (None, 2, ([0, 10], True)),
+            (-5, 2, ([0, 10], True)),
+            (10, 10, ([20, 30], False)),
+            (14, 1, ([20], True)),
+            (30, 10, ([], False)),
+        ],
+    )
+    def test_get_sample_points(self, after, limit, expected):
+        assert expected == segment_timeranges.get_sample_points(0, 35, 10, after, limit)
@@ -1,6 +1,7 @@
 import json
 import math
 from datetime import datetime, timedelta
+from decimal import Decimal
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -8,6 +9,7 @@ from aws_lambda_powertools.event_handler.exceptions import (
     BadRequestError,
     ForbiddenError,
 )
+from botocore.exceptions import ClientError
 from mediatimestamp.immutable import TimeRange, Timestamp
 
 pytestmark = [
@@ -18,6 +20,7 @@ with patch("boto3.client"):
     with patch("boto3.resource"):
         import constants
         import utils
+        from schema import Flowsegment
 
 
 class TestUtils:
@@ -258,6 +261,261 @@ class TestUtils:
 
         assert result == {"b": 2}
 
+    @pytest.mark.parametrize("count,calls", [(0, 0), (1, 1), (10, 1), (25, 3)])
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.events")
+    def test_publish_events_batches_entries(self, mock_events, count, calls):
+        utils.publish_events(
+            "flows/segments_added",
+            [{"flow_id": "abc", "segments": [{"id": i}]} for i in range(count)],
+            ["tams:flow:abc"],
+        )
+
+        entries = [
+            entry
+            for call in mock_events.put_events.call_args_list
+            for entry in call[1]["Entries"]
+        ]
+        assert calls == mock_events.put_events.call_count
+        assert count == len(entries)
+        assert all(
+            len(call[1]["Entries"]) <= constants.PUT_EVENTS_ENTRY_LIMIT
+            for call in mock_events.put_events.call_args_list
+        )
+        assert [{"id": i} for i in range(count)] == [
+            json.loads(entry["Detail"])["segments"][0] for entry in entries
+        ]
+
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.events")
+    def test_event_buffer_flushes_on_size(self, mock_events):
+        details = {"data": "x" * 100000}
+
+        with utils.EventBuffer() as event_buffer:
+            for _ in range(5):
+                event_buffer.add("flows/updated", details, ["tams:flow:abc"])
+
+        # Only two of the 100KB events fit within the PutEvents size limit
+        assert [2, 2, 1] == [
+            len(call[1]["Entries"]) for call in mock_events.put_events.call_args_list
+        ]
+
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.backoff")
+    @patch("utils.events")
+    def test_event_buffer_retries_failed_entries(self, mock_events, mock_backoff):
+        mock_events.put_events.side_effect = [
+            {"Entries": [{"EventId": "1"}, {"ErrorCode": "ThrottlingException"}]},
+            {"Entries": [{"EventId": "2"}]},
+        ]
+
+        with utils.EventBuffer() as event_buffer:
+            event_buffer.add("flows/updated", {"id": 1}, [])
+            event_buffer.add("flows/updated", {"id": 2}, [])
+
+        assert 2 == mock_events.put_events.call_count
+        retried = mock_events.put_events.call_args_list[1][1]["Entries"]
+        assert [{"id": 2}] == [json.loads(entry["Detail"]) for entry in retried]
+        mock_backoff.assert_called_once_with(1)
+
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.backoff")
+    @patch("utils.events")
+    def test_event_buffer_raises_when_retries_exhausted(
+        self, mock_events, mock_backoff
+    ):
+        mock_events.put_events.return_value = {
+            "Entries": [{"ErrorCode": "ThrottlingException"}]
+        }
+
+        with pytest.raises(RuntimeError):
+            with utils.EventBuffer() as event_buffer:
+                event_buffer.add("flows/updated", {"id": 1}, [])
+
+        assert constants.BATCH_MAX_RETRIES + 1 == mock_events.put_events.call_count
+        assert constants.BATCH_MAX_RETRIES == mock_backoff.call_count
+
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.backoff")
+    @patch("utils.events")
+    def test_event_buffer_retries_throttled_batch(self, mock_events, mock_backoff):
+        mock_events.put_events.side_effect = [
+            ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": ""}}, "PutEvents"
+            ),
+            {"Entries": [{"EventId": "1"}]},
+        ]
+
+        with utils.EventBuffer() as event_buffer:
+            event_buffer.add("flows/updated", {"id": 1}, [])
+
+        assert 2 == mock_events.put_events.call_count
+        mock_backoff.assert_called_once_with(1)
+
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.backoff")
+    @patch("utils.events")
+    def test_event_buffer_raises_other_client_errors(self, mock_events, mock_backoff):
+        mock_events.put_events.side_effect = ClientError(
+            {"Error": {"Code": "AccessDeniedException", "Message": ""}}, "PutEvents"
+        )
+
+        with pytest.raises(ClientError):
+            with utils.EventBuffer() as event_buffer:
+                event_buffer.add("flows/updated", {"id": 1}, [])
+
+        assert 1 == mock_events.put_events.call_count
+        mock_backoff.assert_not_called()
+
+    @patch.dict("os.environ", {"EVENT_BUS": "test-bus"})
+    @patch("utils.events")
+    def test_event_buffer_not_flushed_when_block_raises(self, mock_events):
+        with pytest.raises(ValueError):
+            with utils.EventBuffer() as event_buffer:
+                event_buffer.add("flows/updated", {"id": 1}, [])
+                raise ValueError()
+
+        mock_events.put_events.assert_not_called()
+
+    @patch("utils.time")
+    def test_backoff(self, mock_time):
+        attempts = range(1, 10)
+
+        for attempt in attempts:
+            utils.backoff(attempt)
+
+        delays = [call[0][0] for call in mock_time.sleep.call_args_list]
+        assert len(attempts) == len(delays)
+        assert all(
+            0
+            <= delay
+            <= min(
+                constants.RETRY_BACKOFF_MAX_SECS,
+                constants.RETRY_BACKOFF_BASE_SECS * 2**attempt,
+            )
+            for attempt, delay in zip(attempts, delays)
+        )
+
+    @patch("utils.backoff")
+    @patch("utils.sqs")
+    def test_message_buffer(self, mock_sqs, mock_backoff):
+        mock_sqs.send_message_batch.side_effect = [
+            {"Successful": [], "Failed": [{"Id": "3"}]},
+            {"Successful": [], "Failed": []},
+            {"Successful": [], "Failed": []},
+        ]
+
+        with utils.MessageBuffer("test-queue") as message_buffer:
+            for i in range(15):
+                message_buffer.add({"id": i})
+
+        calls = mock_sqs.send_message_batch.call_args_list
+        # The failed message is retried before the buffer takes any more
+        assert [10, 1, 5] == [len(call[1]["Entries"]) for call in calls]
+        assert {"id": 3} == json.loads(calls[1][1]["Entries"][0]["MessageBody"])
+        assert all("test-queue" == call[1]["QueueUrl"] for call in calls)
+
+    @patch("utils.backoff")
+    @patch("utils.sqs")
+    def test_message_buffer_retries_throttled_batch(self, mock_sqs, mock_backoff):
+        mock_sqs.send_message_batch.side_effect = [
+            ClientError(
+                {
+                    "Error": {
+                        "Code": "AWS.SimpleQueueService.RequestThrottled",
+                        "Message": "",
+                    }
+                },
+                "SendMessageBatch",
+            ),
+            {"Successful": [], "Failed": []},
+        ]
+
+        with utils.MessageBuffer("test-queue") as message_buffer:
+            message_buffer.add({"id": 1})
+
+        calls = mock_sqs.send_message_batch.call_args_list
+        assert 2 == len(calls)
+        assert calls[0] == calls[1]
+        mock_backoff.assert_called_once_with(1)
+
+    @pytest.mark.parametrize(
+        "item",
+        [
+            {
+                "flow_id": "abc",
+                "timerange_start": Decimal(0),
+                "timerange_end": Decimal(5999999999),
+                "object_id": "obj-1",
+                "timerange": "[0:0_6:0)",
+                "storage_ids": ["sid"],
+                "get_urls": [],
+            },
+            {
+                "flow_id": "abc",
+                "timerange_end": Decimal(5999999999),
+                "object_id": "obj-1",
+                "timerange": "[0:0_6:0)",
+                "object_timerange": "[10:0_16:0)",
+                "ts_offset": "-10:0",
+                "last_duration": "0:20000000",
+                "key_frame_count": Decimal(3),
+                "sample_offset": Decimal(0),
+                "sample_count": Decimal(150),
+                "get_urls": [
+                    {
+                        "url": "https://example.com/obj-1",
+                        "label": "aws.eu-west-1:s3:Example",
+                        "storage_id": "2aa143ac-0ab7-4d75-bc32-5c00c13d186f",
+                        "presigned": False,
+                        "controlled": True,
+                        "store_type": "http_object_store",
+                        "provider": "aws",
+                        "region": "eu-west-1",
+                        "availability_zone": None,
+                    }
+                ],
+                "init_object": {
+                    "object_id": "init-1",
+                    "get_urls": [{"url": "https://example.com/init-1", "label": "a"}],
+                },
+            },
+        ],
+    )
+    def test_get_model_serialiser_matches_model_dump(self, item):
+        expected = utils.model_dump(Flowsegment(**item))
+
+        result = utils.get_model_serialiser(Flowsegment)(item)
+
+        assert expected == result
+        assert json.dumps(expected) == json.dumps(result)
+
+    def test_generate_etag(self):
+        etag = utils.generate_etag("version", {"limit": "10"})
+
+        assert etag.startswith('W/"')
+        assert etag == utils.generate_etag("version", {"limit": "10"})
+        assert etag != utils.generate_etag("version", {"limit": "20"})
+
+    @pytest.mark.parametrize(
+        "if_none_match,expected",
+        [
+            (None, False),
+            ('W/"abc"', True),
+            ('"abc"', True),
+            ('"xyz", W/"abc"', True),
+            ("*", True),
+            ('W/"xyz"', False),
+        ],
+    )
+    def test_check_if_none_match(self, if_none_match, expected):
+        mock_event = MagicMock()
+        mock_event.headers = (
+            {} if if_none_match is None else {"If-None-Match": if_none_match}
+        )
+
+        assert expected == utils.check_if_none_match(mock_event, 'W/"abc"')
+
     @patch("utils.s3")
     def test_get_presigned_url(self, mock_s3):
         expected = "https://example.com"